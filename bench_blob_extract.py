@@ -0,0 +1,59 @@
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from blob_extract import largest_contour_target, extract_blobs, select_target
+
+
+def make_mask(width, height, specks, seed=0):
+    """生成带一个大目标和若干小噪点的二值掩码，返回 (掩码, 目标中心)"""
+    rng = np.random.default_rng(seed)
+    mask = np.zeros((height, width), dtype=np.uint8)
+    center = (width // 2, height // 3)
+    cv2.ellipse(mask, center, (40, 25), 0, 0, 360, 255, -1)
+    xs = rng.integers(0, width - 3, specks)
+    ys = rng.integers(0, height - 3, specks)
+    sizes = rng.integers(1, 4, specks)
+    for x, y, size in zip(xs, ys, sizes):
+        mask[y:y + size, x:x + size] = 255
+    return mask, center
+
+
+def best_time(func, repeat, calls):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(calls):
+            result = func()
+        elapsed = (time.perf_counter() - start) / calls
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='运动目标提取基准测试：findContours+矩 与 连通区域统计')
+    parser.add_argument('--width', type=int, default=480)
+    parser.add_argument('--height', type=int, default=640)
+    parser.add_argument('--specks', default='0,50,200,1000,3000', help='逗号分隔的噪点数量')
+    parser.add_argument('--repeat', type=int, default=5, help='重复次数（取最快一次）')
+    parser.add_argument('--calls', type=int, default=50, help='每次重复的调用次数')
+    args = parser.parse_args()
+
+    print(f"掩码 {args.width}x{args.height}")
+    print(f"{'噪点':>6} {'区域数':>6} {'轮廓+矩(us)':>12} {'连通区域(us)':>12} {'加速比':>7}  目标一致")
+    for specks in [int(value) for value in args.specks.split(',')]:
+        mask, center = make_mask(args.width, args.height, specks)
+        legacy_time, legacy = best_time(lambda: largest_contour_target(mask), args.repeat, args.calls)
+        blobs = extract_blobs(mask)
+        components_time, components = best_time(lambda: select_target(extract_blobs(mask)), args.repeat, args.calls)
+        # 质心定义不同（轮廓多边形的矩 / 像素平均），允许1像素的差异
+        same = (legacy is not None and components is not None and
+                abs(legacy[4] - components[4]) <= 1 and abs(legacy[5] - components[5]) <= 1)
+        print(f"{specks:>6} {len(blobs['area']):>6} {legacy_time * 1e6:>12.1f} {components_time * 1e6:>12.1f} "
+              f"{legacy_time / components_time:>6.1f}x  {'✓' if same else '✗'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,251 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+import cv2
+import numpy as np
+
+from blob_extract import find_target, BLOB_MODES
+from camera_config import CameraConfigurator
+from motion_mask import frame_diff, motion_mask
+from synthetic_source import SyntheticCapture
+
+# 基线与运行环境有关，在目标硬件（树莓派）上用 --update-baseline 生成，不提交到仓库
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bench_baseline.json')
+RESOLUTIONS = ['320x240', '640x480', '1280x720']
+DEFAULT_TOLERANCE = 0.25        # 比基线慢25%以上判为退化
+MIN_DELTA_US = 20.0             # 绝对差值低于该值的不判为退化，避免极短阶段的计时抖动
+END_TO_END_STAGES = ('motion_mask', 'find_target')  # 端到端阶段，与单独计时的子阶段重复，不计入合计
+
+
+def make_inputs(width, height):
+    """生成固定的两帧合成画面（小球位置不同），模拟摄像头连续两帧"""
+    source = SyntheticCapture(width, height, fps=0, radius=max(8, height // 20))
+    return source.frame_at(0.1, 0), source.frame_at(0.2, 1)
+
+
+def build_stages(frame1, frame2):
+    """
+    按 motion_detection_thread 的顺序准备各阶段
+
+    二值化、腐蚀膨胀、findContours、取最大轮廓、矩各自单独计时，阈值和结构元素取CameraConfigurator的默认值
+    （与服务器相同）；另外把服务器实际调用的 motion_mask 和每种模式的 find_target 作为端到端阶段计时，
+    服务器代码的变化也会反映在结果中。
+    每个阶段的输入由前面的阶段预先算好，计时只包含该阶段本身。
+    返回 [(阶段名, 无参函数), ...]
+    """
+    config = CameraConfigurator()
+
+    rotated1 = cv2.rotate(frame1, cv2.ROTATE_90_COUNTERCLOCKWISE)
+    rotated2 = cv2.rotate(frame2, cv2.ROTATE_90_COUNTERCLOCKWISE)
+    gray1 = cv2.cvtColor(rotated1, cv2.COLOR_BGR2GRAY)
+    gray2 = cv2.cvtColor(rotated2, cv2.COLOR_BGR2GRAY)
+
+    diff = frame_diff(gray1, gray2)
+    _, thresh = cv2.threshold(diff, config.threshold, 255, cv2.THRESH_BINARY)
+
+    def erode_dilate():
+        eroded = cv2.erode(thresh, config.kernel, iterations=1)
+        return cv2.dilate(eroded, config.kernel, iterations=2)
+
+    mask = erode_dilate()
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    if not contours:
+        raise RuntimeError("合成画面中没有检测到运动，无法测试轮廓相关阶段")
+    largest = max(contours, key=cv2.contourArea)
+
+    def moments():
+        x, y, w, h = cv2.boundingRect(largest)
+        M = cv2.moments(largest)
+        return x, y, w, h, int(M["m10"] / M["m00"]), int(M["m01"] / M["m00"])
+
+    x, y, w, h, cx, cy = moments()
+
+    def annotate():
+        display = rotated2.copy()
+        cv2.rectangle(display, (x, y), (x + w, y + h), (0, 255, 0), 2)
+        cv2.circle(display, (cx, cy), 5, (0, 0, 255), -1)
+        return display
+
+    display = annotate()
+
+    def hconcat_resize():
+        thresh_img = cv2.merge([mask, mask, mask])
+        combined = cv2.hconcat([display, thresh_img])
+        height, width = combined.shape[:2]
+        small = cv2.resize(combined, (width // 2, height // 2))
+        cv2.putText(small, "L=325.0, T=7.50s", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
+        return small
+
+    small = hconcat_resize()
+
+    return [
+        ('rotate', lambda: cv2.rotate(frame2, cv2.ROTATE_90_COUNTERCLOCKWISE)),
+        ('cvtColor', lambda: cv2.cvtColor(rotated2, cv2.COLOR_BGR2GRAY)),
+        ('diff_clamp', lambda: frame_diff(gray1, gray2)),
+        ('threshold', lambda: cv2.threshold(diff, config.threshold, 255, cv2.THRESH_BINARY)),
+        ('erode_dilate', erode_dilate),
+        ('findContours', lambda: cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)),
+        ('max_contourArea', lambda: max(contours, key=cv2.contourArea)),
+        ('moments', moments),
+        # 端到端：服务器实际调用的函数
+        ('motion_mask', lambda: motion_mask(diff, config.threshold, config.kernel)),
+    ] + [
+        (f'find_target:{mode}', lambda mode=mode: find_target(mask, mode)) for mode in BLOB_MODES
+    ] + [
+        ('annotate', annotate),
+        ('hconcat_resize', hconcat_resize),
+        ('imencode', lambda: cv2.imencode('.jpg', small)),
+    ]
+
+
+def time_stage(func, repeat, min_time=0.02):
+    """
+    计时单个阶段，返回每次调用的耗时（微秒）
+
+    每轮至少运行min_time秒（自动确定调用次数），共repeat轮，取最快一轮的平均值，
+    受其他进程干扰最小
+    """
+    func()  # 预热
+    calls = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(calls):
+            func()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+        calls *= 2
+    samples = [elapsed / calls]
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(calls):
+            func()
+        samples.append((time.perf_counter() - start) / calls)
+    return min(samples) * 1e6
+
+
+def run_benchmarks(resolutions, repeat):
+    results = {}
+    for resolution in resolutions:
+        width, height = (int(value) for value in resolution.split('x'))
+        frame1, frame2 = make_inputs(width, height)
+        results[resolution] = {}
+        for name, func in build_stages(frame1, frame2):
+            results[resolution][name] = round(time_stage(func, repeat), 2)
+    return results
+
+
+def confirm_regressions(regressions, repeat, tolerance, min_delta_us):
+    """对疑似退化的阶段加倍轮数重新计时，排除偶发干扰，返回仍然退化的阶段"""
+    confirmed = []
+    for resolution, name, _, base in regressions:
+        width, height = (int(value) for value in resolution.split('x'))
+        stages = dict(build_stages(*make_inputs(width, height)))
+        value = round(time_stage(stages[name], repeat * 2), 2)
+        if (value - base) / base > tolerance and value - base > min_delta_us:
+            confirmed.append((resolution, name, value, base))
+        else:
+            print(f"{resolution} {name}: 复测 {value:.1f}us，在基线范围内")
+    return confirmed
+
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'opencv': cv2.__version__,
+        'numpy': np.__version__,
+        'machine': platform.machine(),
+        'processor': platform.processor() or platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'opencv_threads': cv2.getNumThreads(),
+    }
+
+
+def compare(results, baseline, tolerance, min_delta_us):
+    """
+    与基线比较，打印每个阶段的结果
+
+    返回:
+    退化的阶段列表 [(分辨率, 阶段, 当前耗时, 基线耗时), ...]
+    """
+    regressions = []
+    for resolution, stages in results.items():
+        print(f"\n[{resolution}]")
+        print(f"{'阶段':<24} {'当前(us)':>10} {'基线(us)':>10} {'变化':>8}")
+        base_stages = baseline.get(resolution, {})
+        total = 0.0
+        for name, value in stages.items():
+            if name.split(':')[0] not in END_TO_END_STAGES:
+                total += value
+            base = base_stages.get(name)
+            if base is None:
+                print(f"{name:<24} {value:>10.1f} {'--':>10} {'':>8}")
+                continue
+            change = (value - base) / base if base > 0 else 0.0
+            regressed = change > tolerance and value - base > min_delta_us
+            mark = '  ✗ 退化' if regressed else ''
+            print(f"{name:<24} {value:>10.1f} {base:>10.1f} {change * 100:>7.1f}%{mark}")
+            if regressed:
+                regressions.append((resolution, name, value, base))
+        print(f"{'合计':<24} {total:>10.1f}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='运动检测各阶段微基准测试（与基线比较）')
+    parser.add_argument('--resolutions', default=','.join(RESOLUTIONS), help='逗号分隔的分辨率列表，如 640x480')
+    parser.add_argument('--repeat', type=int, default=7, help='每个阶段的计时轮数（取最快一轮）')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='基线文件')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE, help='允许比基线慢的比例')
+    parser.add_argument('--min-delta-us', type=float, default=MIN_DELTA_US, help='判为退化的最小绝对差值（微秒）')
+    parser.add_argument('--update-baseline', action='store_true', help='用本次结果覆盖基线')
+    args = parser.parse_args()
+
+    resolutions = [value.strip() for value in args.resolutions.split(',') if value.strip()]
+    results = run_benchmarks(resolutions, args.repeat)
+
+    baseline = {}
+    same_environment = False
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        same_environment = baseline.get('environment') == environment()
+        if not same_environment:
+            print("注意：基线记录于不同的环境，只显示对比，不判定是否退化")
+            print(f"  基线: {baseline.get('environment')}")
+            print(f"  当前: {environment()}")
+    elif not args.update_baseline:
+        print(f"没有找到基线文件 {args.baseline}，使用 --update-baseline 生成")
+
+    regressions = compare(results, baseline.get('results', {}), args.tolerance, args.min_delta_us)
+
+    if args.update_baseline:
+        merged = dict(baseline.get('results', {}), **results)
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump({'environment': environment(), 'tolerance': args.tolerance, 'results': merged},
+                      f, indent=2, ensure_ascii=False)
+            f.write('\n')
+        print(f"\n基线已更新: {args.baseline}")
+        return 0
+
+    if not same_environment:
+        return 0
+    if regressions:
+        print(f"\n复测 {len(regressions)} 个疑似退化的阶段...")
+        regressions = confirm_regressions(regressions, args.repeat, args.tolerance, args.min_delta_us)
+    if regressions:
+        print(f"\n✗ {len(regressions)} 个阶段超过基线 {args.tolerance * 100:.0f}%:")
+        for resolution, name, value, base in regressions:
+            print(f"  {resolution} {name}: {value:.1f}us (基线 {base:.1f}us)")
+        return 1
+    if baseline:
+        print(f"\n✓ 所有阶段都在基线 {args.tolerance * 100:.0f}% 以内")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,97 @@
+import argparse
+import os
+import time
+
+from mjpeg_stream import MJPEGStreamParser
+
+
+def make_jpeg_like(size, thumbnail=True):
+    """生成带SOI/EOI标记的伪JPEG数据，可选嵌入一个缩略图（内部也有SOI/EOI）"""
+    body = bytearray(os.urandom(size))
+    # 去掉随机数据中偶然出现的标记，保证只有人为放置的标记
+    body = body.replace(b'\xff', b'\xfe')
+    if thumbnail:
+        thumb = b'\xff\xd8' + bytes(body[:256]) + b'\xff\xd9'
+        middle = len(body) // 3
+        body[middle:middle] = thumb
+    return b'\xff\xd8' + bytes(body) + b'\xff\xd9'
+
+
+def make_stream(frames, frame_size, with_length=True, thumbnail=True):
+    """按服务器的multipart格式拼出一段MJPEG流，返回 (流数据, 帧数据列表)"""
+    parts = []
+    payloads = []
+    for seq in range(frames):
+        jpg = make_jpeg_like(frame_size, thumbnail)
+        headers = b'Content-Type: image/jpeg\r\n'
+        if with_length:
+            headers += f"Content-Length: {len(jpg)}\r\n".encode('ascii')
+        headers += f"X-Frame-Seq: {seq}\r\n".encode('ascii')
+        parts.append(b'--frame\r\n' + headers + b'\r\n' + jpg + b'\r\n')
+        payloads.append(jpg)
+    return b''.join(parts), payloads
+
+
+def chunked(data, chunk_size):
+    view = memoryview(data)
+    for i in range(0, len(data), chunk_size):
+        yield bytes(view[i:i + chunk_size])
+
+
+def legacy_loop(data, chunk_size):
+    """客户端原有的解析循环（bytes累加 + 每块全缓冲区查找JPEG标记）"""
+    frames = []
+    bytes_data = bytes()
+    for chunk in chunked(data, chunk_size):
+        bytes_data += chunk
+        start_pos = bytes_data.find(b'\xff\xd8')
+        end_pos = bytes_data.find(b'\xff\xd9')
+        if start_pos != -1 and end_pos != -1:
+            frames.append(bytes_data[start_pos:end_pos+2])
+            bytes_data = bytes_data[end_pos+2:]
+    return frames
+
+
+def parser_loop(data, chunk_size):
+    """基于MJPEGStreamParser的解析循环"""
+    parser = MJPEGStreamParser(b'frame')
+    frames = []
+    for chunk in chunked(data, chunk_size):
+        for _, payload in parser.feed(chunk):
+            frames.append(payload)
+    return frames
+
+
+def run(name, func, data, chunk_size, expected, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        frames = func(data, chunk_size)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    correct = sum(1 for got, want in zip(frames, expected) if got == want)
+    mb_per_s = len(data) / best / 1e6
+    print(f"{name:<28} chunk={chunk_size:>6}  {mb_per_s:8.1f} MB/s  "
+          f"{len(frames) / best:9.0f} 帧/秒  正确帧 {correct}/{len(expected)}")
+    return mb_per_s
+
+
+def main():
+    parser = argparse.ArgumentParser(description='MJPEG流解析吞吐量基准测试')
+    parser.add_argument('--frames', type=int, default=300, help='帧数')
+    parser.add_argument('--frame-size', type=int, default=40 * 1024, help='每帧字节数')
+    parser.add_argument('--repeat', type=int, default=3, help='重复次数（取最快一次）')
+    parser.add_argument('--no-thumbnail', action='store_true', help='不嵌入缩略图标记')
+    args = parser.parse_args()
+
+    data, payloads = make_stream(args.frames, args.frame_size, thumbnail=not args.no_thumbnail)
+    print(f"流大小: {len(data) / 1e6:.1f} MB, {args.frames} 帧, 每帧约 {args.frame_size // 1024} KB")
+
+    legacy = run('原有循环', legacy_loop, data, 1024, payloads, args.repeat)
+    same_chunk = run('MJPEGStreamParser', parser_loop, data, 1024, payloads, args.repeat)
+    big_chunk = run('MJPEGStreamParser', parser_loop, data, 64 * 1024, payloads, args.repeat)
+    print(f"加速比: 相同块大小 {same_chunk / legacy:.1f}x, 64KB块 {big_chunk / legacy:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
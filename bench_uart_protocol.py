@@ -0,0 +1,81 @@
+import argparse
+import random
+import time
+
+from uart_protocol import FrameEncoder, FrameDecoder, SOURCE_SERVER1
+
+
+def make_frames(count):
+    """生成交替的测量值帧和融合结果帧"""
+    encoder = FrameEncoder()
+    frames = []
+    now = time.time()
+    for i in range(count):
+        if i % 2:
+            frames.append(encoder.fusion({'angle_deg': 30.0 + i % 10, 'angle_err': 0.5,
+                                          'length': 0.55, 'period': 1.49, 'timestamp': now + i * 0.03}))
+        else:
+            frames.append(encoder.measurement(SOURCE_SERVER1, 320.5, 7.45, now + i * 0.03))
+    return frames
+
+
+def corrupt(data, errors, seed=0):
+    """随机翻转若干字节，模拟线路误码"""
+    rng = random.Random(seed)
+    data = bytearray(data)
+    for _ in range(errors):
+        data[rng.randrange(len(data))] ^= 0xFF
+    return bytes(data)
+
+
+def chunked(data, chunk_size):
+    view = memoryview(data)
+    for i in range(0, len(data), chunk_size):
+        yield bytes(view[i:i + chunk_size])
+
+
+def bench_encode(count, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        make_frames(count)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"{'编码':<10} {count / best:10.0f} 帧/秒  ({best / count * 1e6:.2f} us/帧)")
+
+
+def bench_decode(name, data, chunk_size, repeat):
+    best = None
+    for _ in range(repeat):
+        decoder = FrameDecoder()
+        start = time.perf_counter()
+        decoded = 0
+        for chunk in chunked(data, chunk_size):
+            decoded += len(decoder.feed(chunk))
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"{name:<10} chunk={chunk_size:>5}  {len(data) / best / 1e6:6.1f} MB/s  "
+          f"{decoded / best:10.0f} 帧/秒  解出={decoded} CRC错误={decoder.crc_errors} "
+          f"丢弃字节={decoder.skipped_bytes}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='串口二进制帧编解码吞吐量基准测试')
+    parser.add_argument('--frames', type=int, default=100000, help='帧数')
+    parser.add_argument('--errors', type=int, default=100, help='误码测试中翻转的字节数')
+    parser.add_argument('--repeat', type=int, default=3, help='重复次数（取最快一次）')
+    args = parser.parse_args()
+
+    frames = make_frames(args.frames)
+    data = b''.join(frames)
+    print(f"{args.frames} 帧, 共 {len(data)} 字节, 平均 {len(data) / args.frames:.1f} 字节/帧")
+    print(f"115200波特率下最多约 {115200 / 10 / (len(data) / args.frames):.0f} 帧/秒")
+
+    bench_encode(args.frames, args.repeat)
+    bench_decode('解码', data, 64, args.repeat)
+    bench_decode('解码', data, 4096, args.repeat)
+    bench_decode('误码解码', corrupt(data, args.errors), 64, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+import cv2
+import numpy as np
+
+BLOB_MODES = ('contours', 'components')
+
+
+def _empty_blobs():
+    return {
+        'area': np.empty(0, dtype=np.int32),
+        'bbox': np.empty((0, 4), dtype=np.int32),
+        'centroid': np.empty((0, 2), dtype=np.float64),
+    }
+
+
+def extract_blobs(mask, crop=True):
+    """
+    一次connectedComponentsWithStats得到所有连通区域的统计量
+
+    使用BBDT算法（8连通）。前景只占一小块时先裁剪到前景的外接矩形，
+    只对这一块做连通区域标记。
+
+    参数:
+    mask -- 二值图像（非零为前景）
+    crop -- 是否先裁剪到前景外接矩形
+
+    返回:
+    字典，每项为按区域排列的数组（不含背景）:
+    'area' -- 像素面积 (N,)
+    'bbox' -- 外接矩形 x, y, w, h (N, 4)
+    'centroid' -- 质心 cx, cy (N, 2)
+    """
+    x0 = y0 = 0
+    if crop:
+        x0, y0, w, h = cv2.boundingRect(mask)
+        if w == 0 or h == 0:
+            return _empty_blobs()
+        if w * h * 2 <= mask.size:
+            mask = mask[y0:y0 + h, x0:x0 + w]
+        else:
+            x0 = y0 = 0
+
+    _, _, stats, centroids = cv2.connectedComponentsWithStatsWithAlgorithm(mask, 8, cv2.CV_32S, cv2.CCL_BBDT)
+    bbox = stats[1:, :cv2.CC_STAT_AREA].copy()
+    bbox[:, 0] += x0
+    bbox[:, 1] += y0
+    return {
+        'area': stats[1:, cv2.CC_STAT_AREA],
+        'bbox': bbox,
+        'centroid': centroids[1:] + (x0, y0),
+    }
+
+
+def select_target(blobs, min_area=0, max_aspect=None):
+    """
+    按面积和长宽比过滤后选出面积最大的区域（向量化）
+
+    参数:
+    min_area -- 最小面积（像素）
+    max_aspect -- 外接矩形长边/短边的最大值，None表示不限制
+
+    返回:
+    (x, y, w, h, cx, cy)，没有符合条件的区域时返回None
+    """
+    area = blobs['area']
+    if len(area) == 0:
+        return None
+    keep = area >= min_area
+    if max_aspect is not None:
+        w = blobs['bbox'][:, 2]
+        h = blobs['bbox'][:, 3]
+        keep &= np.maximum(w, h) <= max_aspect * np.minimum(w, h)
+    if not keep.any():
+        return None
+    index = int(np.argmax(np.where(keep, area, -1)))
+    x, y, w, h = (int(value) for value in blobs['bbox'][index])
+    cx, cy = blobs['centroid'][index]
+    return x, y, w, h, int(cx), int(cy)
+
+
+def largest_contour_target(mask):
+    """
+    原有做法：findContours后取面积最大的轮廓，再计算外接矩形和矩
+
+    返回:
+    (x, y, w, h, cx, cy)，轮廓面积为零时cx、cy为None；没有轮廓时返回None
+    """
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    if not contours:
+        return None
+    largest_contour = max(contours, key=cv2.contourArea)
+    x, y, w, h = cv2.boundingRect(largest_contour)
+    M = cv2.moments(largest_contour)
+    if M["m00"] == 0:
+        return x, y, w, h, None, None
+    return x, y, w, h, int(M["m10"] / M["m00"]), int(M["m01"] / M["m00"])
+
+
+def find_target(mask, mode='contours', min_area=0, max_aspect=None):
+    """
+    在二值运动掩码中找出目标
+
+    参数:
+    mode -- 'contours'（findContours + 矩，原有做法）或 'components'（一次连通区域统计）
+    min_area, max_aspect -- 仅 'components' 模式使用的过滤条件
+
+    返回:
+    (x, y, w, h, cx, cy) 或 None
+    """
+    if mode == 'components':
+        return select_target(extract_blobs(mask), min_area, max_aspect)
+    return largest_contour_target(mask)
@@ -0,0 +1,256 @@
+import threading
+import time
+
+import cv2
+
+# 可以在运行时修改的摄像头属性
+CAMERA_PROPS = {
+    'width': cv2.CAP_PROP_FRAME_WIDTH,
+    'height': cv2.CAP_PROP_FRAME_HEIGHT,
+    'fps': cv2.CAP_PROP_FPS,
+    'exposure': cv2.CAP_PROP_EXPOSURE,
+    'gain': cv2.CAP_PROP_GAIN,
+}
+
+# V4L2后端CAP_PROP_AUTO_EXPOSURE的取值：1为手动曝光，3为自动（光圈优先）
+AUTO_EXPOSURE_MANUAL = 1
+AUTO_EXPOSURE_AUTO = 3
+
+DEFAULT_THRESHOLD = 30
+DEFAULT_KERNEL = 5
+
+
+def parse_changes(params):
+    """
+    检查并转换配置参数
+
+    参数:
+    params -- 字典，可包含 width, height, fps, exposure（数值或 'auto'）, gain, threshold, kernel,
+              band（[起始行, 结束行] 或 "起始:结束"，None表示不裁剪）
+
+    返回:
+    (摄像头属性修改, 检测参数修改) 两个字典
+
+    异常:
+    ValueError -- 参数名未知或取值不合法
+    """
+    camera, detection = {}, {}
+    for name, value in params.items():
+        if name in ('width', 'height'):
+            value = int(value)
+            if value <= 0:
+                raise ValueError(f"{name} 必须为正整数")
+            camera[name] = value
+        elif name in ('fps', 'gain'):
+            value = float(value)
+            if value < 0 or (name == 'fps' and value == 0):
+                raise ValueError(f"{name} 取值不合法: {value}")
+            camera[name] = value
+        elif name == 'exposure':
+            camera[name] = 'auto' if value == 'auto' else float(value)
+        elif name == 'threshold':
+            value = int(value)
+            if not 0 <= value <= 255:
+                raise ValueError("threshold 必须在0-255之间")
+            detection[name] = value
+        elif name == 'kernel':
+            value = int(value)
+            if value < 1 or value % 2 == 0:
+                raise ValueError("kernel 必须为正奇数")
+            detection[name] = value
+        elif name == 'band':
+            detection[name] = parse_band(value)
+        else:
+            raise ValueError(f"未知的配置项: {name}")
+    return camera, detection
+
+
+def parse_band(value):
+    """把 [起始, 结束] 或 "起始:结束" 转换为元组，None或空字符串表示不裁剪"""
+    if value is None or value == '':
+        return None
+    if isinstance(value, str):
+        value = value.split(':')
+    if len(value) != 2:
+        raise ValueError("band 格式应为 [起始行, 结束行] 或 \"起始:结束\"")
+    start, end = int(value[0]), int(value[1])
+    if start < 0 or end <= start:
+        raise ValueError(f"band 范围不合法: {start}:{end}")
+    return start, end
+
+
+def crop_band(frame, band):
+    """
+    裁剪出摆动所在的水平带
+
+    band是逆时针旋转90度后画面中的行范围（即网页上看到的画面），对应原始画面中的列，
+    所以在旋转之前按列裁剪，旋转和之后的各步都只处理这一条带。返回的是视图，不复制数据。
+    """
+    if band is None:
+        return frame
+    width = frame.shape[1]
+    start, end = min(band[0], width), min(band[1], width)
+    if end <= start:
+        return frame
+    return frame[:, width - end:width - start]
+
+
+class CameraConfigurator:
+    """
+    在采集循环的两帧之间应用摄像头和检测参数的修改
+
+    HTTP线程调用request()提交修改并等待结果；采集线程每帧调用apply_pending()和frame_done()，
+    修改在采集线程中两次read()之间生效，不需要重新打开摄像头，也不影响正在连接的客户端。
+    应用后统计随后若干帧的实际帧率，连同摄像头实际接受的属性值一起返回给请求方。
+    """
+
+    def __init__(self, threshold=DEFAULT_THRESHOLD, kernel=DEFAULT_KERNEL, band=None, measure_frames=20,
+                 measure_timeout=2.0):
+        """
+        参数:
+        threshold -- 帧差二值化阈值
+        kernel -- 腐蚀/膨胀矩形结构元素的边长
+        band -- 只处理的水平带（旋转后画面的行范围），None表示整幅画面
+        measure_frames -- 应用修改后统计实际帧率使用的帧数
+        measure_timeout -- 统计实际帧率的最长时间（秒）
+        """
+        self.measure_frames = measure_frames
+        self.measure_timeout = measure_timeout
+        self.threshold = threshold
+        self.kernel_size = kernel
+        self.kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (kernel, kernel))
+        self.band = band
+
+        self._lock = threading.Lock()
+        self._pending_camera = {}
+        self._pending_detection = {}
+        self._waiters = []          # 等待下一次应用的请求 [(Event, 结果字典)]
+        self._measuring = None      # 正在统计帧率的应用结果 {'waiters', 'result', 'times', 'start'}
+
+        self.camera_values = {}
+        self.achieved_fps = None
+        self.changes = 0
+        self.last_result = None
+
+    @property
+    def measuring(self):
+        """是否正在统计修改后的实际帧率（此时采集循环应按摄像头速率读取，不能限速等待）"""
+        return self._measuring is not None
+
+    def request(self, params, timeout=5.0):
+        """
+        提交修改并等待采集线程应用和测量完成
+
+        参数:
+        timeout -- 最长等待时间（秒），为0时只提交不等待（如启动时的命令行参数）
+
+        返回:
+        结果字典，'status' 为 'applied'，超时（采集线程没有在运行）为 'pending'
+
+        异常:
+        ValueError -- 参数不合法
+        """
+        camera, detection = parse_changes(params)
+        event = threading.Event()
+        result = {'status': 'pending', 'requested': dict(params)}
+        with self._lock:
+            self._pending_camera.update(camera)
+            self._pending_detection.update(detection)
+            self._waiters.append((event, result))
+        event.wait(timeout)
+        return result
+
+    def apply_pending(self, cap):
+        """
+        在两帧之间应用尚未生效的修改（采集线程调用）
+
+        返回:
+        是否应用了修改（调用方据此更新帧率调度、参考帧等）
+        """
+        with self._lock:
+            if not self._waiters:
+                return False
+            camera, self._pending_camera = self._pending_camera, {}
+            detection, self._pending_detection = self._pending_detection, {}
+            waiters, self._waiters = self._waiters, []
+
+        start = time.perf_counter()
+        rejected = []
+        for name, value in camera.items():
+            if name == 'exposure':
+                auto = value == 'auto'
+                cap.set(cv2.CAP_PROP_AUTO_EXPOSURE, AUTO_EXPOSURE_AUTO if auto else AUTO_EXPOSURE_MANUAL)
+                if auto:
+                    continue
+            if not cap.set(CAMERA_PROPS[name], value):
+                rejected.append(name)
+
+        if 'threshold' in detection:
+            self.threshold = detection['threshold']
+        if 'kernel' in detection:
+            self.kernel_size = detection['kernel']
+            self.kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (self.kernel_size, self.kernel_size))
+        if 'band' in detection:
+            self.band = detection['band']
+
+        self.read_camera_values(cap)
+        self.changes += 1
+        result = {
+            'status': 'applied',
+            'actual': dict(self.camera_values),
+            'rejected': rejected,
+            'detection': self.detection_params(),
+            'apply_ms': round((time.perf_counter() - start) * 1000, 3),
+            'achieved_fps': None,
+        }
+        if camera:
+            # 摄像头属性改变后统计实际帧率；上一次的统计还没完成时一起在这次完成
+            if self._measuring is not None:
+                waiters = self._measuring['waiters'] + waiters
+            self._measuring = {'waiters': waiters, 'result': result, 'times': [], 'start': time.perf_counter()}
+        else:
+            result['achieved_fps'] = self.achieved_fps
+            self._finish(waiters, result)
+        return True
+
+    def frame_done(self, now=None):
+        """采集到一帧（采集线程调用），用于统计修改后的实际帧率"""
+        measuring = self._measuring
+        if measuring is None:
+            return
+        now = time.perf_counter() if now is None else now
+        times = measuring['times']
+        times.append(now)
+        # 第一帧可能是修改前缓冲的旧帧，从第二帧开始计时
+        if len(times) > self.measure_frames or now - measuring['start'] > self.measure_timeout:
+            if len(times) > 2 and times[-1] > times[1]:
+                self.achieved_fps = round((len(times) - 2) / (times[-1] - times[1]), 2)
+            measuring['result']['achieved_fps'] = self.achieved_fps
+            values = measuring['result']['actual']
+            print(f"摄像头配置已生效: {values['width']:.0f}x{values['height']:.0f} "
+                  f"设定{values['fps']:.0f}fps，实际{self.achieved_fps}fps")
+            self._measuring = None
+            self._finish(measuring['waiters'], measuring['result'])
+
+    def _finish(self, waiters, result):
+        self.last_result = result
+        for event, waiter_result in waiters:
+            waiter_result.update(result)
+            event.set()
+
+    def read_camera_values(self, cap):
+        """读取摄像头当前实际使用的属性值"""
+        self.camera_values = {name: cap.get(prop) for name, prop in CAMERA_PROPS.items()}
+        return self.camera_values
+
+    def detection_params(self):
+        return {'threshold': self.threshold, 'kernel': self.kernel_size,
+                'band': list(self.band) if self.band is not None else None}
+
+    def summary(self):
+        return {
+            'camera': dict(self.camera_values),
+            'detection': self.detection_params(),
+            'achieved_fps': self.achieved_fps,
+            'changes': self.changes,
+        }
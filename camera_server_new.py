@@ -3,62 +3,57 @@ import cv2
 import threading
 import time
 import json
-import random
+import argparse
+from frame_scheduler import FrameScheduler
+from camera_config import CameraConfigurator
+from telemetry import TelemetrySampler
+from frame_bus import FrameBus, mjpeg_generator
+from http_cache import JSONCache, cached_json_response, snapshot_response
 
 app = Flask(__name__)
 
 # 记录服务器启动时间
 start_time = time.time()
 
-# 全局变量存储摄像头帧和其他数据
-frame = None
-sensor_data = {}
-system_status = {}
-lock = threading.Lock()
-frame_count = 0
+# 视频帧发布：每帧在锁外编码后替换为新的不可变Frame（帧序号即帧计数），
+# 每个观看者有自己的队列，太慢时丢弃最旧的帧，不会阻塞摄像头线程
+frame_bus = FrameBus()
+
+# 按摄像头帧率和每帧截止时间调度采集循环，过载时降低编码频率
+frame_scheduler = FrameScheduler()
+
+# 运行时修改摄像头参数（set_camera_resolution / set_camera_config 命令），在两帧之间生效
+camera_config = CameraConfigurator()
+
+# 系统和传感器数据由独立的采样线程按自己的间隔采集（--telemetry-interval），与视频帧循环无关
+telemetry = TelemetrySampler()
 
 def generate_frames():
-    global frame, sensor_data, system_status, frame_count
     camera = cv2.VideoCapture(0)  # 使用默认摄像头
     camera.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
     camera.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
+    frame_scheduler.set_fps(camera.get(cv2.CAP_PROP_FPS))
+    camera_config.read_camera_values(camera)
     
     while True:
+        # 在两帧之间应用运行时配置修改
+        if camera_config.apply_pending(camera):
+            frame_scheduler.set_fps(camera.get(cv2.CAP_PROP_FPS))
+        
         success, img = camera.read()
         if not success:
             break
+        capture_ts = time.time()
+        camera_config.frame_done()
+        plan = frame_scheduler.begin_frame()
         
-        frame_count += 1
-        
-        # 生成模拟传感器数据
-        with lock:
+        if plan['encode']:
             _, buffer = cv2.imencode('.jpg', img)
-            frame = buffer.tobytes()
-            
-            # 更新传感器数据 (模拟真实传感器)
-            sensor_data = {
-                'timestamp': time.time(),
-                'temperature': round(20 + random.uniform(-5, 15), 1),  # 15-35°C
-                'humidity': round(40 + random.uniform(-10, 30), 1),    # 30-70%
-                'pressure': round(1013 + random.uniform(-50, 50), 1),  # 气压
-                'light_level': random.randint(0, 1023),                # 光照传感器
-                'motion_detected': random.choice([True, False]),       # 运动检测
-                'frame_count': frame_count
-            }
-            
-            # 更新系统状态
-            system_status = {
-                'cpu_usage': round(random.uniform(10, 80), 1),         # CPU使用率
-                'memory_usage': round(random.uniform(30, 90), 1),      # 内存使用率
-                'disk_usage': round(random.uniform(20, 95), 1),        # 磁盘使用率
-                'network_speed': round(random.uniform(1, 100), 2),     # 网络速度 Mbps
-                'uptime': int(time.time() - start_time),               # 运行时间(秒)
-                'camera_status': 'online',
-                'last_update': time.time()
-            }
+            frame_bus.publish(buffer.tobytes(), capture_ts)
         
-        # 控制帧率
-        threading.Event().wait(0.03)  # ~30fps
+        # 等待到下一帧的截止时间（按摄像头帧率，已超时则不等待）
+        frame_scheduler.end_frame()
+        frame_scheduler.wait()
 
 @app.route('/')
 def index():
@@ -68,9 +63,11 @@ def index():
     <h2>API端点说明:</h2>
     <ul>
         <li><a href="/video_feed">/video_feed</a> - 获取视频流</li>
+        <li><a href="/snapshot.jpg">/snapshot.jpg</a> - 获取最新一帧图像</li>
         <li><a href="/sensor_data">/sensor_data</a> - 获取传感器数据</li>
         <li><a href="/system_status">/system_status</a> - 获取系统状态</li>
         <li><a href="/all_data">/all_data</a> - 获取所有数据</li>
+        <li><a href="/clock">/clock</a> - 获取服务器时钟</li>
         <li>/send_command (POST) - 发送控制命令</li>
     </ul>
     <h2>传感器数据实时预览:</h2>
@@ -103,29 +100,75 @@ def index():
 
 @app.route('/video_feed')
 def video_feed():
-    def generate():
-        global frame
-        while True:
-            with lock:
-                if frame is not None:
-                    yield (b'--frame\r\n'
-                           b'Content-Type: image/jpeg\r\n\r\n' + 
-                           frame + b'\r\n')
-            
-    return Response(generate(),
+    # 生成器不持有任何锁，慢速客户端只会在自己的队列里丢帧
+    return Response(mjpeg_generator(frame_bus),
                    mimetype='multipart/x-mixed-replace; boundary=frame')
 
+@app.route('/snapshot.jpg')
+def snapshot():
+    """最新一帧JPEG（支持If-None-Match返回304，wait参数等待下一帧）"""
+    return snapshot_response(frame_bus)
+
+def build_sensor_data(snapshot):
+    """由采样快照生成传感器数据（没有接对应传感器的字段为None）"""
+    return {
+        'timestamp': snapshot.get('timestamp'),
+        'temperature': snapshot.get('temperature'),            # 环境温度 °C
+        'humidity': snapshot.get('humidity'),                  # 相对湿度 %
+        'pressure': snapshot.get('pressure'),                  # 气压 hPa
+        'light_level': snapshot.get('light_level'),            # 光照 lux
+        'motion_detected': None,                               # 本服务器不做运动检测
+        'frame_count': frame_bus.seq
+    }
+
+def build_system_status(snapshot):
+    """由采样快照生成系统状态"""
+    latest = frame_bus.latest()
+    return {
+        'cpu_usage': snapshot.get('cpu_usage'),                # CPU使用率 %
+        'memory_usage': snapshot.get('memory_usage'),          # 内存使用率 %
+        'disk_usage': snapshot.get('disk_usage'),              # 磁盘使用率 %
+        'network_speed': snapshot.get('network_speed'),        # 网络速度 Mbps（收+发）
+        'cpu_temperature': snapshot.get('cpu_temperature'),    # SoC温度 °C
+        'load_average': snapshot.get('load_average'),
+        'uptime': int(time.time() - start_time),               # 运行时间(秒)
+        'camera_status': 'online' if latest is not None and time.time() - latest.encode_ts < 2.0 else 'offline',
+        'scheduler': frame_scheduler.summary(),
+        'camera_config': camera_config.summary(),
+        'video': frame_bus.summary(),
+        'telemetry': {'interval': telemetry.interval, 'samples': telemetry.samples, 'errors': telemetry.errors},
+        'last_update': snapshot.get('timestamp')
+    }
+
+def build_all_data():
+    snapshot = telemetry.snapshot()
+    return {
+        'sensor_data': build_sensor_data(snapshot),
+        'system_status': build_system_status(snapshot),
+        'timestamp': time.time()
+    }
+
+# 序列化好的JSON按采样版本缓存，每次采样后更新一次（帧计数、调度状态等随之按采样间隔刷新）
+sensor_cache = JSONCache('sensor', lambda: build_sensor_data(telemetry.snapshot()))
+system_cache = JSONCache('system', lambda: build_system_status(telemetry.snapshot()))
+all_data_cache = JSONCache('all', build_all_data)
+
+def on_telemetry_sample(snapshot):
+    sensor_cache.touch()
+    system_cache.touch()
+    all_data_cache.touch()
+
+telemetry.add_listener(on_telemetry_sample)
+
 @app.route('/sensor_data')
 def get_sensor_data():
-    """获取实时传感器数据"""
-    with lock:
-        return jsonify(sensor_data)
+    """获取实时传感器数据（支持If-None-Match返回304和wait参数长轮询）"""
+    return cached_json_response(sensor_cache)
 
 @app.route('/system_status')
 def get_system_status():
-    """获取系统状态信息"""
-    with lock:
-        return jsonify(system_status)
+    """获取系统状态信息（支持If-None-Match返回304和wait参数长轮询）"""
+    return cached_json_response(system_cache)
 
 @app.route('/send_command', methods=['POST'])
 def send_command():
@@ -159,14 +202,17 @@ def process_command(action, params):
     if action == 'set_camera_resolution':
         width = params.get('width', 640)
         height = params.get('height', 480)
-        return f"摄像头分辨率设置为 {width}x{height}"
+        return camera_config.request({'width': width, 'height': height})
+    elif action == 'set_camera_config':
+        # 可任意组合 width, height, fps, exposure（数值或 'auto'）, gain, threshold, kernel
+        return camera_config.request(params)
     elif action == 'get_info':
         return "服务器运行正常"
     elif action == 'reboot':
         return "重启命令已接收（模拟）"
     elif action == 'set_threshold':
         threshold = params.get('threshold', 30)
-        return f"检测阈值设置为 {threshold}"
+        return camera_config.request({'threshold': threshold})
     elif action == 'toggle_motion_detection':
         enabled = params.get('enabled', True)
         return f"运动检测{'开启' if enabled else '关闭'}"
@@ -175,13 +221,21 @@ def process_command(action, params):
 
 @app.route('/all_data')
 def get_all_data():
-    """一次性获取所有数据"""
-    with lock:
-        return jsonify({
-            'sensor_data': sensor_data,
-            'system_status': system_status,
-            'timestamp': time.time()
-        })
+    """一次性获取所有数据（支持If-None-Match返回304和wait参数长轮询）"""
+    return cached_json_response(all_data_cache)
+
+@app.route('/clock')
+def clock():
+    """
+    时钟端点，供客户端估计时钟偏差和漂移（NTP式交换）
+
+    客户端以参数t0带上发送时间，返回原样的t0、收到请求的时间t1和发出响应的时间t2；
+    server_time与t2相同，兼容只读取server_time的旧客户端。
+    """
+    t1 = time.time()
+    t0 = request.args.get('t0', type=float)
+    t2 = time.time()
+    return jsonify({'t0': t0, 't1': t1, 't2': t2, 'server_time': t2})
 
 @app.route('/ping')
 def ping():
@@ -193,9 +247,17 @@ def ping():
     })
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='摄像头视频流和传感器数据服务器')
+    parser.add_argument('--telemetry-interval', type=float, default=1.0, help='系统和传感器数据的采样间隔（秒）')
+    args = parser.parse_args()
+    
     print("正在启动Flask服务器...")
     print("摄像头初始化中...")
     
+    # 启动系统和传感器数据采样线程
+    telemetry.interval = args.telemetry_interval
+    telemetry.start()
+    
     # 启动摄像头线程
     camera_thread = threading.Thread(target=generate_frames, daemon=True)
     camera_thread.start()
@@ -0,0 +1,82 @@
+import os
+import select
+import sys
+import time
+
+from pyuart import UARTLink
+
+
+def wait_until(condition, timeout=2.0):
+    """轮询等待条件成立，超时返回False"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return condition()
+
+
+def read_master(fd, size, timeout=2.0):
+    """从伪终端主端读取size字节（UARTLink写出的数据），超时返回已读到的部分"""
+    data = b''
+    deadline = time.time() + timeout
+    while len(data) < size:
+        remaining = deadline - time.time()
+        if remaining <= 0 or not select.select([fd], [], [], remaining)[0]:
+            break
+        data += os.read(fd, size - len(data))
+    return data
+
+
+def check(name, ok, detail=''):
+    print(f"{'✓' if ok else '✗'} {name}" + (f": {detail}" if detail else ""))
+    return ok
+
+
+def main():
+    """
+    用 os.openpty() 得到的伪终端对检查UARTLink：UARTLink打开从端，脚本在主端模拟单片机
+
+    检查按行回调、同key写入合并和断开后的重连计数，全部通过返回0
+    """
+    master, slave = os.openpty()
+    link = UARTLink(os.ttyname(slave), read_timeout=0.02, reconnect_delay=0.05)
+    lines = []
+    link.add_line_callback(lambda line, receive_time: lines.append(line))
+    results = []
+
+    try:
+        # 串口打开前放入同key的5条数据：只保留最新一条，连接后一次写出
+        for i in range(5):
+            link.send(f"L={i}\n", key='measurement')
+        link.start()
+        results.append(check("串口打开", link.connected.wait(2.0)))
+        written = read_master(master, len(b"L=4\n"))
+        results.append(check("同key写入合并", written == b"L=4\n" and link.writes == 1 and link.coalesced == 4,
+                             f"收到={written!r}, 写入={link.writes}, 合并={link.coalesced}"))
+
+        # 单片机发送的命令行：去掉\r、\x00和空白，空行忽略
+        os.write(master, b"start\r\n\x00hb\n\nstop\n")
+        wait_until(lambda: len(lines) >= 3)
+        results.append(check("按行回调", lines == ['start', 'hb', 'stop'], f"{lines}"))
+
+        # 模拟串口断开：关闭底层串口后读线程应自动重新打开，并继续收发
+        link.ser.close()
+        wait_until(lambda: link.reconnects >= 1 and link.connected.is_set())
+        os.write(master, b"hb\n")
+        wait_until(lambda: len(lines) >= 4)
+        link.send("T=7.5\n")
+        written = read_master(master, len(b"T=7.5\n"))
+        results.append(check("断开后重连", link.reconnects == 1 and lines[3:] == ['hb'] and written == b"T=7.5\n",
+                             f"重连={link.reconnects}, 错误={link.errors}, 收到={lines[3:]}, 发出={written!r}"))
+    finally:
+        link.stop()
+        os.close(master)
+        os.close(slave)
+
+    print(link.format_summary())
+    return 0 if all(results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,11 +1,31 @@
 import cv2
 import numpy as np
 import requests
-from threading import Thread, Lock
+from threading import Thread, Lock, Event
 import time
 import json
 import uuid
-import math
+import sys
+import argparse
+from contextlib import redirect_stdout
+from frame_latency import FrameLatencyTracker, frame_meta_from_headers, is_same_frame
+from clock_sync import ClockSync, sync_round
+from mjpeg_stream import iter_mjpeg_parts
+from frame_decoder import LazyFrameDecoder
+from http_session import create_session, Backoff, ConnectionStats
+from fanout import FanOut
+from fusion import FusionEngine
+from display_scheduler import DisplayScheduler
+from result_output import ResultWriter
+from uart_protocol import FrameEncoder
+
+def format_estimate(value, error, digits, unit=""):
+    """格式化带误差的估计值，缺失时显示 --"""
+    if value is None:
+        return "--"
+    if error is None:
+        return f"{value:.{digits}f}{unit}"
+    return f"{value:.{digits}f}+/-{error:.{digits}f}{unit}"
 
 class DualServerClient:
     def __init__(self, server1_url, server2_url):
@@ -21,224 +41,540 @@ class DualServerClient:
         self.server1_data_url = f"{self.server1_url}/motion_data"
         self.server1_ping_url = f"{self.server1_url}/ping"
         self.server1_control_url = f"{self.server1_url}/control"
+        self.server1_heartbeat_url = f"{self.server1_url}/heartbeat"
         
         self.server2_video_url = f"{self.server2_url}/video_feed"
         self.server2_data_url = f"{self.server2_url}/motion_data"
         self.server2_ping_url = f"{self.server2_url}/ping"
         self.server2_control_url = f"{self.server2_url}/control"
+        self.server2_heartbeat_url = f"{self.server2_url}/heartbeat"
+        
+        # 合并流：视频帧和运动检测数据在同一个连接上推送
+        self.server1_stream_url = f"{self.server1_url}/stream"
+        self.server2_stream_url = f"{self.server2_url}/stream"
+        self.use_stream = True       # False时分别连接视频流并轮询数据（旧版服务器）
+        
+        # 每个服务器的持久连接会话：视频流独占一个，数据/控制/心跳共用一个连接池
+        self.server1_session = create_session()
+        self.server1_video_session = create_session(pool_size=1)
+        self.server2_session = create_session()
+        self.server2_video_session = create_session(pool_size=1)
         
         # 客户端标识
         self.client_id = str(uuid.uuid4())[:8]
         
         # 服务器1的数据
-        self.server1_frame = None
+        self.server1_jpeg = None           # 最新一帧的JPEG数据（未解码）
+        self.server1_frame_meta = None
+        self.server1_frame_version = 0     # 每收到新帧递增
+        self.server1_decoder = LazyFrameDecoder()
         self.server1_motion_data = {'L': 0, 'T': 0, 'timestamp': 0}
         self.server1_connected = False
         
         # 服务器2的数据
-        self.server2_frame = None
+        self.server2_jpeg = None
+        self.server2_frame_meta = None
+        self.server2_frame_version = 0
+        self.server2_decoder = LazyFrameDecoder()
         self.server2_motion_data = {'L': 0, 'T': 0, 'timestamp': 0}
         self.server2_connected = False
           # 控制变量
         self.stopped = False
+        self.stop_event = Event()  # 用于提前结束重连等待
         self.data_lock = Lock()
         
         # 客户端控制状态
         self.valid_signal = False  # 当前发送给服务器的valid信号
-        self.last_control_time = 0
-        self.control_interval = 2.0  # 控制信号发送间隔（秒）
+        self.control_seq = 0         # 控制信号序号，服务器忽略序号更小的旧信号
+        self.control_event = Event() # 状态变化时立即唤醒控制线程
+        self.lease_ttl = 6.0         # 服务器端valid租约有效期（秒）
+        self.heartbeat_interval = 2.0  # 租约心跳间隔（秒）
+        self.control_deadline = 3.0  # 控制信号和健康检查的共同截止时间（秒）
+        self.fanout = FanOut()       # 并发向所有服务器发送请求
+        
+        # 显示：数据版本号、预分配的双屏画布和重绘调度
+        self.data_version = 0              # 每次运动检测数据更新递增
+        self.canvas = np.zeros((400, 800, 3), dtype=np.uint8)
+        self.display = DisplayScheduler()
         
         # 统计信息
         self.server1_frame_count = 0
         self.server2_frame_count = 0
         self.last_stats_time = time.time()
+        
+        # 采集到显示延迟统计
+        self.server1_latency = FrameLatencyTracker()
+        self.server2_latency = FrameLatencyTracker()
+        
+        # 时钟同步：持续估计各服务器时钟的偏差和漂移，服务器时间戳都换算到客户端时钟
+        self.server1_clock = ClockSync()
+        self.server2_clock = ClockSync()
+        self.clock_sync_interval = 10.0  # 时钟同步间隔（秒）
+        
+        # 双摄像头融合：时间对齐后计算摆动角度和摆长
+        self.fusion = FusionEngine(('server1', 'server2'))
+        self.fusion_result = None
+        self.fusion_lock = Lock()    # 两个服务器的接收线程都会更新融合结果（加锁顺序：fusion_lock 先于 data_lock）
+        self._fusion_seen = {'server1': {'L': 0, 'T': 0}, 'server2': {'L': 0, 'T': 0}}
+        self.on_result = None        # 融合结果更新时的回调 on_result(record)
+        self.data_interval = 0.5     # 运动检测数据轮询间隔（秒）
+        
+        # 串口输出：融合结果以二进制帧推送给单片机（enable_uart 启用）
+        self.uart_link = None
+        self.uart_encoder = FrameEncoder()
+        
+        # 重连和请求延迟统计
+        self.server1_stats = ConnectionStats()
+        self.server2_stats = ConnectionStats()
 
-    def start(self):
-        """启动所有线程"""
+    def start(self, video=True):
+        """
+        启动所有线程
+        video: False时不接收视频流（无界面模式），只轮询数据和发送控制信号
+        """
         print(f"客户端ID: {self.client_id}")
         
+        # 估计两个服务器与客户端的时钟偏差，之后定期重新同步以跟踪漂移
+        self.sync_clocks()
+        Thread(target=self.sync_clocks_loop, daemon=True).start()
+        
         # 启动服务器1的线程
-        Thread(target=self.update_server1_video, daemon=True).start()
-        Thread(target=self.update_server1_data, daemon=True).start()
+        if video and self.use_stream:
+            Thread(target=self.update_server1_stream, daemon=True).start()
+        else:
+            if video:
+                Thread(target=self.update_server1_video, daemon=True).start()
+            Thread(target=self.update_server1_data, daemon=True).start()
           # 启动服务器2的线程
-        Thread(target=self.update_server2_video, daemon=True).start()
-        Thread(target=self.update_server2_data, daemon=True).start()
+        if video and self.use_stream:
+            Thread(target=self.update_server2_stream, daemon=True).start()
+        else:
+            if video:
+                Thread(target=self.update_server2_video, daemon=True).start()
+            Thread(target=self.update_server2_data, daemon=True).start()
         
         # 启动控制信号发送线程
         Thread(target=self.send_control_signals, daemon=True).start()
         
         return self
 
+    def enable_uart(self, port, baudrate=115200):
+        """打开持久串口链路，之后每个新的融合结果都通过二进制帧推送给单片机"""
+        from pyuart import UARTLink  # 只有启用串口时才需要pyserial
+        self.uart_link = UARTLink(port, baudrate).start()
+        return self.uart_link
+
+    def sync_clocks(self, verbose=True):
+        """对各服务器做一轮时钟同步，更新偏差和漂移估计以及延迟统计使用的偏差"""
+        for name, url, clock, tracker, session in (
+                ("服务器1", self.server1_url, self.server1_clock, self.server1_latency, self.server1_session),
+                ("服务器2", self.server2_url, self.server2_clock, self.server2_latency, self.server2_session)):
+            if sync_round(url, clock, session=session):
+                tracker.set_clock_offset(clock.offset_at())
+                if verbose:
+                    s = clock.summary()
+                    print(f"{name}时钟偏差: {s['offset_ms']:.1f}ms (网络延迟 {s['min_delay_ms']:.1f}ms)")
+            elif verbose and not clock.synchronized:
+                print(f"{name}时钟偏差获取失败，延迟按零偏差计算")
+
+    def sync_clocks_loop(self):
+        """定期重新同步时钟，跟踪服务器时钟的漂移"""
+        while not self.stop_event.wait(self.clock_sync_interval):
+            self.sync_clocks(verbose=False)
+
     def update_server1_video(self):
-        """更新服务器1的视频流"""
-        try:
-            print(f"正在连接服务器1视频流: {self.server1_video_url}")
-            stream = requests.get(self.server1_video_url, stream=True, timeout=10)
-            self.server1_connected = True
-            print("✓ 服务器1视频流连接成功")
-            
-            bytes_data = bytes()
-            
-            for chunk in stream.iter_content(chunk_size=1024):
-                if self.stopped:
-                    return
-                    
-                bytes_data += chunk
-                
-                # 查找JPEG边界
-                start_pos = bytes_data.find(b'\xff\xd8')
-                end_pos = bytes_data.find(b'\xff\xd9')
+        """更新服务器1的视频流，断开后按指数退避自动重连"""
+        backoff = Backoff()
+        while not self.stopped:
+            try:
+                print(f"正在连接服务器1视频流: {self.server1_video_url}")
+                stream = self.server1_video_session.get(self.server1_video_url, stream=True, timeout=10)
+                stream.raise_for_status()
+                self.server1_connected = True
+                self.server1_stats.record_connect()
+                backoff.reset()
+                print("✓ 服务器1视频流连接成功")
                 
-                if start_pos != -1 and end_pos != -1:
-                    jpg_data = bytes_data[start_pos:end_pos+2]
-                    bytes_data = bytes_data[end_pos+2:]
-                    
-                    # 解码图像
-                    frame = cv2.imdecode(np.frombuffer(jpg_data, dtype=np.uint8), cv2.IMREAD_COLOR)
-                    if frame is not None:
+                try:
+                    # 按multipart边界逐帧解析
+                    for headers, jpg_data in iter_mjpeg_parts(stream):
+                        if self.stopped:
+                            return
+                        
+                        meta = frame_meta_from_headers(headers)
+                        
+                        # 只保存最新的JPEG数据，解码留给显示端按需进行
                         with self.data_lock:
-                            self.server1_frame = frame
+                            self.server1_latency.on_receive(meta)
+                            # 服务器重复发送的同一帧不更新版本，避免无效重绘
+                            if is_same_frame(meta, self.server1_frame_meta):
+                                continue
+                            self.server1_jpeg = jpg_data
+                            self.server1_frame_meta = meta
+                            self.server1_frame_version += 1
                             self.server1_frame_count += 1
+                finally:
+                    stream.close()
+                raise ConnectionError("视频流已结束")
                     
-        except Exception as e:
-            print(f"✗ 服务器1视频流连接失败: {e}")
-            self.server1_connected = False
+            except Exception as e:
+                self.server1_connected = False
+                self.server1_stats.record_failure(e)
+                if self.stopped:
+                    return
+                delay = backoff.next_delay()
+                print(f"✗ 服务器1视频流连接失败: {e}，{delay:.1f}秒后重连")
+                self.stop_event.wait(delay)
 
     def update_server2_video(self):
-        """更新服务器2的视频流"""
-        try:
-            print(f"正在连接服务器2视频流: {self.server2_video_url}")
-            stream = requests.get(self.server2_video_url, stream=True, timeout=10)
-            self.server2_connected = True
-            print("✓ 服务器2视频流连接成功")
-            
-            bytes_data = bytes()
-            
-            for chunk in stream.iter_content(chunk_size=1024):
+        """更新服务器2的视频流，断开后按指数退避自动重连"""
+        backoff = Backoff()
+        while not self.stopped:
+            try:
+                print(f"正在连接服务器2视频流: {self.server2_video_url}")
+                stream = self.server2_video_session.get(self.server2_video_url, stream=True, timeout=10)
+                stream.raise_for_status()
+                self.server2_connected = True
+                self.server2_stats.record_connect()
+                backoff.reset()
+                print("✓ 服务器2视频流连接成功")
+                
+                try:
+                    # 按multipart边界逐帧解析
+                    for headers, jpg_data in iter_mjpeg_parts(stream):
+                        if self.stopped:
+                            return
+                        
+                        meta = frame_meta_from_headers(headers)
+                        
+                        # 只保存最新的JPEG数据，解码留给显示端按需进行
+                        with self.data_lock:
+                            self.server2_latency.on_receive(meta)
+                            # 服务器重复发送的同一帧不更新版本，避免无效重绘
+                            if is_same_frame(meta, self.server2_frame_meta):
+                                continue
+                            self.server2_jpeg = jpg_data
+                            self.server2_frame_meta = meta
+                            self.server2_frame_version += 1
+                            self.server2_frame_count += 1
+                finally:
+                    stream.close()
+                raise ConnectionError("视频流已结束")
+                    
+            except Exception as e:
+                self.server2_connected = False
+                self.server2_stats.record_failure(e)
                 if self.stopped:
                     return
-                    
-                bytes_data += chunk
-                
-                # 查找JPEG边界
-                start_pos = bytes_data.find(b'\xff\xd8')
-                end_pos = bytes_data.find(b'\xff\xd9')
+                delay = backoff.next_delay()
+                print(f"✗ 服务器2视频流连接失败: {e}，{delay:.1f}秒后重连")
+                self.stop_event.wait(delay)
+
+    def update_server1_stream(self):
+        """
+        通过/stream在一个连接上同时接收服务器1的视频帧和运动检测数据，断开后按指数退避自动重连
+
+        每帧的JSON数据分段在JPEG分段之前到达，两者在同一次加锁中更新，画面和叠加的数据始终是同一帧的。
+        服务器不支持/stream（404）时改用视频流和数据轮询两个线程。
+        """
+        backoff = Backoff()
+        while not self.stopped:
+            try:
+                print(f"正在连接服务器1合并流: {self.server1_stream_url}")
+                stream = self.server1_video_session.get(self.server1_stream_url, stream=True, timeout=10)
+                if stream.status_code == 404:
+                    stream.close()
+                    print("服务器1不支持合并流，改用视频流和数据轮询")
+                    Thread(target=self.update_server1_video, daemon=True).start()
+                    Thread(target=self.update_server1_data, daemon=True).start()
+                    return
+                stream.raise_for_status()
+                self.server1_connected = True
+                self.server1_stats.record_connect()
+                backoff.reset()
+                print("✓ 服务器1合并流连接成功")
                 
-                if start_pos != -1 and end_pos != -1:
-                    jpg_data = bytes_data[start_pos:end_pos+2]
-                    bytes_data = bytes_data[end_pos+2:]
+                try:
+                    data = None
+                    for headers, payload in iter_mjpeg_parts(stream):
+                        if self.stopped:
+                            return
+                        
+                        if headers.get('content-type', '').startswith('application/json'):
+                            data = json.loads(payload)
+                            self.feed_fusion('server1', data, self.server1_clock)
+                            data = self.server1_clock.to_client_data(data)
+                            continue
+                        
+                        meta = frame_meta_from_headers(headers)
+                        with self.data_lock:
+                            self.server1_latency.on_receive(meta)
+                            if data is not None:
+                                self.server1_motion_data = data
+                                self.data_version += 1
+                                data = None
+                            if is_same_frame(meta, self.server1_frame_meta):
+                                continue
+                            self.server1_jpeg = payload
+                            self.server1_frame_meta = meta
+                            self.server1_frame_version += 1
+                            self.server1_frame_count += 1
+                finally:
+                    stream.close()
+                raise ConnectionError("合并流已结束")
                     
-                    # 解码图像
-                    frame = cv2.imdecode(np.frombuffer(jpg_data, dtype=np.uint8), cv2.IMREAD_COLOR)
-                    if frame is not None:
+            except Exception as e:
+                self.server1_connected = False
+                self.server1_stats.record_failure(e)
+                if self.stopped:
+                    return
+                delay = backoff.next_delay()
+                print(f"✗ 服务器1合并流连接失败: {e}，{delay:.1f}秒后重连")
+                self.stop_event.wait(delay)
+
+    def update_server2_stream(self):
+        """
+        通过/stream在一个连接上同时接收服务器2的视频帧和运动检测数据，断开后按指数退避自动重连
+
+        每帧的JSON数据分段在JPEG分段之前到达，两者在同一次加锁中更新，画面和叠加的数据始终是同一帧的。
+        服务器不支持/stream（404）时改用视频流和数据轮询两个线程。
+        """
+        backoff = Backoff()
+        while not self.stopped:
+            try:
+                print(f"正在连接服务器2合并流: {self.server2_stream_url}")
+                stream = self.server2_video_session.get(self.server2_stream_url, stream=True, timeout=10)
+                if stream.status_code == 404:
+                    stream.close()
+                    print("服务器2不支持合并流，改用视频流和数据轮询")
+                    Thread(target=self.update_server2_video, daemon=True).start()
+                    Thread(target=self.update_server2_data, daemon=True).start()
+                    return
+                stream.raise_for_status()
+                self.server2_connected = True
+                self.server2_stats.record_connect()
+                backoff.reset()
+                print("✓ 服务器2合并流连接成功")
+                
+                try:
+                    data = None
+                    for headers, payload in iter_mjpeg_parts(stream):
+                        if self.stopped:
+                            return
+                        
+                        if headers.get('content-type', '').startswith('application/json'):
+                            data = json.loads(payload)
+                            self.feed_fusion('server2', data, self.server2_clock)
+                            data = self.server2_clock.to_client_data(data)
+                            continue
+                        
+                        meta = frame_meta_from_headers(headers)
                         with self.data_lock:
-                            self.server2_frame = frame
+                            self.server2_latency.on_receive(meta)
+                            if data is not None:
+                                self.server2_motion_data = data
+                                self.data_version += 1
+                                data = None
+                            if is_same_frame(meta, self.server2_frame_meta):
+                                continue
+                            self.server2_jpeg = payload
+                            self.server2_frame_meta = meta
+                            self.server2_frame_version += 1
                             self.server2_frame_count += 1
+                finally:
+                    stream.close()
+                raise ConnectionError("合并流已结束")
                     
-        except Exception as e:
-            print(f"✗ 服务器2视频流连接失败: {e}")
-            self.server2_connected = False
+            except Exception as e:
+                self.server2_connected = False
+                self.server2_stats.record_failure(e)
+                if self.stopped:
+                    return
+                delay = backoff.next_delay()
+                print(f"✗ 服务器2合并流连接失败: {e}，{delay:.1f}秒后重连")
+                self.stop_event.wait(delay)
 
     def update_server1_data(self):
-        """更新服务器1的运动检测数据"""
+        """更新服务器1的运动检测数据，失败时按指数退避重试"""
+        backoff = Backoff()
         while not self.stopped:
+            delay = self.data_interval  # 默认每0.5秒获取一次数据
             try:
-                response = requests.get(self.server1_data_url, timeout=5)
-                if response.status_code == 200:
-                    data = response.json()
+                request_start = time.perf_counter()
+                response = self.server1_session.get(self.server1_data_url, timeout=5)
+                self.server1_stats.record_latency(time.perf_counter() - request_start)
+                if response.status_code == 200: #HTTP状态码200表示请求成功
+                    data = response.json()      #得到数据包
                     with self.data_lock:
-                        self.server1_motion_data = data
-                        self.server1_motion_data['timestamp'] = time.time()
+                        # 服务器时间戳换算到客户端时钟
+                        self.server1_motion_data = self.server1_clock.to_client_data(data)
+                        self.data_version += 1
+                    self.feed_fusion('server1', data, self.server1_clock)
+                    backoff.reset()
                         
             except Exception as e:
-                print(f"服务器1数据获取失败: {e}")
+                self.server1_stats.record_failure(e)
+                delay = max(delay, backoff.next_delay())
+                print(f"服务器1数据获取失败: {e}，{delay:.1f}秒后重试")
             
-            time.sleep(0.5)  # 每0.5秒获取一次数据
+            self.stop_event.wait(delay)
 
     def update_server2_data(self):
-        """更新服务器2的运动检测数据"""
+        """更新服务器2的运动检测数据，失败时按指数退避重试"""
+        backoff = Backoff()
         while not self.stopped:
+            delay = self.data_interval  # 默认每0.5秒获取一次数据
             try:
-                response = requests.get(self.server2_data_url, timeout=5)
+                request_start = time.perf_counter()
+                response = self.server2_session.get(self.server2_data_url, timeout=5)
+                self.server2_stats.record_latency(time.perf_counter() - request_start)
                 if response.status_code == 200: #HTTP状态码200表示请求成功
                     data = response.json()      #得到数据包
                     with self.data_lock:
-                        self.server2_motion_data = data
-                        self.server2_motion_data['timestamp'] = time.time()
+                        # 服务器时间戳换算到客户端时钟
+                        self.server2_motion_data = self.server2_clock.to_client_data(data)
+                        self.data_version += 1
+                    self.feed_fusion('server2', data, self.server2_clock)
+                    backoff.reset()
                         
             except Exception as e:
-                print(f"服务器2数据获取失败: {e}")
+                self.server2_stats.record_failure(e)
+                delay = max(delay, backoff.next_delay())
+                print(f"服务器2数据获取失败: {e}，{delay:.1f}秒后重试")
             
-            time.sleep(0.5)  # 每0.5秒获取一次数据
+            self.stop_event.wait(delay)
+
+    def feed_fusion(self, server_name, data, clock):
+        """
+        把新的L、T测量值送入融合引擎并更新融合结果
+
+        参数:
+        data -- 服务器原始数据（按服务器时间戳去重）
+        clock -- 该服务器的ClockSync，测量时间换算到客户端时钟后再融合
+
+        两个接收线程都会调用：融合、保存结果、串口发送和输出回调在同一把锁内完成，
+        先算出的旧结果不会覆盖后算出的新结果，串口和输出的顺序也与融合顺序一致。
+        """
+        with self.fusion_lock:
+            seen = self._fusion_seen[server_name]
+            updated = False
+            for key in ('L', 'T'):
+                measured_at = data.get(f'{key}_timestamp')
+                if measured_at and measured_at != seen[key]:
+                    seen[key] = measured_at
+                    self.fusion.add_measurement(server_name, clock.to_client(measured_at), **{key: data.get(key)})
+                    updated = True
+            if updated or self.fusion_result is None:
+                self.fusion_result = self.fusion.fuse(time.time())
+            if updated and self.uart_link is not None:
+                # 尚未发出的旧融合结果会被替换，串口只发送最新值
+                self.uart_link.send(self.uart_encoder.fusion(self.fusion_result), key='fusion')
+            if updated and self.on_result is not None:
+                self.on_result(self.result_record(self.fusion_result))
+
+    def result_record(self, fusion_result):
+        """融合结果附加两个服务器最新的L、T，作为一条输出记录"""
+        with self.data_lock:
+            record = dict(fusion_result,
+                          L1=self.server1_motion_data.get('L'), T1=self.server1_motion_data.get('T'),
+                          L2=self.server2_motion_data.get('L'), T2=self.server2_motion_data.get('T'))
+        return record
 
     def send_control_signals(self):
-        """发送控制信号到两个服务器"""
+        """状态变化时立即推送控制信号，valid期间定期发送心跳为服务器端租约续期"""
+        resend = True  # 启动时先同步一次当前状态
         while not self.stopped:
             try:
-                current_time = time.time()
-                
-                # 检查是否需要发送控制信号
-                if current_time - self.last_control_time >= self.control_interval:
-                    
-                    # 准备发送的控制数据
-                    control_data = {
-                        'valid': self.valid_signal,
-                        'client_id': self.client_id,
-                        'timestamp': current_time
-                    }
-                    
-                    # 发送到服务器1
-                    self.send_control_to_server(self.server1_control_url, control_data, "服务器1")
-                    
-                    # 发送到服务器2
-                    self.send_control_to_server(self.server2_control_url, control_data, "服务器2")
-                    
-                    self.last_control_time = current_time
-                    
+                if resend:
+                    self.control_event.clear()
+                    self.push_control_state()
+                elif self.valid_signal and not self.send_heartbeats():
+                    # 有服务器的租约已失效（例如服务器重启）或被其他来源停止，立即重新发送当前状态
+                    resend = True
+                    continue
             except Exception as e:
                 print(f"发送控制信号错误: {e}")
             
-            time.sleep(0.5)  # 检查间隔
+            resend = self.control_event.wait(self.heartbeat_interval)
 
-    def send_control_to_server(self, url, data, server_name):
-        """向单个服务器发送控制信号"""
-        try:
-            response = requests.post(
-                url,
-                json=data,
-                headers={'Content-Type': 'application/json'},
-                timeout=3
-            )
-            
-            if response.status_code == 200:
-                result = response.json()
-                if result.get('status') == 'success':
-                    status_msg = "启动" if self.valid_signal else "停止"
-                    print(f"✓ {server_name}摄像识别{status_msg}成功")
-                else:
-                    print(f"✗ {server_name}响应错误: {result.get('message', '未知错误')}")
+    def push_control_state(self):
+        """把当前valid状态同时发送到两个服务器"""
+        self.control_seq += 1
+        control_data = {
+            'valid': self.valid_signal,
+            'client_id': self.client_id,
+            'seq': self.control_seq,
+            'ttl': self.lease_ttl,
+            'timestamp': time.time()
+        }
+        
+        # 同时发送到两个服务器，共享截止时间
+        results = self.fanout.request({
+            "服务器1": (self.server1_session, self.server1_control_url),
+            "服务器2": (self.server2_session, self.server2_control_url),
+        }, method='POST', json=control_data, deadline=self.control_deadline)
+        for server_name, result in results.items():
+            self.report_control_result(server_name, result, control_data['valid'])
+
+    def send_heartbeats(self):
+        """
+        发送租约心跳
+        
+        返回False表示有服务器已经没有本客户端的租约，需要重新发送控制信号；
+        租约被其他来源（如单片机通过串口）停止时把valid_signal改为False，重新发送的是停止信号。
+        不支持心跳或无法连接的服务器不影响结果
+        """
+        results = self.fanout.request({
+            "服务器1": (self.server1_session, self.server1_heartbeat_url),
+            "服务器2": (self.server2_session, self.server2_heartbeat_url),
+        }, method='POST', json={'client_id': self.client_id, 'ttl': self.lease_ttl},
+            deadline=self.control_deadline)
+        lost = {server_name: result['data'] for server_name, result in results.items()
+                if result['ok'] and (result['data'] or {}).get('status') == 'no_lease'}
+        for server_name, data in lost.items():
+            if data.get('reason') == 'revoked':
+                print(f"{server_name}的摄像识别已被{data.get('source')}停止，两个服务器都停止摄像识别")
+                self.valid_signal = False
+                return False
+        if lost:
+            print(f"{'、'.join(lost)}租约已失效，重新发送控制信号")
+            return False
+        return True
+
+    def report_control_result(self, server_name, result, valid):
+        """打印单个服务器的控制信号结果"""
+        rtt_text = f" ({result['rtt'] * 1000:.1f}ms)" if result['rtt'] is not None else ""
+        error = result['error']
+        if result['ok']:
+            data = result['data'] or {}
+            if data.get('status') == 'success':
+                status_msg = "启动" if valid else "停止"
+                print(f"✓ {server_name}摄像识别{status_msg}成功{rtt_text}")
+            elif data.get('status') == 'stale':
+                print(f"{server_name}忽略了过期的控制信号")
             else:
-                print(f"✗ {server_name}HTTP错误: {response.status_code}")
-                
-        except requests.exceptions.Timeout:
+                print(f"✗ {server_name}响应错误: {data.get('message', '未知错误')}")
+        elif error == 'deadline' or isinstance(error, requests.exceptions.Timeout):
             print(f"✗ {server_name}控制信号发送超时")
-        except requests.exceptions.ConnectionError:
+        elif isinstance(error, requests.exceptions.ConnectionError):
             print(f"✗ {server_name}连接失败")
-        except Exception as e:
-            print(f"✗ {server_name}发送错误: {e}")
+        elif error is not None:
+            print(f"✗ {server_name}发送错误: {error}")
+        else:
+            print(f"✗ {server_name}HTTP错误: {result['status_code']}")
 
     def start_camera_detection(self):
         """启动摄像识别"""
         if not self.valid_signal:
             self.valid_signal = True
-            self.last_control_time = 0  # 立即发送
+            self.control_event.set()  # 立即发送
             print("📹 启动两个服务器的摄像识别...")
 
     def stop_camera_detection(self):
         """停止摄像识别"""
         if self.valid_signal:
             self.valid_signal = False
-            self.last_control_time = 0  # 立即发送
+            self.control_event.set()  # 立即发送
             print("⏹️ 停止两个服务器的摄像识别...")
 
     def toggle_camera_detection(self):
@@ -249,51 +585,75 @@ class DualServerClient:
             self.start_camera_detection()
 
     def check_servers_status(self):
-        status = {'server1': None, 'server2': None}
+        """同时检查两个服务器状态，ping结果中附带往返时间rtt_ms，无响应为None"""
+        results = self.fanout.request({
+            'server1': (self.server1_session, self.server1_ping_url),
+            'server2': (self.server2_session, self.server2_ping_url),
+        }, deadline=self.control_deadline)
         
-        try:
-            response = requests.get(self.server1_ping_url, timeout=3)
-            if response.status_code == 200:
-                status['server1'] = response.json()
-        except:
-            pass
-            
-        try:
-            response = requests.get(self.server2_ping_url, timeout=3)
-            if response.status_code == 200:
-                status['server2'] = response.json()
-        except:
-            pass
-            
+        status = {}
+        for name, result in results.items():
+            if result['ok'] and isinstance(result['data'], dict):
+                status[name] = dict(result['data'], rtt_ms=round(result['rtt'] * 1000, 1))
+            else:
+                status[name] = None
         return status
 
+    def get_server_frame(self, server_index, target_size=None):
+        """
+        按需解码指定服务器的最新帧（只在显示线程中调用）
+        
+        server_index: 1 或 2
+        target_size: 显示目标尺寸(宽, 高)，足够小时使用降分辨率解码
+        返回 (frame, meta)，frame为解码缓存，绘制前需copy()
+        """
+        with self.display.timed_lock(self.data_lock):
+            if server_index == 1:
+                jpeg, version, meta = self.server1_jpeg, self.server1_frame_version, self.server1_frame_meta
+            else:
+                jpeg, version, meta = self.server2_jpeg, self.server2_frame_version, self.server2_frame_meta
+        decoder = self.server1_decoder if server_index == 1 else self.server2_decoder
+        return decoder.decode(jpeg, version, target_size), meta
+
+    def display_state(self, display_mode):
+        """当前显示内容的版本状态，状态不变时无需重绘"""
+        if display_mode == 'server1':
+            return (display_mode, self.server1_frame_version)
+        if display_mode == 'server2':
+            return (display_mode, self.server2_frame_version)
+        return (display_mode, self.server1_frame_version, self.server2_frame_version,
+                self.data_version, self.valid_signal)
+
     def get_combined_display(self):
-        """获取组合显示的图像"""
-        with self.data_lock:
-            frame1 = self.server1_frame.copy() if self.server1_frame is not None else None
-            frame2 = self.server2_frame.copy() if self.server2_frame is not None else None
+        """获取组合显示的图像（绘制在预分配的画布上，返回的画布会在下次调用时被覆盖）"""
+        # 解码在锁外进行，每个新帧最多解码一次
+        frame1, meta1 = self.get_server_frame(1, (400, 400))
+        frame2, meta2 = self.get_server_frame(2, (400, 400))
+        with self.display.timed_lock(self.data_lock):
             data1 = self.server1_motion_data.copy()
             data2 = self.server2_motion_data.copy()
         
-        # 计算角度
-        L1 = data1.get('L', 0)
-        L2 = data2.get('L', 0)
-        angle = math.atan2(L2, L1) if L2 != 0 else 3.14159 / 2  # 如果L2为0，设置为90度
-        angle = math.degrees(angle)  # 转换为度数
-
-        # 计算摆长
-        T1 = data1.get('T', 0)
-        T2 = data2.get('T', 0)
-        T0 = (T1 + T2) / 2 
-        L0 = (T0 / 2 / 3.14159) ^ 2 * 9.8  # 假设重力加速度为9.8 m/s²
+        # 记录采集到显示延迟
+        display_time = time.time()
+        if frame1 is not None:
+            self.server1_latency.on_display(meta1, display_time)
+        if frame2 is not None:
+            self.server2_latency.on_display(meta2, display_time)
+        
+        # 融合结果：时间对齐后的摆动角度、摆长及其标准误差
+        with self.fusion_lock:
+            fusion = self.fusion_result or self.fusion.fuse(time.time())
+        angle_text = format_estimate(fusion['angle_deg'], fusion['angle_err'], 2)
+        length_text = format_estimate(fusion['length'], fusion['length_err'], 3, "m")
 
-        # 创建占位图像
-        placeholder = np.zeros((400, 400, 3), dtype=np.uint8)
+        # 两个窗格是画布的切片视图，直接在画布上缩放和绘制
+        pane1 = self.canvas[:, :400]
+        pane2 = self.canvas[:, 400:]
         
         # 处理服务器1的帧
         if frame1 is not None:
             # 调整大小
-            frame1 = cv2.resize(frame1, (400, 400))
+            frame1 = cv2.resize(frame1, (400, 400), dst=pane1)
             # 添加服务器1标识
             cv2.putText(frame1, "SERVER 1", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
 
@@ -307,19 +667,20 @@ class DualServerClient:
                        (10, 90), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
             cv2.putText(frame1, f"T: {data1.get('T', 0):.2f}s", 
                        (10, 120), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
-            cv2.putText(frame1, f"θ: {angle:.2f}", 
+            cv2.putText(frame1, f"θ: {angle_text}", 
                        (10, 150), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 255), 2)
-            cv2.putText(frame1, f"L0: {L0:.2f}", 
+            cv2.putText(frame1, f"L0: {length_text}", 
                        (10, 180), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 255), 2)
         else:
-            frame1 = placeholder.copy()
+            frame1 = pane1
+            frame1[:] = 0
             cv2.putText(frame1, "SERVER 1", (120, 180), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
             cv2.putText(frame1, "无信号", (150, 220), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
         
         # 处理服务器2的帧
         if frame2 is not None:
             # 调整大小
-            frame2 = cv2.resize(frame2, (400, 400))
+            frame2 = cv2.resize(frame2, (400, 400), dst=pane2)
             # 添加服务器2标识
             cv2.putText(frame2, "SERVER 2", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 255), 2)
 
@@ -334,12 +695,13 @@ class DualServerClient:
             cv2.putText(frame2, f"T: {data2.get('T', 0):.2f}s", 
                        (10, 120), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
         else:
-            frame2 = placeholder.copy()
+            frame2 = pane2
+            frame2[:] = 0
             cv2.putText(frame2, "SERVER 2", (120, 180), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
             cv2.putText(frame2, "无信号", (150, 220), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
         
-        # 水平拼接两个视频流
-        combined_frame = cv2.hconcat([frame1, frame2])
+        # 两个窗格已在同一画布上，无需拼接
+        combined_frame = self.canvas
         
         # # 添加整体信息
         # cv2.putText(combined_frame, f"双服务器运动检测客户端 - ID: {self.client_id}",                   (10, combined_frame.shape[0] - 60), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
@@ -359,58 +721,151 @@ class DualServerClient:
             print(f"\n=== 统计信息 ===")
             print(f"服务器1: 帧数={self.server1_frame_count}, 连接={'正常' if self.server1_connected else '断开'}")
             print(f"服务器2: 帧数={self.server2_frame_count}, 连接={'正常' if self.server2_connected else '断开'}")
+            print(f"解码次数: 服务器1={self.server1_decoder.decoded_frames}(降分辨率{self.server1_decoder.reduced_frames}), "
+                  f"服务器2={self.server2_decoder.decoded_frames}(降分辨率{self.server2_decoder.reduced_frames})")
+            print(f"服务器1连接: {self.server1_stats.format_summary()}")
+            print(f"服务器2连接: {self.server2_stats.format_summary()}")
             print(f"摄像识别: {'运行中' if self.valid_signal else '已停止'}")
+            print(f"显示: {self.display.format_summary()}")
+            if self.fusion_result:
+                print(f"融合结果: 角度={format_estimate(self.fusion_result['angle_deg'], self.fusion_result['angle_err'], 2)}°, "
+                      f"周期={format_estimate(self.fusion_result['period'], self.fusion_result['period_err'], 3, 's')}, "
+                      f"摆长={format_estimate(self.fusion_result['length'], self.fusion_result['length_err'], 3, 'm')}")
             with self.data_lock:
                 print(f"服务器1数据: L={self.server1_motion_data.get('L', 0):.1f}, T={self.server1_motion_data.get('T', 0):.2f}")
                 print(f"服务器2数据: L={self.server2_motion_data.get('L', 0):.1f}, T={self.server2_motion_data.get('T', 0):.2f}")
+                print(f"服务器1{self.server1_latency.format_summary()}")
+                print(f"服务器2{self.server2_latency.format_summary()}")
             print("================\n")
             self.last_stats_time = current_time
 
     def stop(self):
         """停止客户端"""
         self.stopped = True
+        self.stop_event.set()
+        self.control_event.set()
+        self.fanout.shutdown()
+        if self.uart_link is not None:
+            self.uart_link.stop()
+
+def normalize_server_url(address):
+    """把 ip:port 或完整URL统一为 http://ip:port 形式"""
+    if address.startswith(('http://', 'https://')):
+        return address.rstrip('/')
+    return f"http://{address}"
+
+def parse_args(argv=None):
+    """解析命令行参数，不带参数时保持交互式输入"""
+    parser = argparse.ArgumentParser(description='双服务器运动检测客户端')
+    parser.add_argument('--server1', help='服务器1地址，ip:port 或 URL (默认: 169.254.163.62:5001)')
+    parser.add_argument('--server2', help='服务器2地址，ip:port 或 URL (默认: 169.254.163.62:5002)')
+    parser.add_argument('--headless', action='store_true',
+                        help='无界面模式：不接收和解码视频，只轮询数据并流式输出融合结果')
+    parser.add_argument('--format', choices=('ndjson', 'csv'), default='ndjson', help='无界面模式的输出格式')
+    parser.add_argument('--output', default='-', help='无界面模式的输出文件，- 表示标准输出')
+    parser.add_argument('--duration', type=float, default=None, help='无界面模式运行时长（秒），默认一直运行')
+    parser.add_argument('--interval', type=float, default=0.5, help='运动检测数据轮询间隔（秒）')
+    parser.add_argument('--start-detection', action='store_true', help='启动后立即开启摄像识别')
+    parser.add_argument('--uart', help='向单片机推送融合结果的串口（如 /dev/ttyUSB0），不指定则不使用串口')
+    parser.add_argument('--baudrate', type=int, default=115200, help='串口波特率')
+    parser.add_argument('--no-stream', action='store_true',
+                        help='不使用合并流（/stream），分别连接视频流并轮询运动检测数据')
+    return parser.parse_args(argv)
+
+def run_headless(args):
+    """
+    无界面模式：结果逐行写入输出并立即flush，状态信息打印到标准错误，
+    标准输出只包含结果数据，便于重定向或管道处理
+    """
+    server1_url = normalize_server_url(args.server1 or "169.254.163.62:5001")
+    server2_url = normalize_server_url(args.server2 or "169.254.163.62:5002")
+    output = sys.stdout if args.output == '-' else open(args.output, 'w', newline='', encoding='utf-8')
+    
+    with redirect_stdout(sys.stderr):
+        print(f"服务器1: {server1_url}")
+        print(f"服务器2: {server2_url}")
+        client = DualServerClient(server1_url, server2_url)
+        client.data_interval = args.interval
+        if args.uart:
+            client.enable_uart(args.uart, args.baudrate)
+        writer = ResultWriter(output, args.format)
+        client.on_result = writer.write
+        client.start(video=False)
+        if args.start_detection:
+            client.start_camera_detection()
+        
+        try:
+            # stop_event只由client.stop()设置，这里用于按时长等待
+            client.stop_event.wait(args.duration)
+        except KeyboardInterrupt:
+            print("\n用户中断程序")
+        finally:
+            if client.valid_signal:
+                # 退出前主动释放服务器租约
+                client.valid_signal = False
+                client.push_control_state()
+            client.stop()
+            print(f"服务器1连接: {client.server1_stats.format_summary()}")
+            print(f"服务器2连接: {client.server2_stats.format_summary()}")
+            print(f"共输出 {writer.count} 条融合结果")
+            if output is not sys.stdout:
+                output.close()
 
 def main():
     """主函数"""
-    print("=== 双服务器运动检测客户端 ===")
-    
-    # 获取服务器地址
-    server1_ip = input("请输入服务器1的IP地址 (默认: 169.254.163.62): ").strip()
-    if not server1_ip:
-        server1_ip = "169.254.163.62"
+    args = parse_args()
+    if args.headless:
+        run_headless(args)
+        return
     
-    server1_port = input("请输入服务器1的端口 (默认: 5001): ").strip()
-    if not server1_port:
-        server1_port = "5001"
-    
-    server2_ip = input("请输入服务器2的IP地址 (默认: 169.254.163.62): ").strip()
-    if not server2_ip:
-        server2_ip = "169.254.163.62"
+    print("=== 双服务器运动检测客户端 ===")
     
-    server2_port = input("请输入服务器2的端口 (默认: 5002): ").strip()
-    if not server2_port:
-        server2_port = "5002"
+    # 获取服务器地址（未通过命令行指定时交互输入）
+    if args.server1:
+        server1_url = normalize_server_url(args.server1)
+    else:
+        server1_ip = input("请输入服务器1的IP地址 (默认: 169.254.163.62): ").strip()
+        if not server1_ip:
+            server1_ip = "169.254.163.62"
+        
+        server1_port = input("请输入服务器1的端口 (默认: 5001): ").strip()
+        if not server1_port:
+            server1_port = "5001"
+        server1_url = f"http://{server1_ip}:{server1_port}"
     
-    server1_url = f"http://{server1_ip}:{server1_port}"
-    server2_url = f"http://{server2_ip}:{server2_port}"
+    if args.server2:
+        server2_url = normalize_server_url(args.server2)
+    else:
+        server2_ip = input("请输入服务器2的IP地址 (默认: 169.254.163.62): ").strip()
+        if not server2_ip:
+            server2_ip = "169.254.163.62"
+        
+        server2_port = input("请输入服务器2的端口 (默认: 5002): ").strip()
+        if not server2_port:
+            server2_port = "5002"
+        server2_url = f"http://{server2_ip}:{server2_port}"
     
     print(f"服务器1: {server1_url}")
     print(f"服务器2: {server2_url}")
     
     # 创建客户端
     client = DualServerClient(server1_url, server2_url)
+    client.data_interval = args.interval
+    client.use_stream = not args.no_stream
+    if args.uart:
+        client.enable_uart(args.uart, args.baudrate)
     
     # 检查服务器状态
     print("检查服务器状态...")
     servers_status = client.check_servers_status()
     
     if servers_status['server1']:
-        print(f"✓ 服务器1状态: {servers_status['server1'].get('message', '正常')}")
+        print(f"✓ 服务器1状态: {servers_status['server1'].get('message', '正常')} ({servers_status['server1']['rtt_ms']}ms)")
     else:
         print("✗ 服务器1无响应")
     
     if servers_status['server2']:
-        print(f"✓ 服务器2状态: {servers_status['server2'].get('message', '正常')}")
+        print(f"✓ 服务器2状态: {servers_status['server2'].get('message', '正常')} ({servers_status['server2']['rtt_ms']}ms)")
     else:
         print("✗ 服务器2无响应")
     
@@ -439,33 +894,42 @@ def main():
     
     try:
         while True:
-            if display_mode == 'dual':
+            # 帧和数据都没有变化时跳过绘制
+            state = client.display_state(display_mode)
+            redraw = client.display.should_draw(state)
+            
+            if redraw and display_mode == 'dual':
                 # 双屏显示模式
                 combined_frame, data1, data2 = client.get_combined_display()
                 cv2.imshow('双服务器运动检测客户端', combined_frame)
                 
-            elif display_mode == 'server1':
+            elif redraw and display_mode == 'server1':
                 # 仅显示服务器1
-                with client.data_lock:
-                    if client.server1_frame is not None:
-                        frame = client.server1_frame.copy()
-                        cv2.putText(frame, "仅服务器1模式", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
-                        cv2.imshow('双服务器运动检测客户端', frame)
+                frame, meta = client.get_server_frame(1)
+                if frame is not None:
+                    frame = frame.copy()
+                    client.server1_latency.on_display(meta)
+                    cv2.putText(frame, "仅服务器1模式", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
+                    cv2.imshow('双服务器运动检测客户端', frame)
                     
-            elif display_mode == 'server2':
+            elif redraw and display_mode == 'server2':
                 # 仅显示服务器2
-                with client.data_lock:
-                    if client.server2_frame is not None:
-                        frame = client.server2_frame.copy()
-                        cv2.putText(frame, "仅服务器2模式", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 255), 2)
-                        cv2.imshow('双服务器运动检测客户端', frame)
+                frame, meta = client.get_server_frame(2)
+                if frame is not None:
+                    frame = frame.copy()
+                    client.server2_latency.on_display(meta)
+                    cv2.putText(frame, "仅服务器2模式", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 255), 2)
+                    cv2.imshow('双服务器运动检测客户端', frame)
+            
+            if redraw:
+                client.display.drawn(state)
             
             # # 打印统计信息
             # if show_info:
             #     client.print_stats()
             
-            # 按键处理
-            key = cv2.waitKey(1) & 0xFF
+            # 按键处理（没有重绘时等待更久，避免空转）
+            key = client.display.wait_key(redraw)
             if key == ord('q'):
                 break
             elif key == ord('s'):  # 显示服务器状态
@@ -473,6 +937,9 @@ def main():
                 print(f"\n服务器状态:")
                 print(f"服务器1: {json.dumps(status['server1'], indent=2, ensure_ascii=False) if status['server1'] else '无响应'}")
                 print(f"服务器2: {json.dumps(status['server2'], indent=2, ensure_ascii=False) if status['server2'] else '无响应'}")
+                print(f"服务器1{client.server1_latency.format_summary()}")
+                print(f"服务器2{client.server2_latency.format_summary()}")
+                print(client.display.format_summary())
             elif key == ord('1'):  # 切换到服务器1
                 display_mode = 'server1'
                 print("切换到服务器1显示模式")
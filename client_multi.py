@@ -0,0 +1,545 @@
+import argparse
+import asyncio
+import json
+import time
+import uuid
+from threading import Thread, Lock, Event
+
+import aiohttp
+import cv2
+import numpy as np
+
+from frame_decoder import LazyFrameDecoder
+from frame_latency import FrameLatencyTracker, frame_meta_from_headers, is_same_frame
+from clock_sync import ClockSync, exchange_times
+from fusion import FusionEngine
+from http_session import Backoff, ConnectionStats
+from mjpeg_stream import MJPEGStreamParser, boundary_from_content_type, DEFAULT_CHUNK_SIZE
+from client_dual import format_estimate
+from uart_protocol import FrameEncoder
+
+PANE_SIZE = (400, 400)
+PANE_COLORS = [(0, 255, 0), (0, 255, 255), (255, 128, 0), (255, 0, 255)]
+
+
+class ServerState:
+    """单个摄像头服务器的连接状态和最新数据"""
+
+    def __init__(self, index, url):
+        self.index = index
+        self.name = f"服务器{index}"
+        self.url = url.rstrip('/')
+        self.video_url = f"{self.url}/video_feed"
+        self.data_url = f"{self.url}/motion_data"
+        self.ping_url = f"{self.url}/ping"
+        self.control_url = f"{self.url}/control"
+        self.heartbeat_url = f"{self.url}/heartbeat"
+        self.clock_url = f"{self.url}/clock"
+
+        # 视频帧（只保存最新的JPEG数据，显示端按需解码）
+        self.jpeg = None
+        self.frame_meta = None
+        self.frame_version = 0
+        self.frame_count = 0
+        self.decoder = LazyFrameDecoder()
+
+        # 运动检测数据和健康状态
+        self.motion_data = {'L': 0, 'T': 0, 'timestamp': 0}
+        self.measured_at = {'L': 0, 'T': 0}  # 已送入融合引擎的最新测量时间戳
+        self.health = None
+        self.connected = False
+
+        # 统计
+        self.latency = FrameLatencyTracker()
+        self.clock = ClockSync()     # 时钟偏差和漂移，服务器时间戳换算到客户端时钟
+        self.stats = ConnectionStats()
+        self.session = None
+
+
+class MultiServerClient:
+    """
+    基于asyncio的多服务器运动检测客户端
+
+    所有服务器的视频流、数据轮询、控制信号和健康检查都运行在同一个后台事件循环中，
+    显示循环（OpenCV主线程）通过加锁读取的方法获取组合状态，
+    增加服务器不会增加线程数量。
+    """
+
+    def __init__(self, server_urls, data_interval=0.5, control_interval=2.0, health_interval=5.0,
+                 control_deadline=3.0, clock_sync_interval=10.0):
+        self.servers = [ServerState(i + 1, url) for i, url in enumerate(server_urls)]
+        self.data_interval = data_interval
+        self.control_interval = control_interval    # 租约心跳间隔（秒）
+        self.lease_ttl = max(3 * control_interval, 3.0)  # 服务器端valid租约有效期（秒）
+        self.health_interval = health_interval
+        self.control_deadline = control_deadline  # 控制信号和健康检查的共同截止时间（秒）
+        self.clock_sync_interval = clock_sync_interval  # 时钟同步间隔（秒）
+
+        # 客户端标识和控制状态
+        self.client_id = str(uuid.uuid4())[:8]
+        self.valid_signal = False
+        self.control_seq = 0        # 控制信号序号，服务器忽略序号更小的旧信号
+
+        # 前两个服务器的测量值做时间对齐融合
+        self.fusion = FusionEngine(tuple(server.name for server in self.servers[:2])) if len(self.servers) >= 2 else None
+        self.fusion_result = None
+
+        # 串口输出：融合结果以二进制帧推送给单片机（enable_uart 启用）
+        self.uart_link = None
+        self.uart_encoder = FrameEncoder()
+
+        self.data_lock = Lock()
+        self.stopped = False
+        self.loop = None
+        self._thread = None
+        self._control_event = None
+        self._ready = Event()       # 事件循环和会话已就绪
+        self._tasks = []
+
+    # ---------- 生命周期 ----------
+
+    def start(self):
+        """在后台线程中启动事件循环"""
+        print(f"客户端ID: {self.client_id}")
+        self.loop = asyncio.new_event_loop()
+        self._thread = Thread(target=self._run_loop, daemon=True)
+        self._thread.start()
+        self._ready.wait(timeout=5)
+        return self
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_until_complete(self._main())
+
+    async def _main(self):
+        self._control_event = asyncio.Event()
+        for server in self.servers:
+            connector = aiohttp.TCPConnector(limit_per_host=4, keepalive_timeout=30)
+            server.session = aiohttp.ClientSession(connector=connector)
+        self._ready.set()
+        try:
+            # 各服务器的任务立即启动，时钟同步在_clock_task中进行，无法连接的服务器不会拖慢其他服务器
+            for server in self.servers:
+                self._tasks += [
+                    asyncio.create_task(self._video_task(server)),
+                    asyncio.create_task(self._data_task(server)),
+                    asyncio.create_task(self._health_task(server)),
+                    asyncio.create_task(self._clock_task(server)),
+                ]
+            self._tasks.append(asyncio.create_task(self._control_task()))
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        finally:
+            for server in self.servers:
+                await server.session.close()
+
+    def enable_uart(self, port, baudrate=115200):
+        """打开持久串口链路，之后每个新的融合结果都通过二进制帧推送给单片机"""
+        from pyuart import UARTLink  # 只有启用串口时才需要pyserial
+        self.uart_link = UARTLink(port, baudrate).start()
+        return self.uart_link
+
+    def stop(self):
+        """停止客户端"""
+        self.stopped = True
+        if self.loop is not None and self.loop.is_running():
+            for task in self._tasks:
+                self.loop.call_soon_threadsafe(task.cancel)
+        if self._thread is not None:
+            self._thread.join(timeout=3)
+        if self.uart_link is not None:
+            self.uart_link.stop()
+
+    def _submit(self, coro, timeout=None):
+        """从其他线程提交协程到事件循环并等待结果"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
+
+    # ---------- 各服务器的协程 ----------
+
+    async def _sync_clock(self, server, samples=5, verbose=True):
+        """一轮NTP式时钟同步，更新服务器时钟的偏差和漂移估计"""
+        for _ in range(samples):
+            try:
+                t0 = time.time()
+                async with server.session.get(server.clock_url, params={'t0': f"{t0:.6f}"},
+                                              timeout=aiohttp.ClientTimeout(total=2)) as response:
+                    data = await response.json()
+                t3 = time.time()
+                server.clock.add_exchange(*exchange_times(t0, data, t3))
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                continue
+        if server.clock.end_round():
+            server.latency.set_clock_offset(server.clock.offset_at())
+        elif verbose and not server.clock.synchronized:
+            print(f"{server.name}时钟偏差获取失败，延迟按零偏差计算")
+
+    async def _clock_task(self, server):
+        """先同步一次时钟，之后定期重新同步，跟踪服务器时钟的漂移"""
+        verbose = True
+        while not self.stopped:
+            await self._sync_clock(server, verbose=verbose)
+            verbose = False
+            await asyncio.sleep(self.clock_sync_interval)
+
+    async def _video_task(self, server):
+        """接收视频流，断开后按指数退避自动重连"""
+        backoff = Backoff()
+        timeout = aiohttp.ClientTimeout(total=None, sock_connect=10, sock_read=10)
+        while not self.stopped:
+            try:
+                print(f"正在连接{server.name}视频流: {server.video_url}")
+                async with server.session.get(server.video_url, timeout=timeout) as response:
+                    response.raise_for_status()
+                    server.connected = True
+                    server.stats.record_connect()
+                    backoff.reset()
+                    print(f"✓ {server.name}视频流连接成功")
+
+                    parser = MJPEGStreamParser(boundary_from_content_type(response.headers.get('Content-Type')))
+                    async for chunk in response.content.iter_chunked(DEFAULT_CHUNK_SIZE):
+                        for headers, jpg_data in parser.feed(chunk):
+                            meta = frame_meta_from_headers(headers)
+                            with self.data_lock:
+                                server.latency.on_receive(meta)
+                                if is_same_frame(meta, server.frame_meta):
+                                    continue
+                                server.jpeg = jpg_data
+                                server.frame_meta = meta
+                                server.frame_version += 1
+                                server.frame_count += 1
+                raise ConnectionError("视频流已结束")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                server.connected = False
+                server.stats.record_failure(e)
+                delay = backoff.next_delay()
+                print(f"✗ {server.name}视频流连接失败: {e}，{delay:.1f}秒后重连")
+                await asyncio.sleep(delay)
+
+    async def _data_task(self, server):
+        """轮询运动检测数据，失败时按指数退避重试"""
+        backoff = Backoff()
+        timeout = aiohttp.ClientTimeout(total=5)
+        while not self.stopped:
+            delay = self.data_interval
+            try:
+                request_start = time.perf_counter()
+                async with server.session.get(server.data_url, timeout=timeout) as response:
+                    if response.status == 200:
+                        data = await response.json()
+                        server.stats.record_latency(time.perf_counter() - request_start)
+                        with self.data_lock:
+                            # 服务器时间戳换算到客户端时钟
+                            server.motion_data = server.clock.to_client_data(data)
+                        self._feed_fusion(server, data)
+                        backoff.reset()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                server.stats.record_failure(e)
+                delay = max(delay, backoff.next_delay())
+                print(f"{server.name}数据获取失败: {e}，{delay:.1f}秒后重试")
+            await asyncio.sleep(delay)
+
+    def _feed_fusion(self, server, data):
+        """把新的L、T测量值（换算到客户端时钟）送入融合引擎并更新融合结果"""
+        if self.fusion is None or server.index > 2:
+            return
+        updated = False
+        for key in ('L', 'T'):
+            measured_at = data.get(f'{key}_timestamp')
+            if measured_at and measured_at != server.measured_at[key]:
+                server.measured_at[key] = measured_at
+                self.fusion.add_measurement(server.name, server.clock.to_client(measured_at), **{key: data.get(key)})
+                updated = True
+        if updated or self.fusion_result is None:
+            self.fusion_result = self.fusion.fuse(time.time())
+        if updated and self.uart_link is not None:
+            self.uart_link.send(self.uart_encoder.fusion(self.fusion_result), key='fusion')
+
+    async def _health_task(self, server):
+        """定期健康检查"""
+        while not self.stopped:
+            health = await self._ping(server)
+            with self.data_lock:
+                server.health = health
+            await asyncio.sleep(self.health_interval)
+
+    async def _ping(self, server):
+        try:
+            async with server.session.get(server.ping_url, timeout=aiohttp.ClientTimeout(total=self.control_deadline)) as response:
+                if response.status == 200:
+                    return await response.json()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            pass
+        return None
+
+    async def _control_task(self):
+        """状态变化时立即推送控制信号，valid期间定期发送心跳为服务器端租约续期"""
+        resend = True  # 启动时先同步一次当前状态
+        while not self.stopped:
+            if resend:
+                self._control_event.clear()
+                self.control_seq += 1
+                control_data = {
+                    'valid': self.valid_signal,
+                    'client_id': self.client_id,
+                    'seq': self.control_seq,
+                    'ttl': self.lease_ttl,
+                    'timestamp': time.time()
+                }
+                await self._fan_out(lambda server: self._send_control(server, control_data), self.control_deadline)
+            elif self.valid_signal:
+                results = await self._fan_out(self._send_heartbeat, self.control_deadline)
+                lost = [(server, data) for server, (data, _) in zip(self.servers, results)
+                        if data and data.get('status') == 'no_lease']
+                revoked = [(server, data) for server, data in lost if data.get('reason') == 'revoked']
+                if revoked:
+                    # 租约被其他来源（如单片机通过串口）停止：不再重新启动，所有服务器都停止
+                    server, data = revoked[0]
+                    print(f"{server.name}的摄像识别已被{data.get('source')}停止，所有服务器都停止摄像识别")
+                    self.valid_signal = False
+                if lost:
+                    # 有服务器的租约已失效（例如服务器重启）或被停止，立即重新发送当前状态
+                    resend = True
+                    continue
+            try:
+                await asyncio.wait_for(self._control_event.wait(), timeout=self.control_interval)
+                resend = True
+            except asyncio.TimeoutError:
+                resend = False
+
+    async def _send_heartbeat(self, server):
+        """发送租约心跳，返回服务器的响应字典（'status'为'ok'/'no_lease'，no_lease时带'reason'），失败返回None"""
+        try:
+            async with server.session.post(server.heartbeat_url,
+                                           json={'client_id': self.client_id, 'ttl': self.lease_ttl}) as response:
+                if response.status == 200:
+                    return await response.json()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            pass
+        return None
+
+    async def _fan_out(self, make_request, deadline):
+        """
+        并发向所有服务器发送请求，共享同一个截止时间
+
+        返回与self.servers顺序一致的 [(结果, 往返时间秒)]，超时的服务器为 (None, None)
+        """
+        async def timed(server):
+            start = time.perf_counter()
+            result = await make_request(server)
+            return result, time.perf_counter() - start
+
+        tasks = [asyncio.create_task(timed(server)) for server in self.servers]
+        done, pending = await asyncio.wait(tasks, timeout=deadline)
+        for task in pending:
+            task.cancel()
+        results = []
+        for server, task in zip(self.servers, tasks):
+            if task in done and task.exception() is None:
+                results.append(task.result())
+            else:
+                if task in pending:
+                    print(f"✗ {server.name}请求超过截止时间")
+                results.append((None, None))
+        return results
+
+    async def _send_control(self, server, data):
+        """向单个服务器发送控制信号，成功返回服务器响应"""
+        try:
+            async with server.session.post(server.control_url, json=data) as response:
+                if response.status == 200:
+                    result = await response.json()
+                    if result.get('status') == 'success':
+                        status_msg = "启动" if data['valid'] else "停止"
+                        print(f"✓ {server.name}摄像识别{status_msg}成功")
+                        return result
+                    elif result.get('status') == 'stale':
+                        print(f"{server.name}忽略了过期的控制信号")
+                    else:
+                        print(f"✗ {server.name}响应错误: {result.get('message', '未知错误')}")
+                else:
+                    print(f"✗ {server.name}HTTP错误: {response.status}")
+        except asyncio.CancelledError:
+            raise
+        except aiohttp.ClientConnectionError:
+            print(f"✗ {server.name}连接失败")
+        except Exception as e:
+            print(f"✗ {server.name}发送错误: {e}")
+        return None
+
+    # ---------- 供显示线程调用的接口 ----------
+
+    def set_valid(self, valid):
+        """设置valid信号并立即推送到所有服务器"""
+        self.valid_signal = valid
+        if self.loop is not None and self._control_event is not None:
+            self.loop.call_soon_threadsafe(self._control_event.set)
+
+    def start_camera_detection(self):
+        """启动摄像识别"""
+        if not self.valid_signal:
+            print(f"📹 启动{len(self.servers)}个服务器的摄像识别...")
+            self.set_valid(True)
+
+    def stop_camera_detection(self):
+        """停止摄像识别"""
+        if self.valid_signal:
+            print(f"⏹️ 停止{len(self.servers)}个服务器的摄像识别...")
+            self.set_valid(False)
+
+    def toggle_camera_detection(self):
+        """切换摄像识别状态"""
+        if self.valid_signal:
+            self.stop_camera_detection()
+        else:
+            self.start_camera_detection()
+
+    def check_servers_status(self):
+        """并发检查所有服务器状态，返回 {服务器名: ping结果或None}，结果中附带往返时间rtt_ms"""
+        results = self._submit(self._fan_out(self._ping, self.control_deadline),
+                               timeout=self.control_deadline + 1)
+        status = {}
+        for server, (result, rtt) in zip(self.servers, results):
+            status[server.name] = dict(result, rtt_ms=round(rtt * 1000, 1)) if result else None
+        return status
+
+    def get_server_frame(self, server, target_size=None):
+        """按需解码指定服务器的最新帧，返回 (frame, meta)"""
+        with self.data_lock:
+            jpeg, version, meta = server.jpeg, server.frame_version, server.frame_meta
+        return server.decoder.decode(jpeg, version, target_size), meta
+
+    def get_motion_data(self):
+        """返回所有服务器运动检测数据的副本列表"""
+        with self.data_lock:
+            return [server.motion_data.copy() for server in self.servers]
+
+    def get_combined_display(self, servers=None):
+        """获取组合显示的图像，每个服务器一个400x400窗格"""
+        servers = servers or self.servers
+        all_data = self.get_motion_data()
+
+        # 前两个服务器的融合结果：摆动角度和摆长
+        fusion = self.fusion_result
+
+        panes = []
+        display_time = time.time()
+        for server in servers:
+            frame, meta = self.get_server_frame(server, PANE_SIZE)
+            data = all_data[server.index - 1]
+            color = PANE_COLORS[(server.index - 1) % len(PANE_COLORS)]
+            if frame is not None:
+                server.latency.on_display(meta, display_time)
+                pane = cv2.resize(frame, PANE_SIZE)
+                cv2.putText(pane, f"SERVER {server.index}", (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, color, 2)
+                cv2.putText(pane, f"L: {data.get('L', 0):.1f}",
+                            (10, 90), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
+                cv2.putText(pane, f"T: {data.get('T', 0):.2f}s",
+                            (10, 120), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
+                if fusion is not None and server.index == 1:
+                    cv2.putText(pane, f"angle: {format_estimate(fusion['angle_deg'], fusion['angle_err'], 2)}",
+                                (10, 150), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 255), 2)
+                    cv2.putText(pane, f"L0: {format_estimate(fusion['length'], fusion['length_err'], 3, 'm')}",
+                                (10, 180), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 255), 2)
+            else:
+                pane = np.zeros((PANE_SIZE[1], PANE_SIZE[0], 3), dtype=np.uint8)
+                cv2.putText(pane, f"SERVER {server.index}", (120, 180), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
+                cv2.putText(pane, "NO SIGNAL", (110, 220), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
+            panes.append(pane)
+
+        return cv2.hconcat(panes), all_data
+
+    def print_stats(self):
+        """打印统计信息"""
+        print("\n=== 统计信息 ===")
+        for server in self.servers:
+            print(f"{server.name}: 帧数={server.frame_count}, 连接={'正常' if server.connected else '断开'}, "
+                  f"解码={server.decoder.decoded_frames}")
+            print(f"  连接: {server.stats.format_summary()}")
+            print(f"  {server.latency.format_summary()}")
+        print(f"摄像识别: {'运行中' if self.valid_signal else '已停止'}")
+        print("================\n")
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description='多服务器运动检测客户端（asyncio）')
+    parser.add_argument('servers', nargs='*',
+                        default=['http://169.254.163.62:5001', 'http://169.254.163.62:5002'],
+                        help='服务器地址列表，如 http://169.254.163.62:5001')
+    parser.add_argument('--uart', help='向单片机推送融合结果的串口（如 /dev/ttyUSB0），不指定则不使用串口')
+    parser.add_argument('--baudrate', type=int, default=115200, help='串口波特率')
+    args = parser.parse_args()
+
+    print("=== 多服务器运动检测客户端 ===")
+    client = MultiServerClient(args.servers)
+    if args.uart:
+        client.enable_uart(args.uart, args.baudrate)
+    client.start()
+
+    # 检查服务器状态
+    print("检查服务器状态...")
+    for name, status in client.check_servers_status().items():
+        if status:
+            print(f"✓ {name}状态: {status.get('message', '正常')}")
+        else:
+            print(f"✗ {name}无响应")
+
+    print("\n=== 控制说明 ===")
+    print("按 'q' 退出程序")
+    print("按 's' 显示服务器状态")
+    print(f"按 '1'-'{min(len(client.servers), 9)}' 只显示对应服务器")
+    print("按 'b' 显示全部服务器")
+    print("按 'i' 显示统计信息")
+    print("按 'v' 切换摄像识别开关")
+    print("按 'c' 启动摄像识别")
+    print("按 'x' 停止摄像识别")
+    print("================\n")
+
+    selected = None  # None表示显示全部服务器
+    window = '多服务器运动检测客户端'
+    try:
+        while True:
+            servers = client.servers if selected is None else [selected]
+            combined_frame, _ = client.get_combined_display(servers)
+            cv2.imshow(window, combined_frame)
+
+            key = cv2.waitKey(1) & 0xFF
+            if key == ord('q'):
+                break
+            elif key == ord('s'):
+                for name, status in client.check_servers_status().items():
+                    print(f"{name}: {json.dumps(status, indent=2, ensure_ascii=False) if status else '无响应'}")
+            elif ord('1') <= key <= ord('9') and key - ord('1') < len(client.servers):
+                selected = client.servers[key - ord('1')]
+                print(f"切换到{selected.name}显示模式")
+            elif key == ord('b'):
+                selected = None
+                print("切换到全部服务器显示模式")
+            elif key == ord('i'):
+                client.print_stats()
+            elif key == ord('v'):
+                client.toggle_camera_detection()
+            elif key == ord('c'):
+                client.start_camera_detection()
+            elif key == ord('x'):
+                client.stop_camera_detection()
+
+    except KeyboardInterrupt:
+        print("\n用户中断程序")
+    finally:
+        client.stop()
+        cv2.destroyAllWindows()
+        print("客户端已退出")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,178 @@
+import time
+from collections import deque
+
+import requests
+
+# 服务器时间戳字段：换算到客户端时钟时处理这些键
+TIMESTAMP_KEYS = ('timestamp', 'L_timestamp', 'T_timestamp')
+
+MAX_DRIFT = 500e-6          # 漂移估计的上限（500ppm，远大于普通晶振的误差）
+STEP_THRESHOLD = 0.05       # 偏差与预测值相差超过该值（秒）视为服务器时钟跳变，丢弃历史重新估计
+
+
+def clock_exchange(base_url, session=None, timeout=2):
+    """
+    与服务器的 /clock 端点做一次NTP式时间交换
+
+    客户端发送时间t0作为参数，服务器返回收到请求的时间t1和发出响应的时间t2，客户端记录收到响应的时间t3。
+    旧版服务器只返回server_time时，t1和t2都取server_time（等价于取往返中点）。
+
+    返回:
+    (t0, t1, t2, t3)
+
+    异常:
+    requests.RequestException, KeyError, ValueError -- 请求失败或响应格式不对
+    """
+    http = session or requests
+    t0 = time.time()
+    response = http.get(f"{base_url.rstrip('/')}/clock", params={'t0': f"{t0:.6f}"}, timeout=timeout)
+    t3 = time.time()
+    response.raise_for_status()
+    return exchange_times(t0, response.json(), t3)
+
+
+def exchange_times(t0, data, t3):
+    """从 /clock 的响应数据取出 (t0, t1, t2, t3)"""
+    t1 = float(data.get('t1', data['server_time']))
+    t2 = float(data.get('t2', data['server_time']))
+    return t0, t1, t2, t3
+
+
+class ClockSync:
+    """
+    估计一个服务器的时钟相对客户端时钟的偏差和漂移
+
+    每次交换得到 偏差 = ((t1 - t0) + (t2 - t3)) / 2，网络延迟 = (t3 - t0) - (t2 - t1)。
+    每轮同步发送若干次交换，只保留网络延迟最小的一次（排队等待最少，偏差最准）；
+    最近window轮中延迟不超过最小延迟max_delay_factor倍的结果按客户端时间做最小二乘直线拟合，
+    截距为偏差，斜率为漂移。网络延迟正常的一轮偏差突然跳变时先暂存，下一轮确认了同样的跳变
+    （服务器校时或重启）才丢弃历史重新估计；网络拥塞造成的跳变由拟合时的延迟过滤排除。
+    偏差定义为 服务器时钟 - 客户端时钟（与FrameLatencyTracker.clock_offset相同）。
+    """
+
+    def __init__(self, window=32, max_delay_factor=3.0, min_drift_span=30.0):
+        """
+        参数:
+        window -- 参与拟合的最近同步轮数
+        max_delay_factor -- 网络延迟超过最小延迟的倍数（另加1ms容差）的轮次不参与拟合
+        min_drift_span -- 样本跨度少于该时间（秒）时不估计漂移
+        """
+        self.max_delay_factor = max_delay_factor
+        self.min_drift_span = min_drift_span
+        self._rounds = deque(maxlen=window)      # (客户端时间, 偏差, 网络延迟)
+        self._pending = None                     # 本轮中延迟最小的交换
+        self._fit = None                         # (参考客户端时间, 偏差, 漂移)
+        self._step_candidate = None              # 偏差跳变、等待下一轮确认的一轮结果
+        self.exchanges = 0
+        self.steps = 0
+
+    @property
+    def synchronized(self):
+        return self._fit is not None
+
+    def add_exchange(self, t0, t1, t2, t3):
+        """记录一次交换，返回 (偏差, 网络延迟)；本轮的结果在end_round()时才生效"""
+        offset = ((t1 - t0) + (t2 - t3)) / 2
+        delay = max(0.0, (t3 - t0) - (t2 - t1))
+        self.exchanges += 1
+        if self._pending is None or delay < self._pending[2]:
+            self._pending = ((t0 + t3) / 2, offset, delay)
+        return offset, delay
+
+    def end_round(self):
+        """结束一轮同步，用本轮延迟最小的交换更新估计；本轮没有成功的交换时返回False"""
+        sample, self._pending = self._pending, None
+        if sample is None:
+            return False
+        candidate, self._step_candidate = self._step_candidate, None
+        if self._fit is not None and abs(sample[1] - self.offset_at(sample[0])) > STEP_THRESHOLD \
+                and sample[2] <= self._delay_limit(sample[2]):
+            if candidate is None or abs(sample[1] - candidate[1]) > STEP_THRESHOLD:
+                # 只有一轮跳变，可能是偶发的不对称延迟：暂不采用，等下一轮确认
+                self._step_candidate = sample
+                return True
+            # 连续两轮跳变到同一偏差：服务器时钟确实跳变了
+            self._rounds.clear()
+            self._rounds.append(candidate)
+            self.steps += 1
+        self._rounds.append(sample)
+        self._refit()
+        return True
+
+    def _delay_limit(self, delay=None):
+        """参与拟合的最大网络延迟"""
+        delays = [d for _, _, d in self._rounds]
+        if delay is not None:
+            delays.append(delay)
+        return min(delays) * self.max_delay_factor + 0.001
+
+    def _refit(self):
+        limit = self._delay_limit()
+        rounds = [(t, offset) for t, offset, delay in self._rounds if delay <= limit]
+        reference = rounds[-1][0]
+        span = reference - rounds[0][0]
+        drift = 0.0
+        if len(rounds) >= 3 and span >= self.min_drift_span:
+            mean_t = sum(t for t, _ in rounds) / len(rounds)
+            mean_offset = sum(offset for _, offset in rounds) / len(rounds)
+            var_t = sum((t - mean_t) ** 2 for t, _ in rounds)
+            cov = sum((t - mean_t) * (offset - mean_offset) for t, offset in rounds)
+            drift = min(max(cov / var_t, -MAX_DRIFT), MAX_DRIFT)
+            offset = mean_offset + drift * (reference - mean_t)
+        else:
+            # 跨度太短，漂移估计不可靠：取最近几轮偏差的中位数
+            recent = sorted(offset for _, offset in rounds[-5:])
+            offset = recent[len(recent) // 2]
+        self._fit = (reference, offset, drift)
+
+    def offset_at(self, client_time=None):
+        """客户端时间client_time时的偏差（秒），还没有同步时为0"""
+        if self._fit is None:
+            return 0.0
+        reference, offset, drift = self._fit
+        if client_time is None:
+            client_time = time.time()
+        return offset + drift * (client_time - reference)
+
+    def to_client(self, server_time):
+        """把服务器时间戳换算到客户端时钟"""
+        if not server_time:
+            return server_time
+        return server_time - self.offset_at(server_time - self.offset_at(server_time))
+
+    def to_client_data(self, data, keys=TIMESTAMP_KEYS):
+        """返回数据字典的副本，其中的服务器时间戳已换算到客户端时钟（没有timestamp时取当前时间）"""
+        mapped = dict(data)
+        for key in keys:
+            if mapped.get(key):
+                mapped[key] = self.to_client(mapped[key])
+        if not mapped.get('timestamp'):
+            mapped['timestamp'] = time.time()
+        return mapped
+
+    def summary(self):
+        reference, offset, drift = self._fit or (None, 0.0, 0.0)
+        delays = [delay for _, _, delay in self._rounds]
+        return {
+            'offset_ms': round(self.offset_at() * 1000, 3),
+            'drift_ppm': round(drift * 1e6, 2),
+            'min_delay_ms': round(min(delays) * 1000, 3) if delays else None,
+            'rounds': len(self._rounds),
+            'exchanges': self.exchanges,
+            'steps': self.steps,
+        }
+
+
+def sync_round(base_url, clock, samples=5, session=None, timeout=2):
+    """
+    对一个服务器做一轮同步（samples次交换），更新clock
+
+    返回:
+    本轮是否有成功的交换
+    """
+    for _ in range(samples):
+        try:
+            clock.add_exchange(*clock_exchange(base_url, session=session, timeout=timeout))
+        except Exception:
+            continue
+    return clock.end_round()
@@ -0,0 +1,152 @@
+import threading
+import time
+
+DEFAULT_LEASE_TTL = 6.0     # 默认租约有效期（秒）
+MAX_LEASE_TTL = 60.0
+
+
+class ControlLease:
+    """
+    以租约形式保存valid控制状态
+
+    valid=True 时租约在TTL后到期，客户端通过心跳续约；到期后自动回到待机。
+    每个客户端的控制信号带递增序号，序号不大于已处理序号的旧信号会被忽略。
+    """
+
+    def __init__(self, default_ttl=DEFAULT_LEASE_TTL, on_change=None):
+        """
+        参数:
+        default_ttl -- 客户端未指定TTL时使用的租约有效期（秒）
+        on_change -- 状态变化时的回调 on_change(valid, source, reason)
+        """
+        self.default_ttl = default_ttl
+        self.on_change = on_change
+        self.lock = threading.Lock()
+
+        self.valid = False
+        self.holder = None          # 当前持有租约的客户端
+        self.source = None          # 最近一次生效的控制来源（http/uart/...）
+        self.reason = None          # 最近一次状态变化的原因：'signal'（控制信号）或 'expired'（到期）
+        self.expires_at = 0.0       # time.monotonic() 下的到期时间
+        self.ttl = default_ttl
+        self._last_seq = {}         # 每个客户端已处理的最大序号
+
+        # 统计
+        self.changes = 0
+        self.heartbeats = 0
+        self.stale_signals = 0
+        self.expirations = 0
+
+    def _ttl(self, ttl):
+        if ttl is None:
+            return self.default_ttl
+        return min(max(float(ttl), 0.1), MAX_LEASE_TTL)
+
+    def apply(self, valid, client_id='unknown', seq=None, ttl=None, source='http'):
+        """
+        应用一次控制信号
+
+        返回:
+        True 表示已应用，False 表示旧序号被忽略
+        """
+        with self.lock:
+            if seq is not None:
+                last = self._last_seq.get(client_id)
+                if last is not None and seq <= last:
+                    self.stale_signals += 1
+                    return False
+                self._last_seq[client_id] = seq
+
+            changed = bool(valid) != self.valid
+            self.valid = bool(valid)
+            self.source = source
+            self.reason = 'signal'
+            if self.valid:
+                self.holder = client_id
+                self.ttl = self._ttl(ttl)
+                self.expires_at = time.monotonic() + self.ttl
+            else:
+                self.holder = None
+                self.expires_at = 0.0
+            if changed:
+                self.changes += 1
+        if changed:
+            self._notify(source, 'signal')
+        return True
+
+    def heartbeat(self, client_id='unknown', ttl=None):
+        """
+        续约
+
+        返回:
+        True 表示该客户端持有的租约已续期，False 表示没有有效租约（需要重新发送控制信号）
+        """
+        renewed = False
+        with self.lock:
+            expired = self._expire_locked()
+            if self.valid and self.holder == client_id:
+                if ttl is not None:
+                    self.ttl = self._ttl(ttl)
+                self.expires_at = time.monotonic() + self.ttl
+                self.heartbeats += 1
+                renewed = True
+        if expired:
+            self._notify(self.source, 'expired')
+        return renewed
+
+    def lost_reason(self):
+        """
+        心跳没有续上租约的原因（告诉客户端是否应该重新发送valid信号）
+
+        返回:
+        'expired' -- 租约已到期，客户端应重新发送；
+        'revoked' -- 被其他来源（串口、其他客户端）的控制信号停止或接管，客户端不应再发送valid=True；
+        'unknown' -- 服务器没有租约记录（如刚重启），客户端应重新发送
+        """
+        with self.lock:
+            if self.reason == 'expired':
+                return 'expired'
+            if self.reason == 'signal':
+                return 'revoked'
+            return 'unknown'
+
+    def is_active(self):
+        """检查租约是否有效，已到期时自动回到待机"""
+        with self.lock:
+            expired = self._expire_locked()
+            valid = self.valid
+        if expired:
+            self._notify(self.source, 'expired')
+        return valid
+
+    def _expire_locked(self):
+        if self.valid and self.expires_at and time.monotonic() >= self.expires_at:
+            self.valid = False
+            self.holder = None
+            self.expires_at = 0.0
+            self.reason = 'expired'
+            self.expirations += 1
+            self.changes += 1
+            return True
+        return False
+
+    def _notify(self, source, reason):
+        if self.on_change is not None:
+            self.on_change(self.valid, source, reason)
+
+    def snapshot(self):
+        """返回当前租约状态字典"""
+        with self.lock:
+            remaining = max(0.0, self.expires_at - time.monotonic()) if self.valid else 0.0
+            return {
+                'valid': self.valid,
+                'holder': self.holder,
+                'source': self.source,
+                'reason': self.reason,
+                'ttl': self.ttl,
+                'expires_in': round(remaining, 3),
+                'changes': self.changes,
+                'heartbeats': self.heartbeats,
+                'stale_signals': self.stale_signals,
+                'expirations': self.expirations,
+            }
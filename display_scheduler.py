@@ -0,0 +1,82 @@
+import time
+from contextlib import contextmanager
+
+import cv2
+
+
+class DisplayScheduler:
+    """
+    按数据版本决定是否重绘的显示调度器
+
+    显示循环把当前帧版本、数据版本和显示模式组成状态元组交给should_draw()，
+    状态未变化时跳过绘制，并用较长的waitKey等待，避免空转占满CPU。
+    同时统计显示帧率和显示线程持有数据锁的时间。
+    """
+
+    def __init__(self, idle_wait_ms=10):
+        self.idle_wait_ms = idle_wait_ms
+        self._last_state = None
+        self._last_draw_time = None
+
+        # 统计
+        self.draws = 0
+        self.skipped = 0
+        self.fps = 0.0                  # 显示帧率（指数滑动平均）
+        self.lock_holds = 0
+        self.lock_hold_total = 0.0
+        self.lock_hold_max = 0.0
+
+    def should_draw(self, state):
+        """状态与上次绘制时不同才需要重绘"""
+        if state == self._last_state:
+            self.skipped += 1
+            return False
+        return True
+
+    def drawn(self, state):
+        """记录一次绘制"""
+        now = time.perf_counter()
+        if self._last_draw_time is not None:
+            interval = now - self._last_draw_time
+            if interval > 0:
+                instant_fps = 1.0 / interval
+                self.fps = instant_fps if self.draws <= 1 else 0.9 * self.fps + 0.1 * instant_fps
+        self._last_draw_time = now
+        self._last_state = state
+        self.draws += 1
+
+    def invalidate(self):
+        """强制下一次重绘（如显示模式切换）"""
+        self._last_state = None
+
+    @contextmanager
+    def timed_lock(self, lock):
+        """获取锁并统计持有时间"""
+        with lock:
+            start = time.perf_counter()
+            try:
+                yield
+            finally:
+                held = time.perf_counter() - start
+                self.lock_holds += 1
+                self.lock_hold_total += held
+                self.lock_hold_max = max(self.lock_hold_max, held)
+
+    def wait_key(self, drew):
+        """刚绘制过时只等待1ms保持响应，否则等待idle_wait_ms"""
+        return cv2.waitKey(1 if drew else self.idle_wait_ms) & 0xFF
+
+    def summary(self):
+        return {
+            'display_fps': self.fps,
+            'draws': self.draws,
+            'skipped': self.skipped,
+            'lock_hold_avg_us': self.lock_hold_total / self.lock_holds * 1e6 if self.lock_holds else None,
+            'lock_hold_max_us': self.lock_hold_max * 1e6,
+        }
+
+    def format_summary(self):
+        s = self.summary()
+        lock_text = (f"锁持有 平均={s['lock_hold_avg_us']:.1f}us 最大={s['lock_hold_max_us']:.1f}us"
+                     if s['lock_hold_avg_us'] is not None else "锁持有: 暂无数据")
+        return f"显示帧率={s['display_fps']:.1f}fps, 重绘={s['draws']}, 跳过={s['skipped']}, {lock_text}"
@@ -0,0 +1,65 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+
+def _result(ok=False, status_code=None, data=None, error=None, rtt=None):
+    return {'ok': ok, 'status_code': status_code, 'data': data, 'error': error, 'rtt': rtt}
+
+
+class FanOut:
+    """
+    将同一个请求并发发送到多个服务器，所有请求共享一个截止时间
+
+    一个服务器无响应不会拖慢其他服务器，结果中包含每个服务器的往返时间。
+    """
+
+    def __init__(self, max_workers=8):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='fanout')
+
+    def request(self, targets, method='GET', json=None, deadline=3.0):
+        """
+        参数:
+        targets -- {名称: (session, url)} 字典
+        method -- HTTP方法
+        json -- POST时发送的JSON数据
+        deadline -- 所有请求共享的截止时间（秒）
+
+        返回:
+        {名称: {'ok', 'status_code', 'data', 'error', 'rtt'}} 字典，
+        rtt为秒，超过截止时间未返回的服务器error为'deadline'
+        """
+        end_time = time.perf_counter() + deadline
+        futures = {
+            name: self.executor.submit(self._call, session, method, url, json, end_time)
+            for name, (session, url) in targets.items()
+        }
+        wait(futures.values(), timeout=deadline)
+
+        results = {}
+        for name, future in futures.items():
+            if future.done():
+                results[name] = future.result()
+            else:
+                results[name] = _result(error='deadline')
+        return results
+
+    @staticmethod
+    def _call(session, method, url, json, end_time):
+        timeout = end_time - time.perf_counter()
+        if timeout <= 0:
+            return _result(error='deadline')
+        start = time.perf_counter()
+        try:
+            response = session.request(method, url, json=json, timeout=timeout)
+            rtt = time.perf_counter() - start
+            try:
+                data = response.json()
+            except ValueError:
+                data = None
+            return _result(ok=response.status_code == 200, status_code=response.status_code,
+                           data=data, rtt=rtt)
+        except Exception as e:
+            return _result(error=e, rtt=time.perf_counter() - start)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
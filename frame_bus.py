@@ -0,0 +1,189 @@
+import json
+import threading
+import time
+from collections import deque, namedtuple
+
+from frame_latency import HEADER_FRAME_SEQ, HEADER_CAPTURE_TS, HEADER_ENCODE_TS
+
+# 发布后不再修改的视频帧；part是预先拼好的multipart分段（边界、头部、JPEG数据），所有观看者共用；
+# data是与这一帧对应的检测数据，data_part是它的JSON分段（没有数据时为None）
+Frame = namedtuple('Frame', ['seq', 'jpeg', 'capture_ts', 'encode_ts', 'part', 'data', 'data_part'])
+
+
+def build_part(jpeg, seq, capture_ts, encode_ts):
+    """生成一帧的multipart分段（boundary=frame），头部带帧序号和时间戳"""
+    return (b'--frame\r\n'
+            b'Content-Type: image/jpeg\r\n' +
+            (f"Content-Length: {len(jpeg)}\r\n"
+             f"{HEADER_FRAME_SEQ}: {seq}\r\n"
+             f"{HEADER_CAPTURE_TS}: {capture_ts:.6f}\r\n"
+             f"{HEADER_ENCODE_TS}: {encode_ts:.6f}\r\n").encode('ascii') +
+            b'\r\n' + jpeg + b'\r\n')
+
+
+def build_data_part(data, seq, capture_ts):
+    """生成一帧检测数据的JSON分段，帧序号与对应的JPEG分段相同"""
+    body = json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return (b'--frame\r\n'
+            b'Content-Type: application/json\r\n' +
+            (f"Content-Length: {len(body)}\r\n"
+             f"{HEADER_FRAME_SEQ}: {seq}\r\n"
+             f"{HEADER_CAPTURE_TS}: {capture_ts:.6f}\r\n").encode('ascii') +
+            b'\r\n' + body + b'\r\n')
+
+
+class Subscription:
+    """
+    一个观看者的帧队列
+
+    队列满时丢弃最旧的帧并计数，生产者放入帧只占用这个队列自己的锁片刻，
+    不会等待观看者的网络发送。
+    """
+
+    def __init__(self, bus, maxsize):
+        self._bus = bus
+        self._queue = deque(maxlen=maxsize)
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self.delivered = 0
+        self.dropped = 0        # 因为观看者太慢而丢弃的帧数
+
+    def put(self, frame):
+        with self._lock:
+            if len(self._queue) == self._queue.maxlen:
+                self.dropped += 1
+            self._queue.append(frame)
+            self._ready.set()
+
+    def get(self, timeout=None):
+        """取出最早的一帧，超时返回None"""
+        if not self._ready.wait(timeout):
+            return None
+        with self._lock:
+            frame = self._queue.popleft() if self._queue else None
+            if not self._queue:
+                self._ready.clear()
+        if frame is not None:
+            self.delivered += 1
+        return frame
+
+    def close(self):
+        self._bus._unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def summary(self):
+        return {'delivered': self.delivered, 'dropped': self.dropped, 'queued': len(self._queue)}
+
+
+class FrameBus:
+    """
+    视频帧发布
+
+    生产者（检测线程）在任何锁之外编码，publish()只生成一个不可变的Frame并替换最新帧引用，
+    再放入每个订阅者的队列。订阅者列表按写时复制的元组保存，发布时遍历不需要加锁。
+    一个很慢的观看者只会在自己的队列里丢帧，不会拖慢检测线程和其他观看者。
+    假定只有一个生产者线程。
+    """
+
+    def __init__(self, queue_size=2):
+        """queue_size -- 每个订阅者最多缓存的帧数"""
+        self.queue_size = queue_size
+        self._latest = None
+        self._subscribers = ()
+        self._subscribe_lock = threading.Lock()
+        self._seq = 0
+        self.published = 0
+        self.closed_dropped = 0     # 已断开的订阅者累计丢弃的帧数
+
+    @property
+    def seq(self):
+        return self._seq
+
+    def publish(self, jpeg, capture_ts, data=None, encode_ts=None):
+        """
+        发布一帧已编码的JPEG，返回Frame
+
+        参数:
+        data -- 与这一帧对应的检测数据字典（/stream中作为JSON分段紧接在JPEG之前发送）
+        """
+        encode_ts = time.time() if encode_ts is None else encode_ts
+        seq = self._seq + 1
+        frame = Frame(seq, jpeg, capture_ts, encode_ts, build_part(jpeg, seq, capture_ts, encode_ts),
+                      data, build_data_part(data, seq, capture_ts) if data is not None else None)
+        self._latest = frame
+        self._seq = seq
+        self.published += 1
+        for subscription in self._subscribers:
+            subscription.put(frame)
+        return frame
+
+    def latest(self):
+        """最新一帧，还没有帧时返回None"""
+        return self._latest
+
+    def subscribe(self, maxsize=None, send_latest=True):
+        """
+        新建订阅
+
+        参数:
+        maxsize -- 队列长度，None表示使用queue_size
+        send_latest -- 是否先放入当前最新的一帧，观看者连接后立即有画面
+        """
+        subscription = Subscription(self, maxsize or self.queue_size)
+        if send_latest and self._latest is not None:
+            subscription.put(self._latest)
+        with self._subscribe_lock:
+            self._subscribers = self._subscribers + (subscription,)
+        return subscription
+
+    def _unsubscribe(self, subscription):
+        with self._subscribe_lock:
+            if subscription in self._subscribers:
+                self._subscribers = tuple(s for s in self._subscribers if s is not subscription)
+                self.closed_dropped += subscription.dropped
+
+    def summary(self):
+        subscribers = self._subscribers
+        return {
+            'seq': self._seq,
+            'subscribers': len(subscribers),
+            'dropped': self.closed_dropped + sum(s.dropped for s in subscribers),
+            'per_subscriber': [s.summary() for s in subscribers],
+        }
+
+
+def mjpeg_generator(bus, timeout=1.0):
+    """
+    /video_feed 的响应生成器：只发送新帧，不重复发送同一帧
+
+    客户端断开时Flask关闭生成器，finally中取消订阅。
+    """
+    subscription = bus.subscribe()
+    try:
+        while True:
+            frame = subscription.get(timeout)
+            if frame is not None:
+                yield frame.part
+    finally:
+        subscription.close()
+
+
+def stream_generator(bus, timeout=1.0):
+    """
+    /stream 的响应生成器：每帧先发送检测数据的JSON分段，再发送JPEG分段，两者帧序号相同
+
+    客户端用一个连接同时收到视频和数据，画面上叠加的数据与这一帧一致。
+    """
+    subscription = bus.subscribe()
+    try:
+        while True:
+            frame = subscription.get(timeout)
+            if frame is not None:
+                yield frame.data_part + frame.part if frame.data_part is not None else frame.part
+    finally:
+        subscription.close()
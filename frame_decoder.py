@@ -0,0 +1,106 @@
+import cv2
+import numpy as np
+
+# 按缩小倍数从大到小排列的降分辨率解码标志
+REDUCED_FLAGS = (
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+)
+
+# 含图像尺寸的SOF标记（排除DHT/JPG/DAC）
+_SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+
+def jpeg_size(data):
+    """
+    不解码图像，直接从JPEG的SOF段读取尺寸
+
+    返回:
+    (宽, 高) 元组，无法解析时返回None
+    """
+    view = memoryview(data)
+    length = len(view)
+    if length < 4 or view[0] != 0xFF or view[1] != 0xD8:
+        return None
+    pos = 2
+    while pos + 4 <= length:
+        if view[pos] != 0xFF:
+            return None
+        marker = view[pos + 1]
+        if marker == 0xFF:          # 填充字节
+            pos += 1
+            continue
+        if marker in (0x01, 0xD0, 0xD1, 0xD2, 0xD3, 0xD4, 0xD5, 0xD6, 0xD7):
+            pos += 2
+            continue
+        segment_length = (view[pos + 2] << 8) | view[pos + 3]
+        if marker in _SOF_MARKERS:
+            if pos + 9 > length:
+                return None
+            height = (view[pos + 5] << 8) | view[pos + 6]
+            width = (view[pos + 7] << 8) | view[pos + 8]
+            return width, height
+        if marker == 0xDA:          # 扫描数据开始，SOF应已出现
+            return None
+        pos += 2 + segment_length
+    return None
+
+
+def choose_decode_flag(source_size, target_size):
+    """
+    根据源图像尺寸和目标显示尺寸选择解码标志
+
+    只有缩小后的宽和高仍不小于目标尺寸时才使用降分辨率解码，避免显示时再放大。
+    """
+    if source_size is None or target_size is None:
+        return cv2.IMREAD_COLOR, 1
+    src_w, src_h = source_size
+    dst_w, dst_h = target_size
+    for factor, flag in REDUCED_FLAGS:
+        if src_w // factor >= dst_w and src_h // factor >= dst_h:
+            return flag, factor
+    return cv2.IMREAD_COLOR, 1
+
+
+class LazyFrameDecoder:
+    """
+    按需解码最新一帧JPEG
+
+    同一版本、同一目标尺寸只解码一次，结果缓存供显示循环重复使用。
+    返回的图像是缓存对象，调用方需要在其上绘制时应先copy()。
+    """
+
+    def __init__(self):
+        self._key = None
+        self._frame = None
+        self.decoded_frames = 0     # 实际解码次数
+        self.reduced_frames = 0     # 使用降分辨率解码的次数
+        self.last_factor = 1
+
+    def decode(self, jpeg_data, version, target_size=None):
+        """
+        参数:
+        jpeg_data -- 编码后的JPEG字节
+        version -- 帧版本号，每收到新帧递增
+        target_size -- 显示目标尺寸(宽, 高)，None表示原尺寸
+
+        返回:
+        解码后的BGR图像，失败时返回None
+        """
+        if jpeg_data is None:
+            return None
+        key = (version, target_size)
+        if key == self._key:
+            return self._frame
+
+        flag, factor = choose_decode_flag(jpeg_size(jpeg_data), target_size)
+        frame = cv2.imdecode(np.frombuffer(jpeg_data, dtype=np.uint8), flag)
+        self.decoded_frames += 1
+        if factor > 1:
+            self.reduced_frames += 1
+        self.last_factor = factor
+
+        self._key = key
+        self._frame = frame
+        return frame
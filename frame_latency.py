@@ -0,0 +1,160 @@
+import time
+
+from clock_sync import ClockSync, clock_exchange
+
+# 视频流每个multipart分段携带的帧元数据头
+HEADER_FRAME_SEQ = 'X-Frame-Seq'
+HEADER_CAPTURE_TS = 'X-Capture-Timestamp'
+HEADER_ENCODE_TS = 'X-Encode-Timestamp'
+
+
+def parse_part_headers(raw):
+    """
+    解析multipart分段头部（JPEG数据之前的字节）
+
+    参数:
+    raw -- 分段头部原始字节，可能包含边界行
+
+    返回:
+    键为小写头部名称的字典
+    """
+    headers = {}
+    for line in bytes(raw).split(b'\r\n'):
+        if b':' not in line:
+            continue
+        name, _, value = line.partition(b':')
+        headers[name.strip().decode('latin-1').lower()] = value.strip().decode('latin-1')
+    return headers
+
+
+def frame_meta_from_headers(headers):
+    """从分段头部提取帧序号、采集时间戳和编码时间戳，缺失时返回None"""
+    try:
+        return {
+            'seq': int(headers[HEADER_FRAME_SEQ.lower()]),
+            'capture_ts': float(headers[HEADER_CAPTURE_TS.lower()]),
+            'encode_ts': float(headers.get(HEADER_ENCODE_TS.lower(), 0)),
+        }
+    except (KeyError, ValueError):
+        return None
+
+
+def is_same_frame(meta, previous):
+    """两个帧元数据是否对应服务器的同一帧（服务器可能重复发送最新帧）"""
+    return meta is not None and previous is not None and meta['seq'] == previous['seq']
+
+
+def estimate_clock_offset(base_url, samples=5, timeout=2, session=None):
+    """
+    通过 /clock 端点估计服务器与客户端的时钟偏差（单轮NTP式交换，不估计漂移）
+
+    偏差定义为 服务器时钟 - 客户端时钟，取网络延迟最小的一次交换。
+    需要持续跟踪偏差和漂移时使用clock_sync.ClockSync。
+
+    返回:
+    (offset, rtt) 元组，rtt为扣除服务器处理时间后的往返网络延迟，失败时返回 (None, None)
+    """
+    clock = ClockSync()
+    best = (None, None)
+    for _ in range(samples):
+        try:
+            offset, delay = clock.add_exchange(*clock_exchange(base_url, session=session, timeout=timeout))
+        except Exception:
+            continue
+        if best[1] is None or delay < best[1]:
+            best = (offset, delay)
+    return best
+
+
+class FrameLatencyTracker:
+    """
+    统计采集到显示的真实延迟以及丢帧/重复帧数量
+
+    接收端调用 on_receive() 统计传输过程中的丢帧和重复帧，
+    显示端调用 on_display() 统计采集到显示的延迟。
+    """
+
+    def __init__(self, window=300):
+        self.window = window
+        self.clock_offset = 0.0      # 服务器时钟 - 客户端时钟（秒）
+        self.latencies = []          # 最近的采集到显示延迟（毫秒）
+
+        self.last_received_seq = None
+        self.received_frames = 0
+        self.dropped_frames = 0      # 服务器已产生但未收到的帧
+        self.duplicate_frames = 0    # 重复收到的同一帧
+
+        self.last_displayed_seq = None
+        self.displayed_frames = 0
+        self.skipped_frames = 0      # 已收到但被新帧覆盖、未显示的帧
+
+    def set_clock_offset(self, offset):
+        if offset is not None:
+            self.clock_offset = offset
+
+    def on_receive(self, meta):
+        """接收到一帧时调用"""
+        if meta is None:
+            return
+        seq = meta['seq']
+        last = self.last_received_seq
+        if last is not None:
+            if seq == last:
+                self.duplicate_frames += 1
+                return
+            if seq > last + 1:
+                self.dropped_frames += seq - last - 1
+        self.last_received_seq = seq
+        self.received_frames += 1
+
+    def on_display(self, meta, display_time=None):
+        """显示一帧时调用，同一帧重复显示不计入统计"""
+        if meta is None or meta['seq'] == self.last_displayed_seq:
+            return None
+        if display_time is None:
+            display_time = time.time()
+
+        last = self.last_displayed_seq
+        if last is not None and meta['seq'] > last + 1:
+            self.skipped_frames += meta['seq'] - last - 1
+        self.last_displayed_seq = meta['seq']
+        self.displayed_frames += 1
+
+        # 将服务器采集时间戳换算到客户端时钟
+        latency = (display_time - (meta['capture_ts'] - self.clock_offset)) * 1000
+        self.latencies.append(latency)
+        if len(self.latencies) > self.window:
+            del self.latencies[:len(self.latencies) - self.window]
+        return latency
+
+    def percentiles(self, points=(50, 95, 99)):
+        """返回最近窗口内延迟的百分位数（毫秒）"""
+        if not self.latencies:
+            return {p: None for p in points}
+        ordered = sorted(self.latencies)
+        last_index = len(ordered) - 1
+        return {p: ordered[min(last_index, int(round(p / 100 * last_index)))] for p in points}
+
+    def summary(self):
+        """返回统计摘要字典"""
+        pct = self.percentiles()
+        return {
+            'p50_ms': pct[50],
+            'p95_ms': pct[95],
+            'p99_ms': pct[99],
+            'received': self.received_frames,
+            'displayed': self.displayed_frames,
+            'dropped': self.dropped_frames,
+            'duplicate': self.duplicate_frames,
+            'skipped': self.skipped_frames,
+            'clock_offset_ms': self.clock_offset * 1000,
+        }
+
+    def format_summary(self):
+        s = self.summary()
+        if s['p50_ms'] is None:
+            latency_text = "延迟: 暂无数据"
+        else:
+            latency_text = f"延迟 p50={s['p50_ms']:.1f}ms p95={s['p95_ms']:.1f}ms p99={s['p99_ms']:.1f}ms"
+        return (f"{latency_text}, 收到={s['received']}, 显示={s['displayed']}, "
+                f"丢帧={s['dropped']}, 重复={s['duplicate']}, 未显示={s['skipped']}")
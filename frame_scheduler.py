@@ -0,0 +1,169 @@
+import threading
+import time
+
+# 降级模式，按顺序逐级降低每帧的工作量
+SCHEDULER_MODES = (
+    'full',                 # 每帧检测、标注、编码
+    'no_annotate',          # 不绘制标注和拼接图，直接编码原始画面
+    'reduced_encode',       # 另外每encode_every帧才编码一次
+    'alternate_detect',     # 另外隔帧检测
+)
+
+DEFAULT_FPS = 30.0
+
+
+class FrameScheduler:
+    """
+    按帧截止时间调度处理循环
+
+    每帧的截止时间为上一帧截止时间加一个帧周期（1/摄像头帧率）。处理完后只等待到截止时间，
+    处理耗时不再额外累加固定的sleep，吞吐量跟随摄像头帧率；落后超过一帧时重新对齐，不补帧。
+    处理耗时持续超过帧周期的overload倍时逐级降级（见SCHEDULER_MODES），
+    持续低于underload倍时逐级恢复；恢复后很快又过载则加倍下次恢复所需的帧数，避免来回切换。
+    """
+
+    def __init__(self, fps=DEFAULT_FPS, overload=0.9, underload=0.5, degrade_after=10, recover_after=60,
+                 encode_every=3):
+        """
+        参数:
+        fps -- 摄像头帧率，<=0时使用DEFAULT_FPS
+        overload -- 处理耗时/帧周期 超过该值视为过载
+        underload -- 处理耗时/帧周期 低于该值视为有余量
+        degrade_after -- 连续过载多少帧后降一级
+        recover_after -- 连续有余量多少帧后恢复一级
+        encode_every -- reduced_encode及以上模式每隔多少帧编码一次
+        """
+        self.overload = overload
+        self.underload = underload
+        self.degrade_after = degrade_after
+        self.recover_after = recover_after
+        self.encode_every = encode_every
+        self.period = 1.0 / DEFAULT_FPS
+        self.set_fps(fps)
+
+        self.level = 0
+        self._deadline = None
+        self._frame_start = None
+        self._frame_index = 0
+        self._over = 0
+        self._under = 0
+        self._recover_needed = recover_after
+        self._last_recover_frame = None
+        self._wait_event = threading.Event()    # 复用同一个Event等待，stop()可以立即打断
+        self._last_end = None
+
+        # 统计
+        self.frames = 0
+        self.late_frames = 0            # 处理耗时超过一个帧周期的帧（会错过摄像头的下一帧）
+        self.skipped_detect = 0
+        self.skipped_encode = 0
+        self.skipped_annotate = 0
+        self.mode_changes = 0
+        self.utilization = 0.0          # 处理耗时/帧周期（指数滑动平均）
+        self.busy_ms = 0.0
+        self.throughput_fps = 0.0
+
+    @property
+    def mode(self):
+        return SCHEDULER_MODES[self.level]
+
+    def set_fps(self, fps):
+        """设置摄像头帧率（如分辨率或帧率改变后）"""
+        self.fps = fps if fps and fps > 0 else DEFAULT_FPS
+        self.period = 1.0 / self.fps
+
+    def begin_frame(self):
+        """
+        一帧开始处理（读取画面之后调用）
+
+        返回:
+        字典 {'mode', 'detect', 'annotate', 'encode'}，表示这一帧需要做哪些工作
+        """
+        self._frame_start = time.perf_counter()
+        self._frame_index += 1
+        level = self.level
+        detect = level < 3 or self._frame_index % 2 == 0
+        annotate = level == 0
+        encode = level < 2 or self._frame_index % self.encode_every == 0
+        self.skipped_detect += not detect
+        self.skipped_annotate += detect and not annotate
+        self.skipped_encode += not encode
+        return {'mode': SCHEDULER_MODES[level], 'detect': detect, 'annotate': annotate, 'encode': encode}
+
+    def end_frame(self):
+        """一帧处理完成，更新负载统计、调整模式并计算下一帧的截止时间"""
+        now = time.perf_counter()
+        busy = now - self._frame_start if self._frame_start is not None else 0.0
+        self.frames += 1
+        self.late_frames += busy > self.period
+        utilization = busy / self.period
+        self.utilization = utilization if self.frames == 1 else 0.9 * self.utilization + 0.1 * utilization
+        self.busy_ms = busy * 1000 if self.frames == 1 else 0.9 * self.busy_ms + 0.1 * busy * 1000
+        if self._last_end is not None and now > self._last_end:
+            instant_fps = 1.0 / (now - self._last_end)
+            self.throughput_fps = instant_fps if self.frames <= 2 else 0.95 * self.throughput_fps + 0.05 * instant_fps
+        self._last_end = now
+        self._adjust_level()
+
+        if self._deadline is None or now - self._deadline > self.period:
+            # 第一帧、从待机恢复或落后超过一帧：以当前时间重新对齐
+            self._deadline = now
+        self._deadline += self.period
+
+    def _adjust_level(self):
+        if self.utilization > self.overload:
+            self._over += 1
+            self._under = 0
+        elif self.utilization < self.underload:
+            self._under += 1
+            self._over = 0
+        else:
+            self._over = self._under = 0
+
+        if self._over >= self.degrade_after and self.level < len(SCHEDULER_MODES) - 1:
+            if self._last_recover_frame is not None and \
+                    self.frames - self._last_recover_frame < self._recover_needed:
+                # 刚恢复就又过载，下次需要更长时间的余量才恢复
+                self._recover_needed = min(self._recover_needed * 2, self.recover_after * 32)
+            self._set_level(self.level + 1)
+        elif self._under >= self._recover_needed and self.level > 0:
+            self._last_recover_frame = self.frames
+            self._set_level(self.level - 1)
+        elif self._last_recover_frame is not None and \
+                self.frames - self._last_recover_frame > self._recover_needed * 4:
+            self._recover_needed = self.recover_after
+
+    def _set_level(self, level):
+        previous = self.mode
+        self.level = level
+        self._over = self._under = 0
+        self.mode_changes += 1
+        print(f"帧调度模式: {previous} -> {self.mode} (负载 {self.utilization:.2f})")
+
+    def wait(self):
+        """等待到下一帧的截止时间，已经超时则立即返回"""
+        if self._deadline is None:
+            return
+        remaining = self._deadline - time.perf_counter()
+        if remaining > 0:
+            self._wait_event.wait(remaining)
+
+    def stop(self):
+        """打断正在进行的等待"""
+        self._wait_event.set()
+
+    def summary(self):
+        return {
+            'mode': self.mode,
+            'camera_fps': round(self.fps, 2),
+            'budget_ms': round(self.period * 1000, 3),
+            'throughput_fps': round(self.throughput_fps, 2),
+            'utilization': round(self.utilization, 3),
+            'busy_ms': round(self.busy_ms, 3),
+            'frames': self.frames,
+            'late_frames': self.late_frames,
+            'skipped_detect': self.skipped_detect,
+            'skipped_annotate': self.skipped_annotate,
+            'skipped_encode': self.skipped_encode,
+            'mode_changes': self.mode_changes,
+        }
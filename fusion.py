@@ -0,0 +1,185 @@
+import math
+import threading
+from collections import deque
+
+import numpy as np
+
+GRAVITY = 9.8               # 重力加速度 m/s²
+PERIODS_PER_T = 5           # 服务器上报的T是五个周期所用的时间
+
+
+def pendulum_length(period, g=GRAVITY):
+    """由周期计算摆长 L = g * (T / 2π)²"""
+    return g * (period / (2 * math.pi)) ** 2
+
+
+def _standard_error(values):
+    if len(values) < 2:
+        return None
+    return float(np.std(values, ddof=1) / math.sqrt(len(values)))
+
+
+def crossing_times(timestamps, positions):
+    """
+    计算位置序列穿过其中位线的时刻（线性插值，向量化）
+
+    返回:
+    穿越时刻数组，相邻两次穿越间隔为半个周期
+    """
+    t = np.asarray(timestamps, dtype=float)
+    x = np.asarray(positions, dtype=float)
+    if len(x) < 3:
+        return np.empty(0)
+    centered = x - (x.max() + x.min()) / 2
+    sign = np.signbit(centered)
+    index = np.nonzero(sign[1:] != sign[:-1])[0]
+    x0, x1 = centered[index], centered[index + 1]
+    fraction = x0 / (x0 - x1)
+    return t[index] + fraction * (t[index + 1] - t[index])
+
+
+class FusionEngine:
+    """
+    双摄像头时间对齐融合引擎
+
+    接收每个服务器带时间戳的测量值（L、T）或质心序列，在时间上对齐后计算
+    摆动角度、综合周期和摆长，并给出各自的标准误差。
+    每次有新输入都可以调用fuse()得到最新结果，不受轮询间隔限制。
+    """
+
+    def __init__(self, servers=('server1', 'server2'), window=30.0, max_skew=2.0,
+                 periods_per_T=PERIODS_PER_T, g=GRAVITY, max_samples=2000):
+        """
+        参数:
+        servers -- 两个服务器的名称，第一个为L1方向，第二个为L2方向
+        window -- 参与融合的时间窗口（秒）
+        max_skew -- 无法插值时允许配对的最大时间差（秒）
+        periods_per_T -- 服务器上报的T包含的周期数
+        g -- 重力加速度
+        max_samples -- 每个服务器保留的最大样本数
+        """
+        self.servers = tuple(servers)
+        self.window = window
+        self.max_skew = max_skew
+        self.periods_per_T = periods_per_T
+        self.g = g
+        self.lock = threading.Lock()
+
+        self._amplitudes = {name: deque(maxlen=max_samples) for name in self.servers}
+        self._periods = {name: deque(maxlen=max_samples) for name in self.servers}
+        self._centroids = {name: deque(maxlen=max_samples * 10) for name in self.servers}
+        self.latest = None
+
+    # ---------- 输入 ----------
+
+    def add_measurement(self, server, timestamp, L=None, T=None):
+        """添加一个服务器测量值，timestamp需已换算到客户端时钟"""
+        with self.lock:
+            if L is not None:
+                self._amplitudes[server].append((timestamp, float(L)))
+            if T is not None and T > 0:
+                self._periods[server].append((timestamp, float(T) / self.periods_per_T))
+
+    def add_centroids(self, server, timestamps, positions):
+        """添加一段质心位置序列（水平坐标），timestamps需已换算到客户端时钟"""
+        with self.lock:
+            self._centroids[server].extend(zip(timestamps, positions))
+
+    # ---------- 融合 ----------
+
+    def _recent(self, samples, now):
+        if not samples:
+            return np.empty((0, 2))
+        data = np.asarray(samples, dtype=float)
+        data = data[np.argsort(data[:, 0], kind='stable')]
+        return data[data[:, 0] >= now - self.window]
+
+    def _align(self, first, second):
+        """
+        把第二个序列对齐到第一个序列的时刻
+
+        在第二个序列的时间范围内线性插值，范围外只取时间差不超过max_skew的最近样本。
+        返回 (第一个序列的值, 对齐后的第二个序列的值)
+        """
+        if len(first) == 0 or len(second) == 0:
+            return np.empty(0), np.empty(0)
+        t1, v1 = first[:, 0], first[:, 1]
+        t2, v2 = second[:, 0], second[:, 1]
+        inside = (t1 >= t2[0]) & (t1 <= t2[-1])
+        aligned = np.interp(t1, t2, v2)
+
+        nearest = np.clip(np.searchsorted(t2, t1), 0, len(t2) - 1)
+        previous = np.clip(nearest - 1, 0, len(t2) - 1)
+        use_previous = np.abs(t2[previous] - t1) < np.abs(t2[nearest] - t1)
+        nearest = np.where(use_previous, previous, nearest)
+        close = np.abs(t2[nearest] - t1) <= self.max_skew
+        aligned = np.where(inside, aligned, v2[nearest])
+
+        keep = inside | close
+        return v1[keep], aligned[keep]
+
+    def _centroid_estimates(self, now):
+        """由质心序列估计每个服务器的振幅和周期"""
+        amplitudes, periods = {}, []
+        for name in self.servers:
+            data = self._recent(self._centroids[name], now)
+            if len(data) < 10:
+                continue
+            amplitudes[name] = float(np.percentile(data[:, 1], 95) - np.percentile(data[:, 1], 5))
+            crossings = crossing_times(data[:, 0], data[:, 1])
+            if len(crossings) >= 3:
+                periods.append(2 * np.diff(crossings))
+        return amplitudes, (np.concatenate(periods) if periods else np.empty(0))
+
+    def fuse(self, now):
+        """
+        计算当前窗口内的融合结果
+
+        参数:
+        now -- 当前时间（客户端时钟）
+
+        返回:
+        字典：angle_deg/angle_err、period/period_err、length/length_err（米）、samples，
+        无法计算的项为None
+        """
+        with self.lock:
+            first_name, second_name = self.servers
+            amp1 = self._recent(self._amplitudes[first_name], now)
+            amp2 = self._recent(self._amplitudes[second_name], now)
+            period_samples = [self._recent(self._periods[name], now)[:, 1] for name in self.servers]
+            centroid_amplitudes, centroid_periods = self._centroid_estimates(now)
+
+        result = {
+            'timestamp': now,
+            'angle_deg': None, 'angle_err': None,
+            'period': None, 'period_err': None,
+            'length': None, 'length_err': None,
+            'samples': 0,
+        }
+
+        # 摆动角度：两个方向的振幅在同一时刻配对后计算 atan2(L2, L1)
+        L1, L2 = self._align(amp1, amp2)
+        if len(centroid_amplitudes) == 2:
+            L1 = np.append(L1, centroid_amplitudes[first_name])
+            L2 = np.append(L2, centroid_amplitudes[second_name])
+        valid = (L1 > 0) | (L2 > 0)
+        if valid.any():
+            angles = np.degrees(np.arctan2(L2[valid], L1[valid]))
+            result['angle_deg'] = float(angles.mean())
+            result['angle_err'] = _standard_error(angles)
+            result['samples'] = int(valid.sum())
+
+        # 综合周期：两个服务器的周期样本合并
+        periods = np.concatenate(period_samples + [centroid_periods])
+        if len(periods):
+            period = float(periods.mean())
+            period_err = _standard_error(periods)
+            result['period'] = period
+            result['period_err'] = period_err
+            result['length'] = pendulum_length(period, self.g)
+            if period_err is not None:
+                # dL/L = 2 dT/T
+                result['length_err'] = 2 * result['length'] * period_err / period
+
+        self.latest = result
+        return result
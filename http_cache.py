@@ -0,0 +1,142 @@
+import json
+import os
+import threading
+import time
+
+from flask import Response, request
+
+from frame_latency import HEADER_FRAME_SEQ, HEADER_CAPTURE_TS, HEADER_ENCODE_TS
+
+MAX_WAIT = 30.0     # 长轮询最长等待时间（秒）
+
+# 每个进程不同的ETag前缀，服务器重启后版本号从头计数也不会误返回304
+_ETAG_PREFIX = f"{os.getpid():x}{int(time.time()):x}"
+
+
+def make_etag(kind, version):
+    return f'"{_ETAG_PREFIX}-{kind}-{version}"'
+
+
+class JSONCache:
+    """
+    按数据版本缓存序列化好的JSON
+
+    数据变化时生产者调用touch()使版本号加一（很轻，不做序列化）；第一次有请求读取新版本时
+    调用builder()生成字典并序列化一次，之后同一版本的请求直接返回缓存的字节和ETag。
+    max_age不为None时，缓存超过max_age秒也视为新版本（用于每帧都在变化的状态类数据）。
+    """
+
+    def __init__(self, name, builder, max_age=None):
+        """
+        参数:
+        name -- 缓存名称（用于ETag）
+        builder -- 无参函数，返回要序列化的字典
+        max_age -- 缓存最长有效时间（秒），None表示只在touch()后更新
+        """
+        self.name = name
+        self.builder = builder
+        self.max_age = max_age
+        self._cond = threading.Condition()
+        self._version = 0
+        self._built_version = None
+        self._built_time = 0.0
+        self._body = None
+        self.builds = 0
+        self.not_modified = 0
+
+    def touch(self):
+        """数据已变化，唤醒等待变化的长轮询请求"""
+        with self._cond:
+            self._version += 1
+            self._cond.notify_all()
+
+    def _expired(self, now):
+        return self.max_age is not None and now - self._built_time > self.max_age
+
+    def etag(self):
+        return make_etag(self.name, self._version)
+
+    def current(self):
+        """返回 (JSON字节, ETag)，当前版本还没有序列化时序列化一次"""
+        with self._cond:
+            now = time.monotonic()
+            if self._built_version is not None and self._expired(now):
+                self._version += 1
+            if self._built_version != self._version:
+                self._body = json.dumps(self.builder(), ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+                self._built_version = self._version
+                self._built_time = now
+                self.builds += 1
+            return self._body, make_etag(self.name, self._version)
+
+    def wait_changed(self, etag, timeout):
+        """等到数据版本不再是etag（或超时）后返回 (JSON字节, ETag)"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self.etag() == etag:
+                now = time.monotonic()
+                remaining = deadline - now
+                if self.max_age is not None and self._built_version is not None:
+                    remaining = min(remaining, self._built_time + self.max_age - now)
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+        return self.current()
+
+    def summary(self):
+        return {'version': self._version, 'builds': self.builds, 'not_modified': self.not_modified}
+
+
+def requested_wait():
+    """请求参数 wait=秒数 表示数据没有变化时长轮询等待"""
+    try:
+        return min(max(float(request.args.get('wait', 0)), 0.0), MAX_WAIT)
+    except ValueError:
+        return 0.0
+
+
+def cached_json_response(cache):
+    """
+    返回缓存的JSON响应
+
+    请求带If-None-Match且数据没有变化时返回304；同时带wait参数时先等待数据变化，
+    超时仍未变化再返回304。
+    """
+    client_etag = request.headers.get('If-None-Match')
+    wait = requested_wait()
+    if client_etag and wait > 0:
+        body, etag = cache.wait_changed(client_etag, wait)
+    else:
+        body, etag = cache.current()
+    headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+    if client_etag == etag:
+        cache.not_modified += 1
+        return Response(status=304, headers=headers)
+    return Response(body, mimetype='application/json', headers=headers)
+
+
+def snapshot_response(bus):
+    """
+    返回最新一帧JPEG（/snapshot.jpg），ETag为帧序号
+
+    带If-None-Match且没有新帧时返回304；带wait参数时先等待下一帧。还没有帧时返回503。
+    """
+    client_etag = request.headers.get('If-None-Match')
+    frame = bus.latest()
+    wait = requested_wait()
+    if client_etag and wait > 0 and frame is not None and make_etag('frame', frame.seq) == client_etag:
+        with bus.subscribe(maxsize=1, send_latest=False) as subscription:
+            frame = subscription.get(wait) or bus.latest()
+    if frame is None:
+        return Response(status=503, headers={'Retry-After': '1'})
+    etag = make_etag('frame', frame.seq)
+    headers = {
+        'ETag': etag,
+        'Cache-Control': 'no-cache',
+        HEADER_FRAME_SEQ: str(frame.seq),
+        HEADER_CAPTURE_TS: f"{frame.capture_ts:.6f}",
+        HEADER_ENCODE_TS: f"{frame.encode_ts:.6f}",
+    }
+    if client_etag == etag:
+        return Response(status=304, headers=headers)
+    return Response(frame.jpeg, mimetype='image/jpeg', headers=headers)
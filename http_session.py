@@ -0,0 +1,98 @@
+import random
+import time
+import requests
+from requests.adapters import HTTPAdapter
+
+
+def create_session(pool_size=4):
+    """
+    创建带连接池的HTTP会话，同一服务器的请求复用keep-alive连接
+
+    参数:
+    pool_size -- 每个主机保持的最大连接数
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers['Connection'] = 'keep-alive'
+    return session
+
+
+class Backoff:
+    """
+    带随机抖动的指数退避
+
+    第n次失败后的等待时间在 [delay/2, delay] 之间随机，delay = base * factor^n，
+    并且不超过max_delay，避免多个客户端同时重连。
+    """
+
+    def __init__(self, base=0.5, factor=2.0, max_delay=30.0):
+        self.base = base
+        self.factor = factor
+        self.max_delay = max_delay
+        self.attempts = 0
+
+    def next_delay(self):
+        delay = min(self.max_delay, self.base * self.factor ** self.attempts)
+        self.attempts += 1
+        return random.uniform(delay / 2, delay)
+
+    def reset(self):
+        self.attempts = 0
+
+
+class ConnectionStats:
+    """记录单个服务器连接的重连次数、失败次数和请求延迟"""
+
+    def __init__(self):
+        self.connects = 0           # 成功建立视频连接的次数
+        self.failures = 0           # 请求或连接失败次数
+        self.last_error = None
+        self.last_connect_time = 0
+        self.requests = 0
+        self.latency_sum = 0.0
+        self.latency_max = 0.0
+        self.latency_ewma = None    # 请求延迟的指数滑动平均（秒）
+
+    @property
+    def reconnects(self):
+        return max(0, self.connects - 1)
+
+    def record_connect(self):
+        self.connects += 1
+        self.last_connect_time = time.time()
+
+    def record_failure(self, error):
+        self.failures += 1
+        self.last_error = str(error)
+
+    def record_latency(self, seconds):
+        self.requests += 1
+        self.latency_sum += seconds
+        self.latency_max = max(self.latency_max, seconds)
+        if self.latency_ewma is None:
+            self.latency_ewma = seconds
+        else:
+            self.latency_ewma = 0.9 * self.latency_ewma + 0.1 * seconds
+
+    def summary(self):
+        return {
+            'connects': self.connects,
+            'reconnects': self.reconnects,
+            'failures': self.failures,
+            'last_error': self.last_error,
+            'requests': self.requests,
+            'latency_avg_ms': self.latency_sum / self.requests * 1000 if self.requests else None,
+            'latency_ewma_ms': self.latency_ewma * 1000 if self.latency_ewma is not None else None,
+            'latency_max_ms': self.latency_max * 1000,
+        }
+
+    def format_summary(self):
+        s = self.summary()
+        if s['requests']:
+            latency_text = (f"请求延迟 平均={s['latency_avg_ms']:.1f}ms "
+                            f"近期={s['latency_ewma_ms']:.1f}ms 最大={s['latency_max_ms']:.1f}ms")
+        else:
+            latency_text = "请求延迟: 暂无数据"
+        return f"重连={s['reconnects']}, 失败={s['failures']}, {latency_text}"
@@ -0,0 +1,236 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import numpy as np
+import requests
+
+from frame_latency import frame_meta_from_headers, is_same_frame
+from http_session import create_session
+from mjpeg_stream import iter_mjpeg_parts
+
+SERVER_SCRIPTS = {1: 'tracee_server1.py', 2: 'tracee_server2.py'}
+CLOCK_TICKS = os.sysconf('SC_CLK_TCK')
+
+
+def percentiles(values):
+    if not values:
+        return {'p50': None, 'p95': None, 'p99': None, 'max': None}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {'p50': round(float(p50), 2), 'p95': round(float(p95), 2),
+            'p99': round(float(p99), 2), 'max': round(float(max(values)), 2)}
+
+
+def process_cpu_seconds(pid):
+    """从 /proc/<pid>/stat 读取进程累计CPU时间（用户态+内核态，秒）"""
+    with open(f'/proc/{pid}/stat') as f:
+        fields = f.read().rsplit(')', 1)[1].split()
+    # rsplit后fields[0]是第3个字段(state)，utime/stime是第14/15个字段
+    return (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+
+
+def start_server(server, port, camera):
+    """在子进程中启动服务器，等待/ping可用"""
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), SERVER_SCRIPTS[server])
+    process = subprocess.Popen(
+        [sys.executable, script, '--camera', camera, '--host', '127.0.0.1', '--port', str(port)],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f'http://127.0.0.1:{port}'
+    deadline = time.time() + 15
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"服务器进程已退出，返回码 {process.returncode}")
+        try:
+            if requests.get(f'{url}/ping', timeout=0.5).status_code == 200:
+                return process, url
+        except requests.exceptions.RequestException:
+            pass
+        time.sleep(0.2)
+    process.kill()
+    raise RuntimeError("服务器启动超时")
+
+
+class Viewer(threading.Thread):
+    """模拟一个/video_feed观看者，统计收到的新帧数和采集到接收的延迟"""
+
+    def __init__(self, url, stop_event):
+        super().__init__(daemon=True)
+        self.url = url
+        self.stop_event = stop_event
+        self.frames = 0
+        self.duplicates = 0
+        self.latencies = []
+        self.errors = 0
+        self.counting = False
+
+    def run(self):
+        session = create_session(pool_size=1)
+        previous = None
+        while not self.stop_event.is_set():
+            try:
+                with session.get(f'{self.url}/video_feed', stream=True, timeout=5) as response:
+                    for headers, _ in iter_mjpeg_parts(response):
+                        if self.stop_event.is_set():
+                            break
+                        meta = frame_meta_from_headers(headers)
+                        if is_same_frame(meta, previous):
+                            self.duplicates += self.counting
+                            continue
+                        previous = meta
+                        if self.counting:
+                            self.frames += 1
+                            if meta['capture_ts']:
+                                # 同一台机器，时钟相同
+                                self.latencies.append((time.time() - meta['capture_ts']) * 1000)
+            except Exception:
+                # 包括服务器关闭连接时urllib3抛出的ProtocolError
+                self.errors += self.counting
+                self.stop_event.wait(0.2)
+
+
+class Poller(threading.Thread):
+    """按固定间隔请求一个端点并记录延迟"""
+
+    def __init__(self, url, stop_event, interval, method='GET', make_json=None):
+        super().__init__(daemon=True)
+        self.url = url
+        self.stop_event = stop_event
+        self.interval = interval
+        self.method = method
+        self.make_json = make_json
+        self.latencies = []
+        self.errors = 0
+        self.counting = False
+
+    def run(self):
+        session = create_session(pool_size=1)
+        while not self.stop_event.is_set():
+            start = time.perf_counter()
+            try:
+                json_data = self.make_json() if self.make_json else None
+                response = session.request(self.method, self.url, json=json_data, timeout=5)
+                response.raise_for_status()
+                if self.counting:
+                    self.latencies.append((time.perf_counter() - start) * 1000)
+            except requests.exceptions.RequestException:
+                self.errors += self.counting
+            self.stop_event.wait(max(0.0, self.interval - (time.perf_counter() - start)))
+
+
+def run_stage(url, pid, viewers, pollers, poll_interval, control_interval, duration, warmup=1.0):
+    """运行一轮负载，返回统计结果字典"""
+    stop_event = threading.Event()
+    seq = [int(time.time() * 1000)]
+
+    def control_json():
+        seq[0] += 1
+        return {'valid': True, 'client_id': 'load_test', 'seq': seq[0], 'ttl': control_interval * 3 + 1}
+
+    viewer_threads = [Viewer(url, stop_event) for _ in range(viewers)]
+    poller_threads = [Poller(f'{url}/motion_data', stop_event, poll_interval) for _ in range(pollers)]
+    control_threads = [Poller(f'{url}/control', stop_event, control_interval, 'POST', control_json)] \
+        if control_interval > 0 else []
+    workers = viewer_threads + poller_threads + control_threads
+    for worker in workers:
+        worker.start()
+
+    time.sleep(warmup)
+    for worker in workers:
+        worker.counting = True
+    cpu_start = process_cpu_seconds(pid) if pid else None
+    start = time.perf_counter()
+    time.sleep(duration)
+    elapsed = time.perf_counter() - start
+    cpu_end = process_cpu_seconds(pid) if pid else None
+    for worker in workers:
+        worker.counting = False
+
+    try:
+        status = requests.get(f'{url}/status', timeout=2).json()
+        perf = status.get('perf') or {}
+    except (requests.exceptions.RequestException, ValueError):
+        perf = {}
+
+    stop_event.set()
+    for worker in workers:
+        worker.join(timeout=2)
+
+    viewer_fps = [viewer.frames / elapsed for viewer in viewer_threads]
+    frame_latencies = [value for viewer in viewer_threads for value in viewer.latencies]
+    poll_latencies = [value for poller in poller_threads for value in poller.latencies]
+    control_latencies = [value for control in control_threads for value in control.latencies]
+    return {
+        'viewers': viewers,
+        'pollers': pollers,
+        'viewer_fps': [round(fps, 1) for fps in viewer_fps],
+        'viewer_fps_min': round(min(viewer_fps), 1) if viewer_fps else None,
+        'viewer_fps_avg': round(sum(viewer_fps) / len(viewer_fps), 1) if viewer_fps else None,
+        'frame_latency_ms': percentiles(frame_latencies),
+        'poll_latency_ms': percentiles(poll_latencies),
+        'control_latency_ms': percentiles(control_latencies),
+        'errors': sum(worker.errors for worker in workers),
+        'server_cpu_percent': round((cpu_end - cpu_start) / elapsed * 100, 1) if pid else None,
+        'detection_fps': perf.get('fps'),
+        'detection_process_ms': perf.get('process_ms'),
+    }
+
+
+def format_stage(result):
+    def p(stats):
+        return f"{stats['p50']}/{stats['p95']}/{stats['p99']}" if stats['p50'] is not None else "--"
+    return (f"{result['viewers']:>4} {result['pollers']:>4} "
+            f"{str(result['viewer_fps_avg']):>7} {str(result['viewer_fps_min']):>7} "
+            f"{p(result['frame_latency_ms']):>22} {p(result['poll_latency_ms']):>22} "
+            f"{str(result['server_cpu_percent']):>6} {str(result['detection_fps']):>7} {result['errors']:>4}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='运动检测服务器负载测试')
+    parser.add_argument('--server', type=int, choices=(1, 2), default=2, help='启动哪个服务器')
+    parser.add_argument('--url', help='测试已经运行的服务器，不自动启动（此时需用--pid指定进程才能统计CPU）')
+    parser.add_argument('--pid', type=int, help='已运行服务器的进程号')
+    parser.add_argument('--camera', default='synthetic', help='服务器视频源，默认使用合成画面')
+    parser.add_argument('--port', type=int, default=5902, help='自动启动服务器时使用的端口')
+    parser.add_argument('--viewers', default='0,1,2,4,8', help='逐轮增加的/video_feed观看者数量，逗号分隔')
+    parser.add_argument('--pollers', type=int, default=2, help='/motion_data轮询者数量')
+    parser.add_argument('--poll-interval', type=float, default=0.1, help='轮询间隔（秒）')
+    parser.add_argument('--control-interval', type=float, default=1.0, help='/control发送间隔（秒），0表示不发送')
+    parser.add_argument('--duration', type=float, default=5.0, help='每轮测量时长（秒）')
+    parser.add_argument('--json', help='把结果写入JSON文件')
+    args = parser.parse_args()
+
+    process = None
+    if args.url:
+        url, pid = args.url.rstrip('/'), args.pid
+    else:
+        print(f"启动服务器{args.server}（视频源: {args.camera}）...")
+        process, url = start_server(args.server, args.port, args.camera)
+        pid = process.pid
+
+    control_interval = args.control_interval if args.server == 2 or args.url else 0
+    results = []
+    print(f"{'观看':>4} {'轮询':>4} {'平均fps':>7} {'最低fps':>7} "
+          f"{'帧延迟ms p50/95/99':>22} {'轮询延迟ms p50/95/99':>22} {'CPU%':>6} {'检测fps':>7} {'错误':>4}")
+    try:
+        for viewers in [int(value) for value in args.viewers.split(',')]:
+            result = run_stage(url, pid, viewers, args.pollers, args.poll_interval,
+                               control_interval, args.duration)
+            results.append(result)
+            print(format_stage(result), flush=True)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=5)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+        print(f"结果已写入 {args.json}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+from frame_latency import parse_part_headers
+
+DEFAULT_BOUNDARY = b'frame'
+DEFAULT_CHUNK_SIZE = 64 * 1024          # 每次从socket读取的最大字节数
+DEFAULT_MAX_BUFFER = 4 * 1024 * 1024    # 缓冲区上限，超过则丢弃并重新同步
+
+# 解析器状态
+_SEEK_BOUNDARY = 0
+_READ_HEADERS = 1
+_READ_BODY = 2
+
+
+def boundary_from_content_type(content_type, default=DEFAULT_BOUNDARY):
+    """从 multipart/x-mixed-replace 的Content-Type中取出边界字符串"""
+    for param in (content_type or '').split(';'):
+        name, _, value = param.strip().partition('=')
+        if name.lower() == 'boundary' and value:
+            value = value.strip('"')
+            if value.startswith('--'):
+                value = value[2:]
+            return value.encode('latin-1')
+    return default
+
+
+class MJPEGStreamParser:
+    """
+    按multipart边界解析MJPEG流的增量解析器
+
+    数据追加到一个bytearray中，只在已解析位置之后查找，不会重复扫描已处理的数据。
+    分段带有Content-Length时直接按长度截取，否则查找下一个边界，
+    因此JPEG内部嵌入的缩略图标记(\\xff\\xd8/\\xff\\xd9)不会造成误判。
+    """
+
+    def __init__(self, boundary=DEFAULT_BOUNDARY, max_buffer=DEFAULT_MAX_BUFFER):
+        if isinstance(boundary, str):
+            boundary = boundary.encode('latin-1')
+        self.marker = b'--' + boundary
+        self.body_end_marker = b'\r\n' + self.marker
+        self.max_buffer = max_buffer
+
+        self._buffer = bytearray()
+        self._pos = 0             # 已处理数据的位置
+        self._scan = 0            # 无Content-Length时查找边界的起始位置
+        self._state = _SEEK_BOUNDARY
+        self._headers = None
+        self._length = None
+
+        # 统计信息
+        self.bytes_fed = 0
+        self.parts = 0
+        self.overflows = 0        # 因超出缓冲区上限而丢弃数据的次数
+
+    def feed(self, chunk):
+        """
+        追加一块数据，返回本次解析出的完整分段列表
+
+        返回:
+        [(headers, payload), ...]，headers为小写键的字典，payload为bytes
+        """
+        self._buffer += chunk
+        self.bytes_fed += len(chunk)
+        parts = []
+        while self._step(parts):
+            pass
+        self._compact()
+        return parts
+
+    def _step(self, parts):
+        buf = self._buffer
+        if self._state == _SEEK_BOUNDARY:
+            index = buf.find(self.marker, self._pos)
+            if index == -1:
+                # 保留可能被截断的边界前缀
+                self._pos = max(self._pos, len(buf) - len(self.marker) + 1)
+                return False
+            self._pos = index
+            self._state = _READ_HEADERS
+            return True
+
+        if self._state == _READ_HEADERS:
+            index = buf.find(b'\r\n\r\n', self._pos)
+            if index == -1:
+                return False
+            with memoryview(buf) as view:
+                self._headers = parse_part_headers(view[self._pos:index])
+            try:
+                self._length = int(self._headers['content-length'])
+            except (KeyError, ValueError):
+                self._length = None
+            self._pos = index + 4
+            self._scan = self._pos
+            self._state = _READ_BODY
+            return True
+
+        if self._length is not None:
+            end = self._pos + self._length
+            if len(buf) < end:
+                return False
+            next_pos = end
+        else:
+            index = buf.find(self.body_end_marker, self._scan)
+            if index == -1:
+                self._scan = max(self._pos, len(buf) - len(self.body_end_marker) + 1)
+                return False
+            end = index
+            next_pos = index + 2
+        with memoryview(buf) as view:
+            payload = bytes(view[self._pos:end])
+        parts.append((self._headers, payload))
+        self.parts += 1
+        self._pos = next_pos
+        self._state = _SEEK_BOUNDARY
+        return True
+
+    def _compact(self):
+        """丢弃已处理的数据；未处理数据超过上限时整体丢弃并重新同步"""
+        pending = len(self._buffer) - self._pos
+        if pending > self.max_buffer:
+            self.overflows += 1
+            self._buffer.clear()
+            self._pos = self._scan = 0
+            self._state = _SEEK_BOUNDARY
+            return
+        # 只有已处理部分占到一半以上时才移动数据，避免每次分段都搬移缓冲区
+        if self._pos and self._pos >= len(self._buffer) // 2:
+            del self._buffer[:self._pos]
+            self._scan -= self._pos
+            self._pos = 0
+
+    def buffered(self):
+        """当前缓冲区中尚未解析的字节数"""
+        return len(self._buffer) - self._pos
+
+
+def read_chunks(response, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    从requests的流式响应中读取数据块
+
+    优先使用 raw.read1()，有多少数据就返回多少，大块读取也不会等待缓冲区填满。
+    """
+    raw = response.raw
+    if hasattr(raw, 'read1'):
+        while True:
+            chunk = raw.read1(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+    else:
+        yield from response.iter_content(chunk_size=chunk_size)
+
+
+def iter_mjpeg_parts(response, chunk_size=DEFAULT_CHUNK_SIZE, max_buffer=DEFAULT_MAX_BUFFER):
+    """
+    逐个产生MJPEG流中的分段
+
+    参数:
+    response -- requests.get(..., stream=True) 返回的响应
+    chunk_size -- 每次读取的最大字节数
+    max_buffer -- 解析缓冲区上限
+
+    返回:
+    生成 (headers, payload) 元组
+    """
+    boundary = boundary_from_content_type(response.headers.get('Content-Type'))
+    parser = MJPEGStreamParser(boundary, max_buffer=max_buffer)
+    for chunk in read_chunks(response, chunk_size):
+        yield from parser.feed(chunk)
@@ -0,0 +1,154 @@
+from collections import deque
+
+import cv2
+import numpy as np
+
+from fusion import crossing_times
+
+AUTO_ARM_SIZE = (40, 30)        # 运动能量计算使用的缩小尺寸（宽, 高）
+
+
+class AutoArmer:
+    """
+    基于低分辨率运动能量的自动启动判断
+
+    每帧缩小到 AUTO_ARM_SIZE 后与上一帧做差，灰度变化超过pixel_threshold的像素百分比即运动能量，
+    这些像素的质心即运动位置。缩小时的区域平均已经滤掉了传感器噪声。
+    运动能量持续高于阈值、且运动位置在 arm_after 秒内多次往返（周期运动）时返回'arm'；
+    已启动后运动能量持续低于阈值 release_after 秒返回'release'。
+    缩小后的图像只有一千多个像素，待机时的开销可以忽略。
+    """
+
+    def __init__(self, size=AUTO_ARM_SIZE, threshold=0.5, pixel_threshold=8, arm_after=3.0, release_after=3.0,
+                 min_crossings=3, max_still_fraction=0.35):
+        """
+        参数:
+        size -- 缩小后的尺寸（宽, 高）
+        threshold -- 运动能量阈值（变化像素的百分比）
+        pixel_threshold -- 单个像素灰度变化超过该值才算运动
+        arm_after -- 需要持续运动的时间（秒）
+        release_after -- 运动停止多久后退出检测（秒）
+        min_crossings -- arm_after时间内运动位置穿过中线的最少次数（3次约为一个半周期）
+        max_still_fraction -- arm_after时间内允许低于阈值的帧比例（摆在两端速度接近零）
+        """
+        self.size = size
+        self.threshold = threshold
+        self.pixel_threshold = pixel_threshold
+        self.max_still_fraction = max_still_fraction
+        self.arm_after = arm_after
+        self.release_after = release_after
+        self.min_crossings = min_crossings
+
+        self.armed = False
+        self._previous = None
+        self._history = deque()     # (时间, 运动能量, 质心x, 质心y)
+        self._quiet_since = None    # 运动能量开始低于阈值的时间
+        self._need_quiet = False    # 被手动停止后，需要先静止一段时间才会再次自动启动
+        self._hold_requested = False
+
+        # 统计
+        self.energy = 0.0
+        self.arms = 0
+        self.releases = 0
+
+    def reset(self, require_quiet=False):
+        """
+        回到未启动状态（如检测被其他控制源停止）
+        require_quiet -- True时需要先观察到release_after秒的静止才会再次自动启动
+        """
+        self.armed = False
+        self._history.clear()
+        self._quiet_since = None
+        self._need_quiet = require_quiet
+
+    def hold(self):
+        """
+        其他线程请求回到未启动状态并等待静止（如检测被客户端停止），
+        在下一次update()时生效
+        """
+        self._hold_requested = True
+
+    def _small_gray(self, frame):
+        # 先隔行隔列抽样到目标尺寸的约4倍，再做区域平均，比直接对整帧做INTER_AREA快数倍
+        step = max(1, min(frame.shape[0] // (self.size[1] * 4), frame.shape[1] // (self.size[0] * 4)))
+        if step > 1:
+            frame = np.ascontiguousarray(frame[::step, ::step])
+        small = cv2.resize(frame, self.size, interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            small = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        return small
+
+    def update(self, frame, timestamp):
+        """
+        输入一帧（BGR或灰度，任意分辨率）
+
+        返回:
+        'arm' 应启动检测，'release' 应回到待机，否则None
+        """
+        if self._hold_requested:
+            self._hold_requested = False
+            self.reset(require_quiet=True)
+        small = self._small_gray(frame)
+        previous, self._previous = self._previous, small
+        if previous is None:
+            return None
+
+        diff = cv2.absdiff(small, previous)
+        _, moving = cv2.threshold(diff, self.pixel_threshold, 1, cv2.THRESH_BINARY)
+        moments = cv2.moments(moving, binaryImage=True)
+        self.energy = moments['m00'] * 100.0 / moving.size
+        if moments['m00'] > 0:
+            cx, cy = moments['m10'] / moments['m00'], moments['m01'] / moments['m00']
+        else:
+            cx, cy = self.size[0] / 2, self.size[1] / 2
+
+        history = self._history
+        history.append((timestamp, self.energy, cx, cy))
+        while history and history[0][0] < timestamp - max(self.arm_after, self.release_after):
+            history.popleft()
+
+        if self.energy >= self.threshold:
+            self._quiet_since = None
+        elif self._quiet_since is None:
+            self._quiet_since = timestamp
+        quiet_for = timestamp - self._quiet_since if self._quiet_since is not None else 0.0
+
+        if self.armed:
+            if quiet_for >= self.release_after:
+                self.armed = False
+                self.releases += 1
+                return 'release'
+            return None
+
+        if self._need_quiet:
+            if quiet_for >= self.release_after:
+                self._need_quiet = False
+            return None
+
+        if self._is_periodic(timestamp):
+            self.armed = True
+            self.arms += 1
+            return 'arm'
+        return None
+
+    def _is_periodic(self, timestamp):
+        """最近arm_after秒内运动持续且运动位置多次往返"""
+        recent = [sample for sample in self._history if sample[0] >= timestamp - self.arm_after]
+        if len(recent) < 5 or recent[-1][0] - recent[0][0] < self.arm_after * 0.9:
+            return False
+        data = np.asarray(recent, dtype=float)
+        if (data[:, 1] < self.threshold).mean() > self.max_still_fraction:
+            return False
+        # 取变化范围较大的方向作为摆动方向，与摄像头安装方向无关
+        axis = 2 if np.ptp(data[:, 2]) >= np.ptp(data[:, 3]) else 3
+        return len(crossing_times(data[:, 0], data[:, axis])) >= self.min_crossings
+
+    def summary(self):
+        return {
+            'armed': self.armed,
+            'energy': round(self.energy, 3),
+            'threshold': self.threshold,
+            'waiting_for_quiet': self._need_quiet,
+            'arms': self.arms,
+            'releases': self.releases,
+        }
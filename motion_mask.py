@@ -0,0 +1,21 @@
+import cv2
+
+
+def frame_diff(gray1, gray2):
+    """两帧灰度差：gray1比gray2亮的部分，变暗的像素记为0"""
+    diff = (gray1.astype('int16') - gray2.astype('int16'))
+    diff[diff < 0] = 0
+    return diff.astype('uint8')
+
+
+def motion_mask(diff, threshold, kernel):
+    """
+    帧差二值化后先腐蚀一次去掉噪点，再膨胀两次连成完整的目标
+
+    参数:
+    threshold -- 二值化阈值
+    kernel -- 腐蚀/膨胀的结构元素（CameraConfigurator.kernel）
+    """
+    _, thresh = cv2.threshold(diff, threshold, 255, cv2.THRESH_BINARY)
+    thresh = cv2.erode(thresh, kernel, iterations=1)
+    return cv2.dilate(thresh, kernel, iterations=2)
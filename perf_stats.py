@@ -0,0 +1,52 @@
+import threading
+import time
+from collections import deque
+
+
+class RateMeter:
+    """
+    事件速率和单次耗时统计
+
+    tick()记录一次事件（如处理完一帧），rate()返回最近window秒内的速率，
+    duration为每次事件的处理耗时（秒），用于判断处理是否跟得上帧率。
+    """
+
+    def __init__(self, window=2.0):
+        self.window = window
+        self.lock = threading.Lock()
+        self._times = deque()
+        self._first = None
+        self.count = 0
+        self.duration_ewma = None
+        self.duration_max = 0.0
+
+    def tick(self, duration=None, now=None):
+        now = time.perf_counter() if now is None else now
+        with self.lock:
+            self.count += 1
+            if self._first is None:
+                self._first = now
+            self._times.append(now)
+            while self._times and self._times[0] < now - self.window:
+                self._times.popleft()
+            if duration is not None:
+                self.duration_max = max(self.duration_max, duration)
+                self.duration_ewma = duration if self.duration_ewma is None else \
+                    0.9 * self.duration_ewma + 0.1 * duration
+
+    def rate(self, now=None):
+        now = time.perf_counter() if now is None else now
+        with self.lock:
+            if self._first is None:
+                return 0.0
+            recent = sum(1 for t in self._times if t >= now - self.window)
+            elapsed = min(self.window, now - self._first)
+        return recent / elapsed if elapsed > 0 else 0.0
+
+    def summary(self):
+        return {
+            'fps': round(self.rate(), 2),
+            'frames': self.count,
+            'process_ms': round(self.duration_ewma * 1000, 3) if self.duration_ewma is not None else None,
+            'process_max_ms': round(self.duration_max * 1000, 3),
+        }
@@ -1,4 +1,7 @@
 import serial
+import threading
+import time
+from collections import OrderedDict, deque
 def send_message_once(message='Hello, UART!'):
     """
     打开串口并发送一次信息的函数。
@@ -67,4 +70,279 @@ def receive_message(port='/dev/ttyAMA0', baudrate=115200, timeout=1):
 '''
 while True:
     if receive_message():
-        print("接收到 'valid'，可以继续执行其他操作。")'''
\ No newline at end of file
+        print("接收到 'valid'，可以继续执行其他操作。")'''
+
+
+class UARTLink:
+    """
+    长期保持打开的串口连接
+
+    send_message_once/receive_message 每次调用都会重新打开串口，打开会复位线路并耗时数毫秒，
+    receive_message还会阻塞整个超时时间。UARTLink只打开一次串口：
+    - 后台读线程持续读取，按行回调（去掉末尾的\\x00和空白）
+    - send()只把数据放入写队列立即返回，写线程把队列中的数据合并成一次写入；
+      带相同key的待发送数据只保留最新一条
+    - 串口断开后自动重连，统计重连次数和收发字节速率
+
+    port可以是任意串口设备，测试时可以使用 os.openpty() 得到的伪终端（见 check_pyuart.py）。
+    """
+
+    def __init__(self, port='/dev/ttyAMA0', baudrate=115200, read_timeout=0.02,
+                 reconnect_delay=0.5, max_reconnect_delay=5.0, max_pending=64 * 1024):
+        """
+        参数:
+        port -- 串口端口号（如 '/dev/ttyAMA0'）
+        baudrate -- 波特率（如 115200）
+        read_timeout -- 读线程单次读取的超时时间（秒），决定stop()的响应速度
+        reconnect_delay -- 首次重连等待时间（秒），之后每次加倍直到max_reconnect_delay
+        max_pending -- 写队列最多缓存的字节数，超出时丢弃最早的数据
+        """
+        self.port = port
+        self.baudrate = baudrate
+        self.read_timeout = read_timeout
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.max_pending = max_pending
+
+        self.ser = None
+        self.connected = threading.Event()
+        self.stopped = threading.Event()
+        self._line_callbacks = []
+        self._data_callbacks = []
+        self._buffer = bytearray()
+
+        # 写队列：key -> bytes，key为None的数据用递增序号作为key，不会被合并
+        self._pending = OrderedDict()
+        self._pending_bytes = 0
+        self._pending_index = 0
+        self._write_cond = threading.Condition()
+
+        # 统计
+        self.opens = 0
+        self.errors = 0
+        self.last_error = None
+        self.bytes_rx = 0
+        self.bytes_tx = 0
+        self.lines_rx = 0
+        self.writes = 0             # 实际写入串口的次数
+        self.messages = 0           # send()调用次数
+        self.coalesced = 0          # 被同key新数据替换掉的消息数
+        self.dropped = 0            # 写队列溢出丢弃的消息数
+        self._rate_samples = deque(maxlen=20)  # (时间, 累计接收, 累计发送)
+
+        self._threads = []
+
+    @property
+    def reconnects(self):
+        return max(0, self.opens - 1)
+
+    # ---------- 回调 ----------
+
+    def add_line_callback(self, callback):
+        """注册按行回调 callback(line, receive_time)，line为去掉首尾空白的字符串"""
+        self._line_callbacks.append(callback)
+        return self
+
+    def add_data_callback(self, callback):
+        """注册原始数据回调 callback(data, receive_time)，用于二进制协议"""
+        self._data_callbacks.append(callback)
+        return self
+
+    # ---------- 启动/停止 ----------
+
+    def start(self):
+        """启动读写线程，串口暂时无法打开时在后台重试"""
+        for target, name in ((self._read_loop, 'uart-reader'), (self._write_loop, 'uart-writer')):
+            thread = threading.Thread(target=target, name=name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self, timeout=1.0):
+        """停止读写线程并关闭串口"""
+        self.stopped.set()
+        with self._write_cond:
+            self._write_cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._close()
+
+    # ---------- 连接管理 ----------
+
+    def _open(self):
+        ser = serial.Serial(self.port, self.baudrate, timeout=self.read_timeout, write_timeout=1)
+        self.ser = ser
+        self.opens += 1
+        self.connected.set()
+        print(f"串口已打开：{ser.name}" + (f"（第{self.reconnects}次重连）" if self.reconnects else ""))
+
+    def _close(self):
+        self.connected.clear()
+        ser, self.ser = self.ser, None
+        if ser is not None and ser.is_open:
+            try:
+                ser.close()
+            except Exception:
+                pass
+
+    def _on_error(self, error):
+        self.errors += 1
+        self.last_error = str(error)
+        if self.connected.is_set():
+            print("串口错误：", error)
+        self._close()
+
+    # ---------- 读线程 ----------
+
+    def _read_loop(self):
+        delay = self.reconnect_delay
+        while not self.stopped.is_set():
+            if self.ser is None:
+                try:
+                    self._open()
+                    delay = self.reconnect_delay
+                except (serial.SerialException, OSError) as e:
+                    self.errors += 1
+                    self.last_error = str(e)
+                    self.stopped.wait(delay)
+                    delay = min(delay * 2, self.max_reconnect_delay)
+                    continue
+
+            try:
+                ser = self.ser
+                data = ser.read(ser.in_waiting or 1)
+            except (serial.SerialException, OSError, TypeError, AttributeError) as e:
+                # TypeError/AttributeError: 其他线程关闭串口时pyserial可能抛出
+                self._on_error(e)
+                continue
+
+            now = time.time()
+            if data:
+                self.bytes_rx += len(data)
+                self._dispatch(data, now)
+            self._sample_rate(now)
+
+    def _dispatch(self, data, now):
+        for callback in self._data_callbacks:
+            try:
+                callback(data, now)
+            except Exception as e:
+                print("串口数据回调错误：", e)
+
+        if not self._line_callbacks:
+            return
+        self._buffer += data
+        while True:
+            end = self._buffer.find(b'\n')
+            if end < 0:
+                break
+            raw = bytes(self._buffer[:end])
+            del self._buffer[:end + 1]
+            line = raw.strip(b'\x00\r\t ').decode('ascii', errors='replace')
+            if not line:
+                continue
+            self.lines_rx += 1
+            for callback in self._line_callbacks:
+                try:
+                    callback(line, now)
+                except Exception as e:
+                    print("串口行回调错误：", e)
+        if len(self._buffer) > self.max_pending:
+            # 长时间没有换行（如二进制数据），丢弃旧数据
+            del self._buffer[:-self.max_pending]
+
+    # ---------- 写队列 ----------
+
+    def send(self, message, key=None):
+        """
+        把数据放入写队列并立即返回
+
+        参数:
+        message -- str（按UTF-8编码）或bytes
+        key -- 合并键，队列中尚未发送的同key数据会被这一条替换（如只保留最新测量值）
+        """
+        data = message.encode('utf-8') if isinstance(message, str) else bytes(message)
+        with self._write_cond:
+            self.messages += 1
+            if key is None:
+                self._pending_index += 1
+                key = ('__seq__', self._pending_index)
+            elif key in self._pending:
+                self._pending_bytes -= len(self._pending.pop(key))
+                self.coalesced += 1
+            self._pending[key] = data
+            self._pending_bytes += len(data)
+            while self._pending_bytes > self.max_pending and len(self._pending) > 1:
+                _, old = self._pending.popitem(last=False)
+                self._pending_bytes -= len(old)
+                self.dropped += 1
+            self._write_cond.notify()
+
+    def pending_bytes(self):
+        with self._write_cond:
+            return self._pending_bytes
+
+    def _write_loop(self):
+        while not self.stopped.is_set():
+            with self._write_cond:
+                while not self._pending and not self.stopped.is_set():
+                    self._write_cond.wait()
+                if self.stopped.is_set():
+                    return
+                if not self.connected.is_set():
+                    # 串口未打开时保留队列，等待重连
+                    self._write_cond.wait(self.read_timeout)
+                    continue
+                data = b''.join(self._pending.values())
+                self._pending.clear()
+                self._pending_bytes = 0
+
+            try:
+                self.ser.write(data)
+                self.bytes_tx += len(data)
+                self.writes += 1
+            except (serial.SerialException, OSError, AttributeError) as e:
+                self._on_error(e)
+
+    # ---------- 统计 ----------
+
+    def _sample_rate(self, now):
+        if not self._rate_samples or now - self._rate_samples[-1][0] >= 0.5:
+            self._rate_samples.append((now, self.bytes_rx, self.bytes_tx))
+
+    def rates(self):
+        """最近约10秒的接收/发送速率（字节/秒）"""
+        samples = list(self._rate_samples)
+        if len(samples) < 2:
+            return 0.0, 0.0
+        (t0, rx0, tx0), (t1, _, _) = samples[0], samples[-1]
+        elapsed = max(time.time(), t1) - t0
+        if elapsed <= 0:
+            return 0.0, 0.0
+        return (self.bytes_rx - rx0) / elapsed, (self.bytes_tx - tx0) / elapsed
+
+    def summary(self):
+        rx_rate, tx_rate = self.rates()
+        return {
+            'port': self.port,
+            'connected': self.connected.is_set(),
+            'reconnects': self.reconnects,
+            'errors': self.errors,
+            'last_error': self.last_error,
+            'bytes_rx': self.bytes_rx,
+            'bytes_tx': self.bytes_tx,
+            'rx_rate': round(rx_rate, 1),
+            'tx_rate': round(tx_rate, 1),
+            'lines_rx': self.lines_rx,
+            'messages': self.messages,
+            'writes': self.writes,
+            'coalesced': self.coalesced,
+            'dropped': self.dropped,
+            'pending_bytes': self.pending_bytes(),
+        }
+
+    def format_summary(self):
+        s = self.summary()
+        return (f"串口{s['port']}: {'已连接' if s['connected'] else '断开'}, 重连={s['reconnects']}, "
+                f"接收={s['bytes_rx']}B ({s['rx_rate']:.0f}B/s), 发送={s['bytes_tx']}B ({s['tx_rate']:.0f}B/s), "
+                f"消息={s['messages']}, 写入={s['writes']}, 合并={s['coalesced']}, 丢弃={s['dropped']}")
@@ -0,0 +1,51 @@
+import csv
+import json
+import threading
+
+# 融合结果输出字段
+RESULT_FIELDS = [
+    'timestamp',
+    'angle_deg', 'angle_err',
+    'period', 'period_err',
+    'length', 'length_err',
+    'samples',
+    'L1', 'T1', 'L2', 'T2',
+]
+
+
+class ResultWriter:
+    """
+    以NDJSON或CSV格式流式输出融合结果
+
+    每条结果写入后立即flush，长时间无人值守运行时中途中断也不会丢失已输出的数据。
+    可以在多个线程中调用write()。
+    """
+
+    def __init__(self, stream, fmt='ndjson'):
+        """
+        参数:
+        stream -- 文本输出流（sys.stdout或打开的文件）
+        fmt -- 'ndjson' 或 'csv'
+        """
+        if fmt not in ('ndjson', 'csv'):
+            raise ValueError(f"不支持的输出格式: {fmt}")
+        self.stream = stream
+        self.fmt = fmt
+        self.lock = threading.Lock()
+        self.count = 0
+        self._csv = None
+        if fmt == 'csv':
+            self._csv = csv.DictWriter(stream, fieldnames=RESULT_FIELDS, extrasaction='ignore')
+            self._csv.writeheader()
+            stream.flush()
+
+    def write(self, result):
+        """写入一条结果字典，缺少的字段输出为空"""
+        row = {field: result.get(field) for field in RESULT_FIELDS}
+        with self.lock:
+            if self.fmt == 'ndjson':
+                self.stream.write(json.dumps(row, ensure_ascii=False) + '\n')
+            else:
+                self._csv.writerow({key: '' if value is None else value for key, value in row.items()})
+            self.stream.flush()
+            self.count += 1
@@ -0,0 +1,109 @@
+import math
+import time
+
+import cv2
+import numpy as np
+
+SYNTHETIC_SOURCE = 'synthetic'
+
+
+class SyntheticCapture:
+    """
+    合成画面的摄像头，接口与cv2.VideoCapture相同（read/set/get/isOpened/release）
+
+    画面为带噪声的深色背景上一个按正弦规律摆动的亮色小球，摆动方向为竖直方向，
+    经服务器逆时针旋转90度后成为水平摆动，可以直接驱动运动检测和周期测量。
+    read()按设定帧率节拍阻塞，行为与真实摄像头一致；fps为0时不限速。
+    """
+
+    def __init__(self, width=640, height=480, fps=30.0, period=1.5, amplitude=0.3, radius=25, noise=4, seed=0):
+        """
+        参数:
+        width, height -- 画面尺寸
+        fps -- 帧率，0表示不限速
+        period -- 摆动周期（秒）
+        amplitude -- 摆幅占画面高度的比例
+        radius -- 小球半径（像素）
+        noise -- 背景噪声幅度（灰度级）
+        """
+        self.period = period
+        self.amplitude = amplitude
+        self.radius = radius
+        self.noise = noise
+        self._rng = np.random.default_rng(seed)
+        self._props = {
+            cv2.CAP_PROP_FRAME_WIDTH: float(width),
+            cv2.CAP_PROP_FRAME_HEIGHT: float(height),
+            cv2.CAP_PROP_FPS: float(fps),
+        }
+        self._opened = True
+        self._start = time.perf_counter()
+        self._next_frame = self._start
+        self._backgrounds = []
+        self._background_index = 0
+        self.frames = 0
+        self._make_backgrounds()
+
+    def _make_backgrounds(self):
+        """预先生成几张噪声背景循环使用，每帧只需复制和画一个圆"""
+        width = int(self._props[cv2.CAP_PROP_FRAME_WIDTH])
+        height = int(self._props[cv2.CAP_PROP_FRAME_HEIGHT])
+        self._backgrounds = [
+            (40 + self._rng.integers(0, self.noise + 1, (height, width, 3))).astype(np.uint8)
+            for _ in range(4)
+        ]
+
+    def isOpened(self):
+        return self._opened
+
+    def read(self):
+        if not self._opened:
+            return False, None
+        fps = self._props[cv2.CAP_PROP_FPS]
+        if fps > 0:
+            now = time.perf_counter()
+            if self._next_frame > now:
+                time.sleep(self._next_frame - now)
+            # 落后超过一帧时不追帧，与真实摄像头丢帧行为一致
+            self._next_frame = max(self._next_frame, now) + 1.0 / fps
+
+        frame = self.frame_at(time.perf_counter() - self._start, self._background_index)
+        self._background_index = (self._background_index + 1) % len(self._backgrounds)
+        self.frames += 1
+        return True, frame
+
+    def frame_at(self, t, background_index=0):
+        """生成t秒时刻的画面（不受节拍限制，相同参数得到相同画面，可用于基准测试）"""
+        frame = self._backgrounds[background_index % len(self._backgrounds)].copy()
+        height, width = frame.shape[:2]
+        y = int(height / 2 + self.amplitude * height * math.sin(2 * math.pi * t / self.period))
+        cv2.circle(frame, (width // 2, y), self.radius, (200, 200, 200), -1)
+        return frame
+
+    def set(self, prop, value):
+        if prop not in self._props:
+            return False
+        self._props[prop] = float(value)
+        if prop in (cv2.CAP_PROP_FRAME_WIDTH, cv2.CAP_PROP_FRAME_HEIGHT):
+            self._make_backgrounds()
+        return True
+
+    def get(self, prop):
+        return self._props.get(prop, 0.0)
+
+    def release(self):
+        self._opened = False
+
+
+def open_capture(source=0):
+    """
+    打开视频源
+
+    参数:
+    source -- 摄像头编号、视频文件路径，或 'synthetic' 表示合成画面
+    """
+    if source == SYNTHETIC_SOURCE:
+        return SyntheticCapture()
+    if isinstance(source, str) and source.isdigit():
+        source = int(source)
+    return cv2.VideoCapture(source)
@@ -0,0 +1,252 @@
+import glob
+import os
+import threading
+import time
+from types import MappingProxyType
+
+# IIO传感器通道（如BME280温湿度气压、光照传感器）：通道名 -> (字段名, 换算到字段单位的系数)
+IIO_CHANNELS = {
+    'in_temp': ('temperature', 0.001),                   # 毫摄氏度 -> °C
+    'in_humidityrelative': ('humidity', 0.001),          # 千分之一% -> %
+    'in_pressure': ('pressure', 10.0),                   # kPa -> hPa
+    'in_illuminance': ('light_level', 1.0),              # lux
+}
+
+
+def read_text(path):
+    """读取/proc或/sys中的小文件，不存在或无权限时返回None"""
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+class CpuUsageReader:
+    """根据/proc/stat两次采样之间的差值计算CPU使用率（第一次为开机以来的平均值）"""
+
+    def __init__(self, path='/proc/stat'):
+        self.path = path
+        self._previous = None
+
+    def __call__(self):
+        text = read_text(self.path)
+        if text is None:
+            return {}
+        values = [int(value) for value in text.splitlines()[0].split()[1:]]
+        idle = values[3] + (values[4] if len(values) > 4 else 0)    # idle + iowait
+        total = sum(values[:8])                                      # 不含guest（已计入user）
+        previous_idle, previous_total = self._previous or (0, 0)
+        self._previous = (idle, total)
+        elapsed = total - previous_total
+        usage = 100.0 * (1 - (idle - previous_idle) / elapsed) if elapsed > 0 else 0.0
+        result = {'cpu_usage': round(usage, 1)}
+        loadavg = read_text('/proc/loadavg')
+        if loadavg:
+            result['load_average'] = float(loadavg.split()[0])
+        return result
+
+
+def read_memory(path='/proc/meminfo'):
+    """内存使用率（按MemAvailable计算，不把缓存算作占用）"""
+    text = read_text(path)
+    if text is None:
+        return {}
+    info = {}
+    for line in text.splitlines():
+        name, _, value = line.partition(':')
+        info[name] = int(value.split()[0])
+    total = info.get('MemTotal', 0)
+    available = info.get('MemAvailable', info.get('MemFree', 0))
+    if total <= 0:
+        return {}
+    return {'memory_usage': round(100.0 * (total - available) / total, 1),
+            'memory_available_mb': round(available / 1024, 1)}
+
+
+def make_disk_reader(path='/'):
+    """返回读取指定挂载点磁盘使用率的函数"""
+    def read_disk():
+        stat = os.statvfs(path)
+        total = stat.f_blocks * stat.f_frsize
+        if total <= 0:
+            return {}
+        free = stat.f_bavail * stat.f_frsize
+        return {'disk_usage': round(100.0 * (total - free) / total, 1)}
+    return read_disk
+
+
+def read_cpu_temperature(pattern='/sys/class/thermal/thermal_zone*'):
+    """SoC温度（树莓派为cpu-thermal），优先选择类型名含cpu/soc的温区"""
+    zones = sorted(glob.glob(pattern))
+    if not zones:
+        return {}
+    preferred = [zone for zone in zones if any(key in (read_text(f'{zone}/type') or '').lower()
+                                               for key in ('cpu', 'soc'))]
+    for zone in preferred + zones:
+        text = read_text(f'{zone}/temp')
+        if text:
+            return {'cpu_temperature': round(int(text) / 1000.0, 1)}
+    return {}
+
+
+class NetworkRateReader:
+    """根据/proc/net/dev两次采样之间的字节数差值计算网络速率（Mbps，不含lo）"""
+
+    def __init__(self, interfaces=None, path='/proc/net/dev'):
+        """interfaces -- 只统计这些网卡，None表示除lo以外的所有网卡"""
+        self.interfaces = interfaces
+        self.path = path
+        self._previous = None
+
+    def __call__(self):
+        text = read_text(self.path)
+        if text is None:
+            return {}
+        rx = tx = 0
+        for line in text.splitlines()[2:]:
+            name, _, data = line.partition(':')
+            name = name.strip()
+            if name == 'lo' or (self.interfaces is not None and name not in self.interfaces):
+                continue
+            fields = data.split()
+            rx += int(fields[0])
+            tx += int(fields[8])
+        now = time.monotonic()
+        previous, self._previous = self._previous, (now, rx, tx)
+        if previous is None or now <= previous[0]:
+            return {}
+        elapsed = now - previous[0]
+        rx_mbps = (rx - previous[1]) * 8 / elapsed / 1e6
+        tx_mbps = (tx - previous[2]) * 8 / elapsed / 1e6
+        return {'network_speed': round(rx_mbps + tx_mbps, 3),
+                'network_rx_mbps': round(rx_mbps, 3), 'network_tx_mbps': round(tx_mbps, 3)}
+
+
+def read_system_uptime(path='/proc/uptime'):
+    text = read_text(path)
+    return {'system_uptime': int(float(text.split()[0]))} if text else {}
+
+
+def _read_iio_channel(device, channel):
+    """优先读取已换算的 _input，否则按 (_raw + _offset) * _scale 计算"""
+    value = read_text(f'{device}/{channel}_input')
+    if value is not None:
+        return float(value)
+    raw = read_text(f'{device}/{channel}_raw')
+    if raw is None:
+        return None
+    offset = float(read_text(f'{device}/{channel}_offset') or 0)
+    scale = float(read_text(f'{device}/{channel}_scale') or 1)
+    return (float(raw) + offset) * scale
+
+
+def read_iio_sensors(pattern='/sys/bus/iio/devices/iio:device*'):
+    """读取IIO子系统中的环境传感器（温度、湿度、气压、光照），没有接传感器时返回空字典"""
+    result = {}
+    for device in sorted(glob.glob(pattern)):
+        for channel, (name, factor) in IIO_CHANNELS.items():
+            if name in result:
+                continue
+            value = _read_iio_channel(device, channel)
+            if value is not None:
+                result[name] = round(value * factor, 1)
+    return result
+
+
+def default_readers():
+    """默认的读取器列表 [(名称, 无参函数), ...]，每个函数返回字段字典"""
+    return [
+        ('cpu', CpuUsageReader()),
+        ('memory', read_memory),
+        ('disk', make_disk_reader('/')),
+        ('cpu_temperature', read_cpu_temperature),
+        ('network', NetworkRateReader()),
+        ('uptime', read_system_uptime),
+        ('sensors', read_iio_sensors),
+    ]
+
+
+class TelemetrySampler:
+    """
+    独立线程按固定间隔采集系统和传感器数据
+
+    每次采样生成一个新的只读快照（MappingProxyType）并整体替换引用，读取方调用snapshot()
+    直接拿到当前快照，不需要加锁，也不会和视频帧循环争用锁。读取器可以用add_reader()扩展，
+    单个读取器或监听器出错只记录错误（读取器保留上一次的值），不影响其他读取器和采样线程。
+    """
+
+    def __init__(self, interval=1.0, readers=None):
+        """
+        参数:
+        interval -- 采样间隔（秒）
+        readers -- [(名称, 无参函数), ...]，None表示使用default_readers()
+        """
+        self.interval = interval
+        self._readers = list(readers) if readers is not None else default_readers()
+        self._snapshot = MappingProxyType({'timestamp': None})
+        self._last_values = {}
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._listeners = ()
+        self.samples = 0
+        self.errors = {}            # 出错的读取器/监听器 -> 最近一次错误；写时复制，读取方拿到的字典不会再被修改
+        self.sample_ms = 0.0
+
+    def add_reader(self, name, reader):
+        """添加读取器（可在运行中调用，下一次采样生效）"""
+        self._readers = self._readers + [(name, reader)]
+
+    def add_listener(self, callback):
+        """每次发布新快照后调用 callback(snapshot)（在采样线程中）"""
+        self._listeners = self._listeners + (callback,)
+
+    def sample(self):
+        """采集一次并发布新快照"""
+        start = time.perf_counter()
+        values = {}
+        for name, reader in self._readers:
+            try:
+                result = reader()
+                self._last_values[name] = result
+            except Exception as e:
+                # 读取器可以由外部添加，任何异常都不能终止采样线程
+                self._record_error(name, e)
+                result = self._last_values.get(name, {})
+            values.update(result)
+        self.samples += 1
+        self.sample_ms = (time.perf_counter() - start) * 1000
+        values['timestamp'] = time.time()
+        values['sample_ms'] = round(self.sample_ms, 3)
+        snapshot = self._snapshot = MappingProxyType(values)
+        for callback in self._listeners:
+            try:
+                callback(snapshot)
+            except Exception as e:
+                self._record_error(f"listener:{getattr(callback, '__name__', callback)}", e)
+        return snapshot
+
+    def _record_error(self, name, error):
+        """替换整个errors字典而不是原地修改，HTTP线程序列化时不会遇到字典大小变化"""
+        errors = dict(self.errors)
+        errors[name] = f"{type(error).__name__}: {error}"
+        self.errors = errors
+
+    def snapshot(self):
+        """当前快照（只读，不会再被修改）"""
+        return self._snapshot
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop_event.set()
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            start = time.perf_counter()
+            self.sample()
+            self._stop_event.wait(max(0.0, self.interval - (time.perf_counter() - start)))
@@ -1,9 +1,13 @@
 import cv2                     # 导入OpenCV库，用于图像处理和显示
 import numpy as np             # 导入NumPy库，用于处理数组数据
 import requests                # 导入requests库，用于HTTP请求
-from threading import Thread   # 导入Thread类，用于多线程
+from threading import Thread, Lock  # 导入Thread和Lock类，用于多线程
 import time                    # 导入时间模块
 import json                    # 导入JSON处理模块
+from frame_latency import (FrameLatencyTracker, frame_meta_from_headers,
+                           estimate_clock_offset)  # 导入帧延迟统计工具
+from mjpeg_stream import iter_mjpeg_parts  # 导入MJPEG流解析器
+from http_session import create_session    # 导入持久连接会话
 
 class VideoStreamTester:
     def __init__(self, base_url):
@@ -13,11 +17,22 @@ class VideoStreamTester:
         self.status_url = f"{base_url}/system_status" # 系统状态URL
         self.command_url = f"{base_url}/send_command" # 命令发送URL
         self.frame = None      # 当前帧，初始为None
+        self.frame_meta = None # 当前帧的元数据（帧序号、采集时间戳）
+        self.frame_lock = Lock()  # 保证帧和元数据成对更新
+        self.latency = FrameLatencyTracker()  # 采集到显示延迟统计
         self.sensor_data = {}  # 传感器数据
         self.system_status = {} # 系统状态
         self.stopped = False   # 控制线程停止的标志
+        self.session = create_session()  # 数据和命令请求复用keep-alive连接
 
     def start(self):
+        # 估计服务器与客户端的时钟偏差
+        offset, rtt = estimate_clock_offset(self.base_url, session=self.session)
+        if offset is not None:
+            self.latency.set_clock_offset(offset)
+            print(f"时钟偏差: {offset * 1000:.1f}ms (RTT {rtt * 1000:.1f}ms)")
+        else:
+            print("无法获取服务器时钟，延迟按零偏差计算")
         # 启动视频流线程
         Thread(target=self.update_video, args=()).start()
         # 启动数据获取线程
@@ -28,21 +43,18 @@ class VideoStreamTester:
         """更新视频流"""
         try:
             stream = requests.get(self.video_url, stream=True) # 以流模式请求视频流
-            bytes_data = bytes()                         # 用于缓存接收到的字节数据
 
-            for chunk in stream.iter_content(chunk_size=1024):  # 持续读取数据块
+            for headers, jpg in iter_mjpeg_parts(stream):  # 按multipart边界逐帧解析
                 if self.stopped:                        # 如果停止标志为True，则退出
                     return
 
-                bytes_data += chunk                     # 累加接收到的数据
-                a = bytes_data.find(b'\xff\xd8')        # 查找JPEG图片的起始标志
-                b = bytes_data.find(b'\xff\xd9')        # 查找JPEG图片的结束标志
-
-                if a != -1 and b != -1:                 # 如果找到了完整的JPEG图片
-                    jpg = bytes_data[a:b+2]             # 截取完整的JPEG图片数据
-                    bytes_data = bytes_data[b+2:]       # 剩余数据保留，等待下次处理
-                    self.frame = cv2.imdecode(np.frombuffer(jpg, dtype=np.uint8), 
-                                            cv2.IMREAD_COLOR)  # 解码为OpenCV图像
+                meta = frame_meta_from_headers(headers) # 分段头部中的帧元数据
+                frame = cv2.imdecode(np.frombuffer(jpg, dtype=np.uint8), 
+                                     cv2.IMREAD_COLOR)  # 解码为OpenCV图像
+                self.latency.on_receive(meta)           # 统计丢帧和重复帧
+                with self.frame_lock:
+                    self.frame = frame
+                    self.frame_meta = meta
         except Exception as e:
             print(f"视频流连接错误: {e}")
 
@@ -51,12 +63,12 @@ class VideoStreamTester:
         while not self.stopped:
             try:
                 # 获取传感器数据
-                response = requests.get(self.data_url, timeout=1)
+                response = self.session.get(self.data_url, timeout=1)
                 if response.status_code == 200:
                     self.sensor_data = response.json()
                 
                 # 获取系统状态
-                response = requests.get(self.status_url, timeout=1)
+                response = self.session.get(self.status_url, timeout=1)
                 if response.status_code == 200:
                     self.system_status = response.json()
                     
@@ -69,7 +81,7 @@ class VideoStreamTester:
         """发送命令到服务器"""
         command = {'action': action, 'params': params or {}}
         try:
-            response = requests.post(self.command_url, json=command, timeout=2)
+            response = self.session.post(self.command_url, json=command, timeout=2)
             return response.json()
         except Exception as e:
             print(f"命令发送错误: {e}")
@@ -80,11 +92,11 @@ class VideoStreamTester:
 
 def test_with_data(stream):
     """测试视频流和数据传输"""
-    prev_time = cv2.getTickCount()  # 获取初始时间戳
-    
     while True:
-        if stream.frame is not None:
-            frame = stream.frame.copy()
+        with stream.frame_lock:
+            frame, meta = stream.frame, stream.frame_meta
+        if frame is not None:
+            frame = frame.copy()
             
             # 在视频上显示传感器数据
             if stream.sensor_data:
@@ -119,13 +131,18 @@ def test_with_data(stream):
                 cv2.putText(frame, uptime_text, (10, 210), cv2.FONT_HERSHEY_SIMPLEX, 
                            0.7, (255, 0, 0), 2)
 
-            # 计算延迟
-            curr_time = cv2.getTickCount()
-            latency = (curr_time - prev_time) / cv2.getTickFrequency() * 1000
-            latency_text = f"Latency: {latency:.2f}ms"
+            # 计算采集到显示的延迟
+            stream.latency.on_display(meta)
+            stats = stream.latency.summary()
+            if stats['p50_ms'] is not None:
+                latency_text = f"Latency p50: {stats['p50_ms']:.1f}ms p95: {stats['p95_ms']:.1f}ms"
+            else:
+                latency_text = "Latency: N/A"
             cv2.putText(frame, latency_text, (10, 240), cv2.FONT_HERSHEY_SIMPLEX, 
                        0.7, (0, 0, 255), 2)
-            prev_time = curr_time
+            drop_text = f"Dropped: {stats['dropped']} Dup: {stats['duplicate']}"
+            cv2.putText(frame, drop_text, (10, 270), cv2.FONT_HERSHEY_SIMPLEX, 
+                       0.7, (0, 0, 255), 2)
             
             cv2.imshow('HTTP Stream with Data', frame)
 
@@ -143,21 +160,28 @@ def test_with_data(stream):
             print(json.dumps(stream.sensor_data, indent=2, ensure_ascii=False))
             print("=== 系统状态 ===")
             print(json.dumps(stream.system_status, indent=2, ensure_ascii=False))
+            print("=== 延迟统计 ===")
+            print(stream.latency.format_summary())
 
 def test_latency(stream):
-    """原始延迟测试功能"""
-    prev_time = cv2.getTickCount()  # 获取初始时间戳
+    """采集到显示延迟测试功能"""
+    last_report = time.time()                           # 上次打印统计的时间
     while True:
-        if stream.frame is not None:    # 如果有新帧
-            cv2.imshow('HTTP Stream Test', stream.frame)  # 显示当前帧
-
-            curr_time = cv2.getTickCount()                # 获取当前时间戳
-            latency = (curr_time - prev_time) / cv2.getTickFrequency() * 1000  # 计算延迟（毫秒）
-            print(f"当前延迟: {latency:.2f}ms")            # 打印延迟
-            prev_time = curr_time                         # 更新时间戳
+        with stream.frame_lock:
+            frame, meta = stream.frame, stream.frame_meta
+        if frame is not None:                           # 如果有帧
+            cv2.imshow('HTTP Stream Test', frame)       # 显示当前帧
+            latency = stream.latency.on_display(meta)   # 新帧才计算延迟
+            if latency is not None:
+                print(f"帧 {meta['seq']} 采集到显示延迟: {latency:.2f}ms")
+
+        if time.time() - last_report >= 5:              # 每5秒打印一次百分位统计
+            print(stream.latency.format_summary())
+            last_report = time.time()
 
         if cv2.waitKey(1) & 0xFF == ord('q'):             # 按下q键退出循环
             break
+    print(stream.latency.format_summary())
 
 if __name__ == '__main__':
     base_url = "http://169.254.163.62:5000"  # 设置服务器基础URL
@@ -3,12 +3,25 @@ import cv2
 import threading
 import time
 import json
+import argparse
+from collections import deque
+from synthetic_source import open_capture
+from perf_stats import RateMeter
+from frame_scheduler import FrameScheduler
+from camera_config import CameraConfigurator, crop_band
+from frame_bus import FrameBus, mjpeg_generator, stream_generator
+from http_cache import JSONCache, cached_json_response, snapshot_response
+from blob_extract import find_target, BLOB_MODES
+from motion_mask import frame_diff, motion_mask
+from uart_protocol import FrameEncoder, SOURCE_SERVER2
+from control_lease import ControlLease, MAX_LEASE_TTL
+from motion_energy import AutoArmer
 
 app = Flask(__name__)
 
-# 全局变量存储视频帧和数据
-current_frame = None
-frame_lock = threading.Lock()
+# 视频帧发布：每帧在锁外编码后替换为新的不可变Frame（含帧序号、采集和编码时间戳），
+# 每个观看者有自己的队列，太慢时丢弃最旧的帧，不影响检测线程
+frame_bus = FrameBus()
 
 # 存储L和T变量的全局变量
 motion_data = {
@@ -18,6 +31,48 @@ motion_data = {
 }
 data_lock = threading.Lock()
 
+# 视频源：摄像头编号、视频文件或 'synthetic'（--camera 指定）
+camera_source = 0
+
+# 检测帧率和每帧处理耗时
+detection_perf = RateMeter()
+
+# 按摄像头帧率和每帧截止时间调度检测循环，过载时逐级降级
+frame_scheduler = FrameScheduler()
+
+# 运行时修改摄像头和检测参数（/camera_config），在两帧之间生效
+camera_config = CameraConfigurator()
+
+# 运动目标提取方式和过滤条件（--blob-mode 等指定）
+blob_mode = 'contours'
+blob_min_area = 0
+blob_max_aspect = None
+
+# 串口输出：以二进制帧把每个新测量值推送给单片机（--uart 启用）
+uart_link = None
+uart_encoder = FrameEncoder()
+
+def start_uart(port, baudrate=115200, on_line=None):
+    """
+    打开持久串口链路，之后每个新测量值都通过二进制帧推送给单片机
+    on_line: 收到单片机发来的一行命令时的回调 on_line(line, receive_time)
+    """
+    global uart_link
+    from pyuart import UARTLink  # 只有启用串口时才需要pyserial
+    uart_link = UARTLink(port, baudrate)
+    if on_line is not None:
+        uart_link.add_line_callback(on_line)
+    uart_link.start()
+    return uart_link
+
+def publish_measurement(capture_ts):
+    """把最新的L、T编码为测量值帧放入串口写队列，尚未发出的旧测量值会被替换"""
+    if uart_link is None:
+        return
+    with data_lock:
+        L, T = motion_data['L'], motion_data['T']
+    uart_link.send(uart_encoder.measurement(SOURCE_SERVER2, L, T or None, capture_ts), key='measurement')
+
 # 控制摄像识别的全局变量
 camera_active = False  # 摄像识别状态
 valid_signal = False   # 客户端valid信号
@@ -27,13 +82,110 @@ client_info = {
     'signal_count': 0
 }
 control_lock = threading.Lock()
+control_changed = threading.Event()  # 控制状态变化时唤醒待机中的检测线程
+
+def on_lease_change(valid, source, reason):
+    """控制租约状态变化时同步摄像识别状态"""
+    global camera_active, valid_signal
+    with control_lock:
+        valid_signal = valid
+        camera_active = valid
+    control_changed.set()
+    motion_cache.touch()
+    status_cache.touch()
+    if not valid and source != AUTO_CLIENT_ID and auto_armer is not None:
+        # 被客户端或单片机停止后，摆停下来之前不再自动启动
+        auto_armer.hold()
+    if reason == 'expired':
+        print("控制租约已到期，自动回到待机模式")
+
+# valid状态以租约形式保存，客户端停止心跳后自动回到待机
+control_lease = ControlLease(on_change=on_lease_change)
+
+# 自动启动：待机时用低分辨率运动能量检测周期运动（--auto-arm 启用）
+AUTO_CLIENT_ID = 'auto'
+AUTO_ARM_TTL = 5.0          # 自动启动的租约有效期，检测线程每帧续约
+auto_armer = None
+
+# 串口控制：单片机发送的命令行（--uart-control 启用），与HTTP控制使用同一个租约
+UART_START_COMMANDS = {'1', 'start', 'valid'}
+UART_STOP_COMMANDS = {'0', 'stop'}
+UART_HEARTBEAT_COMMANDS = {'hb', 'heartbeat'}
+UART_CLIENT_ID = 'uart'
+uart_control_ttl = MAX_LEASE_TTL    # 串口启动命令的租约有效期，单片机可发送hb续约
+uart_trigger_stats = {
+    'commands': 0,
+    'unknown': 0,
+    'last_command': None,
+    'last_apply_ms': None,          # 收到命令到租约生效的延迟
+    'max_apply_ms': 0.0,
+    'last_first_frame_ms': None,    # 收到启动命令到第一帧开始检测的延迟
+}
+uart_trigger_time = None            # 尚未开始检测的串口启动命令的接收时间
+
+def on_uart_line(line, receive_time):
+    """处理单片机发来的启动/停止/心跳命令"""
+    global uart_trigger_time
+    command = line.strip().lower()
+    if command in UART_HEARTBEAT_COMMANDS:
+        control_lease.heartbeat(UART_CLIENT_ID, ttl=uart_control_ttl)
+        return
+    if command in UART_START_COMMANDS:
+        new_valid = True
+    elif command in UART_STOP_COMMANDS:
+        new_valid = False
+    else:
+        uart_trigger_stats['unknown'] += 1
+        print(f"忽略未知串口命令: {line!r}")
+        return
+    
+    control_lease.apply(new_valid, UART_CLIENT_ID, ttl=uart_control_ttl, source='uart')
+    apply_ms = (time.time() - receive_time) * 1000
+    uart_trigger_time = receive_time if new_valid else None
+    
+    with control_lock:
+        client_info['client_id'] = UART_CLIENT_ID
+        client_info['last_signal_time'] = time.time()
+        client_info['signal_count'] += 1
+    uart_trigger_stats['commands'] += 1
+    uart_trigger_stats['last_command'] = command
+    uart_trigger_stats['last_apply_ms'] = round(apply_ms, 3)
+    uart_trigger_stats['max_apply_ms'] = round(max(uart_trigger_stats['max_apply_ms'], apply_ms), 3)
+    
+    status_msg = "摄像识别已启动" if new_valid else "摄像识别已停止"
+    print(f"收到串口控制命令: {command} - {status_msg} ({apply_ms:.2f}ms)")
+
+def frame_data(cx, cy, detected, display_scale):
+    """
+    与视频帧一起发布的检测数据（/stream中的JSON分段），包含控制状态
+
+    cx, cy为检测画面中的目标中心，乘以display_scale即为JPEG图像中的坐标
+    """
+    with data_lock:
+        data = motion_data.copy()
+    with control_lock:
+        data['camera_active'] = camera_active
+        data['valid_signal'] = valid_signal
+    data.update({'cx': cx, 'cy': cy, 'detected': detected, 'display_scale': display_scale,
+                 'mode': frame_scheduler.mode})
+    return data
+
+def amplitude_window(fps):
+    """测量L使用的帧数：30fps时为50帧（约1.7秒），帧率提高时按比例增加，保证覆盖半个以上摆动周期"""
+    return max(50, round(50 * fps / 30))
+
+def diff_lag(fps):
+    """帧差比较的间隔帧数：高帧率时相邻两帧的位移太小，摆到两端时检测不到运动，改为与约1/30秒前的帧比较"""
+    return max(1, round(fps / 30))
 
 def motion_detection_thread():
     """运动检测线程"""
-    global current_frame, motion_data, camera_active
+    global motion_data, camera_active, uart_trigger_time
     
     # 初始化摄像头
-    cap = cv2.VideoCapture(0)
+    cap = open_capture(camera_source)
+    frame_scheduler.set_fps(cap.get(cv2.CAP_PROP_FPS))
+    camera_config.read_camera_values(cap)
     
     # 读取第一帧
     ret, frame1 = cap.read()
@@ -41,11 +193,12 @@ def motion_detection_thread():
         print("无法读取摄像头")
         return
         
-    frame1 = cv2.rotate(frame1, cv2.ROTATE_90_COUNTERCLOCKWISE)
+    frame1 = cv2.rotate(crop_band(frame1, camera_config.band), cv2.ROTATE_90_COUNTERCLOCKWISE)
     gray1 = cv2.cvtColor(frame1, cv2.COLOR_BGR2GRAY)
+    gray_history = deque([gray1], maxlen=diff_lag(frame_scheduler.fps))
     
     # 定义矩形结构元素
-    rectangle_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (5, 5))
+    rectangle_kernel = camera_config.kernel
     
     # 初始化变量
     count = 0
@@ -55,20 +208,40 @@ def motion_detection_thread():
     cxmid = 0
     cxpast = 0
     start_time = time.perf_counter()
+    amplitude_frames = amplitude_window(frame_scheduler.fps)
     
     print("运动检测线程已启动，等待valid信号...")
     
     while True:
-        # 检查是否应该进行摄像识别
+        # 检查是否应该进行摄像识别（租约到期会自动回到待机）
+        control_changed.clear()
+        control_lease.is_active()
         with control_lock:
             should_process = camera_active and valid_signal
         
+        # 在两帧之间应用运行时配置修改（分辨率、帧率、曝光、阈值等）
+        if camera_config.apply_pending(cap):
+            frame_scheduler.set_fps(cap.get(cv2.CAP_PROP_FPS))
+            rectangle_kernel = camera_config.kernel
+            amplitude_frames = amplitude_window(frame_scheduler.fps)
+            gray_history = deque(gray_history, maxlen=diff_lag(frame_scheduler.fps))
+        
         if not should_process:
             # 如果没有valid信号，只显示原始摄像头画面
             ret, frame2 = cap.read()
             if ret:
+                capture_ts = time.time()
+                camera_config.frame_done()
                 frame2 = cv2.rotate(frame2, cv2.ROTATE_90_COUNTERCLOCKWISE)
                 
+                if auto_armer is not None:
+                    if auto_armer.armed:
+                        # 自动启动的租约已失效，等运动停止后才再次自动启动
+                        auto_armer.reset(require_quiet=True)
+                    elif auto_armer.update(frame2, capture_ts) == 'arm':
+                        control_lease.apply(True, AUTO_CLIENT_ID, ttl=AUTO_ARM_TTL, source=AUTO_CLIENT_ID)
+                        print("检测到持续的周期运动，自动启动摄像识别")
+                
                 # 添加等待信号的提示
                 cv2.putText(frame2, "等待客户端valid信号...", (10, 30), 
                            cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
@@ -76,54 +249,80 @@ def motion_detection_thread():
                            cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 0), 2)
                 
                 # 更新当前帧
-                with frame_lock:
-                    _, buffer = cv2.imencode('.jpg', frame2)
-                    current_frame = buffer.tobytes()
+                _, buffer = cv2.imencode('.jpg', frame2)
+                frame_bus.publish(buffer.tobytes(), capture_ts, frame_data(None, None, False, 1.0))
             
-            time.sleep(0.1)  # 等待模式下降低帧率
+            if not camera_config.measuring:
+                # 等待模式下降低帧率，收到控制信号时立即唤醒；
+                # 统计配置修改后的实际帧率时按摄像头速率读取，否则测到的是待机循环的限速
+                control_changed.wait(0.1)
             continue
         
         # 进行正常的运动检测处理
         ret, frame2 = cap.read()
         if not ret:
             break
+        capture_ts = time.time()
+        camera_config.frame_done()
+        
+        if uart_trigger_time is not None:
+            # 串口启动命令到第一帧开始检测的延迟
+            uart_trigger_stats['last_first_frame_ms'] = round((capture_ts - uart_trigger_time) * 1000, 3)
+            uart_trigger_time = None
+        
+        plan = frame_scheduler.begin_frame()
+        if not plan['detect']:
+            # 过载时隔帧检测：这一帧只读取（保持摄像头缓冲区最新），不处理
+            frame_scheduler.end_frame()
+            frame_scheduler.wait()
+            continue
             
-        frame2 = cv2.rotate(frame2, cv2.ROTATE_90_COUNTERCLOCKWISE)
+        # 高帧率模式下只处理摆动所在的水平带（--band），旋转前裁剪
+        frame2 = cv2.rotate(crop_band(frame2, camera_config.band), cv2.ROTATE_90_COUNTERCLOCKWISE)
         gray2 = cv2.cvtColor(frame2, cv2.COLOR_BGR2GRAY)
+        gray1 = gray_history[0]
+        if gray2.shape != gray1.shape:
+            # 分辨率或裁剪范围刚刚改变：以新尺寸的第一帧作为参考帧，坐标尺度变了，重新开始测量
+            gray1 = gray2
+            gray_history.clear()
+            count = count1 = 0
+            cxmax, cxmin = 0, 1000
+            start_time = time.perf_counter()
         
-        # 计算两帧的差异
-        diff = (gray1.astype('int16') - gray2.astype('int16'))
-        diff[diff < 0] = 0
-        diff = diff.astype('uint8')
+        if auto_armer is not None and auto_armer.armed:
+            # 自动启动的检测：运动持续时续约，运动停止后回到待机
+            if not control_lease.heartbeat(AUTO_CLIENT_ID, ttl=AUTO_ARM_TTL):
+                auto_armer.reset(require_quiet=True)  # 已被其他控制源接管
+            elif auto_armer.update(gray2, capture_ts) == 'release':
+                control_lease.apply(False, AUTO_CLIENT_ID, source=AUTO_CLIENT_ID)
+                print("运动已停止，自动回到待机模式")
         
-        # 二值化以突出差异
-        _, thresh = cv2.threshold(diff, 30, 255, cv2.THRESH_BINARY)
-        thresh = cv2.erode(thresh, rectangle_kernel, iterations=1)
-        thresh = cv2.dilate(thresh, rectangle_kernel, iterations=2)
+        # 计算两帧的差异，二值化以突出差异
+        diff = frame_diff(gray1, gray2)
+        thresh = motion_mask(diff, camera_config.threshold, rectangle_kernel)
         
-        # 找出轮廓
-        contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        # 找出运动目标（轮廓或连通区域，由--blob-mode选择）
+        target = find_target(thresh, blob_mode, blob_min_area, blob_max_aspect)
         
         # 在frame2上绘制检测结果
-        display_frame2 = frame2.copy()
+        display_frame2 = frame2.copy() if plan['annotate'] else frame2
         cx, cy = 0, 0
         
-        # 识别面积最大的轮廓
-        if contours:
-            largest_contour = max(contours, key=cv2.contourArea)
-            x, y, w, h = cv2.boundingRect(largest_contour)
-            cv2.rectangle(display_frame2, (x, y), (x + w, y + h), (0, 255, 0), 2)
+        # 识别面积最大的目标
+        if target is not None:
+            x, y, w, h, target_cx, target_cy = target
+            if plan['annotate']:
+                cv2.rectangle(display_frame2, (x, y), (x + w, y + h), (0, 255, 0), 2)
             
-            # 计算最大轮廓的中心坐标
-            M = cv2.moments(largest_contour)
-            if M["m00"] != 0:
-                cx = int(M["m10"] / M["m00"])
-                cy = int(M["m01"] / M["m00"])
-                cv2.circle(display_frame2, (cx, cy), 5, (0, 0, 255), -1)
+            # 最大目标的中心坐标（面积为零的轮廓没有中心）
+            if target_cx is not None:
+                cx, cy = target_cx, target_cy
+                if plan['annotate']:
+                    cv2.circle(display_frame2, (cx, cy), 5, (0, 0, 255), -1)
                 
                 # 运动检测逻辑
                 if count1 == 0:
-                    if count < 50:
+                    if count < amplitude_frames:
                         count += 1
                         cxmax = cx if cx > cxmax else cxmax
                         cxmin = cx if cx < cxmin else cxmin
@@ -143,7 +342,9 @@ def motion_detection_thread():
                         
                         # 更新全局数据
                         with data_lock:
-                            motion_data.update({'L': L,})
+                            motion_data.update({'L': L, 'L_timestamp': capture_ts})
+                        motion_cache.touch()
+                        publish_measurement(capture_ts)
                 else:
                     if (cxpast - cxmid) * (cx - cxmid) < 0:
                         if count1 == 1:
@@ -158,38 +359,47 @@ def motion_detection_thread():
                             
                             # 更新全局数据
                             with data_lock:
-                                motion_data.update({'T': T,'timestamp': time.time(),})
+                                motion_data.update({'T': T, 'T_timestamp': capture_ts, 'timestamp': time.time(),})
+                            motion_cache.touch()
+                            publish_measurement(capture_ts)
                         cxpast = cx
         
-        # 创建显示图像
-        thresh_img = cv2.merge([thresh, thresh, thresh])
-        display_img = cv2.hconcat([display_frame2, thresh_img])
-        
-        # 压缩为原来的一半
-        h, w = display_img.shape[:2]
-        display_img_small = cv2.resize(display_img, (w // 2, h // 2))
-          # 添加数据信息到图像上
-        with data_lock:
-            info_text = f"L={motion_data['L']:.1f}, T={motion_data['T']:.2f}s"
-            cv2.putText(display_img_small, info_text, (10, 30), 
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
+        if plan['encode']:
+            # 创建显示图像（降级时不拼接二值图、不加文字，直接压缩原画面）
+            if plan['annotate']:
+                thresh_img = cv2.merge([thresh, thresh, thresh])
+                display_img = cv2.hconcat([display_frame2, thresh_img])
+            else:
+                display_img = display_frame2
             
-        # 添加服务器状态信息
-        with control_lock:
-            status_text = f"SERVER 2 - {'运行中' if valid_signal else '待机'}"
-            cv2.putText(display_img_small, status_text, (10, 60), 
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0) if valid_signal else (0, 0, 255), 2)
-        
-        # 更新当前帧
-        with frame_lock:
+            # 压缩为原来的一半
+            h, w = display_img.shape[:2]
+            display_img_small = cv2.resize(display_img, (w // 2, h // 2))
+            
+            if plan['annotate']:
+                # 添加数据信息到图像上
+                with data_lock:
+                    info_text = f"L={motion_data['L']:.1f}, T={motion_data['T']:.2f}s"
+                    cv2.putText(display_img_small, info_text, (10, 30), 
+                               cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
+                    
+                # 添加服务器状态信息
+                with control_lock:
+                    status_text = f"SERVER 2 - {'运行中' if valid_signal else '待机'}"
+                    cv2.putText(display_img_small, status_text, (10, 60), 
+                               cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0) if valid_signal else (0, 0, 255), 2)
+            
+            # 更新当前帧（编码不持有任何锁，发布只是替换引用），这一帧的检测数据随帧一起发布
             _, buffer = cv2.imencode('.jpg', display_img_small)
-            current_frame = buffer.tobytes()
+            frame_bus.publish(buffer.tobytes(), capture_ts, frame_data(cx, cy, target is not None, 0.5))
+        detection_perf.tick(time.time() - capture_ts)
         
         # 准备下一次迭代
-        gray1 = gray2
+        gray_history.append(gray2)
         
-        # 控制帧率
-        time.sleep(0.03)  # 约30fps
+        # 等待到下一帧的截止时间（按摄像头帧率，已超时则不等待）
+        frame_scheduler.end_frame()
+        frame_scheduler.wait()
     
     cap.release()
 
@@ -207,8 +417,11 @@ def index():
     <h2>API接口</h2>
     <ul>
         <li><a href="/video_feed">/video_feed</a> - 视频流</li>
+        <li><a href="/stream">/stream</a> - 视频和检测数据合并流</li>
+        <li><a href="/snapshot.jpg">/snapshot.jpg</a> - 最新一帧图像</li>
         <li><a href="/motion_data">/motion_data</a> - 运动检测数据(L, T变量)</li>
         <li><a href="/ping">/ping</a> - 服务器状态</li>
+        <li><a href="/clock">/clock</a> - 服务器时钟</li>
     </ul>
     
     <script>
@@ -233,22 +446,23 @@ def index():
 
 @app.route('/video_feed')     # 视频流端点
 def video_feed():
-    """视频流端点"""
-    def generate():
-        while True:
-            with frame_lock:
-                if current_frame is not None:
-                    yield (b'--frame\r\n'
-                           b'Content-Type: image/jpeg\r\n\r\n' + 
-                           current_frame + b'\r\n')
-            time.sleep(0.03)  # 控制帧率
-    
-    return Response(generate(),
+    """视频流端点（每个新帧发送一次，观看者太慢时丢弃旧帧）"""
+    return Response(mjpeg_generator(frame_bus),
                    mimetype='multipart/x-mixed-replace; boundary=frame')
 
-@app.route('/motion_data')
-def get_motion_data():
-    """获取并发送运动检测数据（L和T变量）和控制信号"""
+@app.route('/stream')
+def stream():
+    """视频和检测数据合并流：每帧一个JSON分段（L、T、目标中心、控制状态）加一个JPEG分段，帧序号相同"""
+    return Response(stream_generator(frame_bus),
+                   mimetype='multipart/mixed; boundary=frame')
+
+@app.route('/snapshot.jpg')
+def snapshot():
+    """最新一帧JPEG（支持If-None-Match返回304，wait参数等待下一帧）"""
+    return snapshot_response(frame_bus)
+
+def build_motion_data():
+    """运动检测数据（L和T变量）和控制信号"""
     with data_lock:
         response_data = motion_data.copy()
     
@@ -256,27 +470,62 @@ def get_motion_data():
         response_data['camera_active'] = camera_active
         response_data['valid_signal'] = valid_signal
         
-    return jsonify(response_data)
+    return response_data
+
+@app.route('/motion_data')
+def get_motion_data():
+    """获取运动检测数据和控制信号，支持If-None-Match返回304和wait参数长轮询"""
+    return cached_json_response(motion_cache)
+
+def parse_lease_params(data):
+    """
+    检查控制信号和心跳中的seq、ttl
+
+    返回:
+    (seq, ttl)，未提供的为None
+
+    异常:
+    ValueError -- seq不是整数或ttl不是正数
+    """
+    seq, ttl = data.get('seq'), data.get('ttl')
+    if seq is not None and (isinstance(seq, bool) or not isinstance(seq, int)):
+        raise ValueError(f"seq 必须为整数: {seq!r}")
+    if ttl is not None:
+        try:
+            ttl = float(ttl)
+        except (TypeError, ValueError):
+            raise ValueError(f"ttl 必须为正数: {ttl!r}")
+        if not 0 < ttl < float('inf'):
+            raise ValueError(f"ttl 必须为正数: {ttl!r}")
+    return seq, ttl
 
 @app.route('/control', methods=['POST'])
 def control_camera():
     """接收客户端的控制信号"""
-    global camera_active, valid_signal, client_info
-    
     try:
-        data = request.get_json()
-        if data is None:
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
             return jsonify({'status': 'error', 'message': '无效的JSON数据'}), 400
+        try:
+            seq, ttl = parse_lease_params(data)
+        except ValueError as e:
+            return jsonify({'status': 'error', 'message': str(e), 'server_id': 2}), 400
         
         # 获取控制信号
-        new_valid = data.get('valid', False)
+        new_valid = bool(data.get('valid', False))
         client_id = data.get('client_id', 'unknown')
         
+        # 更新控制租约，旧序号的信号直接忽略
+        if not control_lease.apply(new_valid, client_id, seq=seq, ttl=ttl, source='http'):
+            return jsonify({
+                'status': 'stale',
+                'message': f'忽略旧控制信号 seq={seq}',
+                'server_id': 2,
+                'camera_active': camera_active,
+                'timestamp': time.time()
+            })
+        
         with control_lock:
-            # 更新控制状态
-            valid_signal = new_valid
-            camera_active = new_valid  # 根据valid信号控制摄像识别
-            
             # 更新客户端信息
             client_info['client_id'] = client_id
             client_info['last_signal_time'] = time.time()
@@ -290,6 +539,8 @@ def control_camera():
             'message': status_msg,
             'server_id': 2,
             'camera_active': camera_active,
+            'seq': seq,
+            'lease_expires_in': control_lease.snapshot()['expires_in'],
             'timestamp': time.time()
         })
         
@@ -301,25 +552,88 @@ def control_camera():
             'server_id': 2
         }), 500
 
-@app.route('/status')
-def get_status():
-    """获取服务器详细状态"""
+@app.route('/heartbeat', methods=['POST'])
+def heartbeat():
+    """客户端心跳，为其持有的valid租约续期"""
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        data = {}
+    try:
+        _, ttl = parse_lease_params(data)
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    if control_lease.heartbeat(data.get('client_id', 'unknown'), ttl=ttl):
+        return jsonify({'status': 'ok', 'valid': valid_signal})
+    # 没有租约时说明原因：到期或服务器重启需要客户端重新发送，被串口等其他来源停止时不应重新发送
+    return jsonify({'status': 'no_lease', 'valid': valid_signal, 'reason': control_lease.lost_reason(),
+                    'source': control_lease.snapshot()['source']})
+
+@app.route('/camera_config', methods=['GET', 'POST'])
+def update_camera_config():
+    """查看或修改摄像头和检测参数（分辨率、帧率、曝光、增益、阈值、结构元素），修改在两帧之间生效"""
+    if request.method == 'GET':
+        return jsonify(camera_config.summary())
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'status': 'error', 'message': '无效的JSON数据'}), 400
+    try:
+        result = camera_config.request(data)
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    return jsonify(result)
+
+def build_status():
+    """生成服务器详细状态"""
     with control_lock:
         control_status = {
             'camera_active': camera_active,
             'valid_signal': valid_signal,
-            'client_info': client_info.copy()
+            'client_info': client_info.copy(),
+            'lease': control_lease.snapshot(),
+            'auto_arm': auto_armer.summary() if auto_armer is not None else None
         }
     
+    uart_status = uart_link.summary() if uart_link is not None else None
+    if uart_status is not None:
+        uart_status['control'] = dict(uart_trigger_stats, ttl=uart_control_ttl)
+    
     with data_lock:
         motion_status = motion_data.copy()
     
-    return jsonify({
+    return {
         'server_id': 2,
         'control_status': control_status,
         'motion_data': motion_status,
-        'timestamp': time.time()
-    })
+        'uart': uart_status,
+        'perf': dict(detection_perf.summary(), blob_mode=blob_mode),
+        'scheduler': frame_scheduler.summary(),
+        'video': frame_bus.summary(),
+        'camera_config': camera_config.summary(),
+        'timestamp': time.time(),
+        'http_cache': {'motion_data': motion_cache.summary(), 'status': status_cache.summary()}
+    }
+
+# 序列化好的JSON按数据版本缓存：运动数据在L、T或控制状态变化时更新，详细状态每帧都在变化，最多缓存0.5秒
+motion_cache = JSONCache('motion', build_motion_data)
+status_cache = JSONCache('status', build_status, max_age=0.5)
+
+@app.route('/status')
+def get_status():
+    """获取服务器详细状态（支持If-None-Match返回304）"""
+    return cached_json_response(status_cache)
+
+@app.route('/clock')
+def clock():
+    """
+    时钟端点，供客户端估计时钟偏差和漂移（NTP式交换）
+
+    客户端以参数t0带上发送时间，返回原样的t0、收到请求的时间t1和发出响应的时间t2；
+    server_time与t2相同，兼容只读取server_time的旧客户端。
+    """
+    t1 = time.time()
+    t0 = request.args.get('t0', type=float)
+    t2 = time.time()
+    return jsonify({'t0': t0, 't1': t1, 't2': t2, 'server_time': t2})
 
 @app.route('/ping')
 def ping():
@@ -331,21 +645,69 @@ def ping():
     })
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='运动检测视频流服务器')
+    parser.add_argument('--uart', help='向单片机推送测量值的串口（如 /dev/ttyAMA0），不指定则不使用串口')
+    parser.add_argument('--baudrate', type=int, default=115200, help='串口波特率')
+    parser.add_argument('--uart-control', action='store_true',
+                        help='接受单片机通过串口发送的启动(1/start)、停止(0/stop)和续约(hb)命令')
+    parser.add_argument('--uart-ttl', type=float, default=MAX_LEASE_TTL, help='串口启动命令的租约有效期（秒）')
+    parser.add_argument('--auto-arm', action='store_true', help='待机时检测到持续的周期运动自动启动摄像识别')
+    parser.add_argument('--auto-arm-threshold', type=float, default=0.5, help='自动启动的运动能量阈值（变化像素百分比）')
+    parser.add_argument('--camera', default='0', help="摄像头编号、视频文件路径或 synthetic（合成画面）")
+    parser.add_argument('--blob-mode', choices=BLOB_MODES, default='contours',
+                        help='运动目标提取方式：contours（轮廓）或 components（连通区域统计）')
+    parser.add_argument('--blob-min-area', type=int, default=0, help='components模式下目标的最小面积（像素）')
+    parser.add_argument('--blob-max-aspect', type=float, default=None, help='components模式下目标外接矩形的最大长宽比')
+    parser.add_argument('--width', type=int, help='摄像头采集宽度')
+    parser.add_argument('--height', type=int, help='摄像头采集高度')
+    parser.add_argument('--fps', type=float, help='摄像头帧率（高帧率模式如60、90、120，需摄像头支持）')
+    parser.add_argument('--exposure', help="曝光值，或 auto；短曝光可减少摆球的运动模糊")
+    parser.add_argument('--band', help='只处理摆动所在的水平带，旋转后画面的行范围，如 180:300')
+    parser.add_argument('--host', default='0.0.0.0', help='监听地址')
+    parser.add_argument('--port', type=int, default=5002, help='监听端口')
+    args = parser.parse_args()
+    if args.uart_control and not args.uart:
+        parser.error('--uart-control requires --uart')
+    
     print("正在启动运动检测视频流服务器...")
     print("初始化摄像头和运动检测...")
     
+    camera_source = args.camera
+    blob_mode, blob_min_area, blob_max_aspect = args.blob_mode, args.blob_min_area, args.blob_max_aspect
+    
+    # 启动时的摄像头配置，在检测线程读到第一帧后应用
+    startup_config = {name: value for name, value in (('width', args.width), ('height', args.height),
+                                                      ('fps', args.fps), ('exposure', args.exposure),
+                                                      ('band', args.band)) if value is not None}
+    if startup_config:
+        try:
+            camera_config.request(startup_config, timeout=0)
+        except ValueError as e:
+            parser.error(str(e))
+    
+    if args.auto_arm:
+        auto_armer = AutoArmer(threshold=args.auto_arm_threshold)
+        print("已启用自动启动：检测到持续的周期运动时自动开始摄像识别")
+    
     # 启动运动检测线程
     detection_thread = threading.Thread(target=motion_detection_thread, daemon=True)
     detection_thread.start()
     
+    if args.uart:
+        uart_control_ttl = args.uart_ttl
+        start_uart(args.uart, args.baudrate, on_line=on_uart_line if args.uart_control else None)
+        print(f"测量值将通过串口 {args.uart} 推送")
+        if args.uart_control:
+            print(f"接受串口控制命令，租约有效期 {uart_control_ttl} 秒")
+    
     print("服务器启动完成！")
-    print("访问 http://169.254.163.62:5002 查看web界面")
-    print("访问 http://169.254.163.62:5002/video_feed 查看视频流")
-    print("访问 http://169.254.163.62:5002/motion_data 查看L、T变量数据")
+    print(f"访问 http://169.254.163.62:{args.port} 查看web界面")
+    print(f"访问 http://169.254.163.62:{args.port}/video_feed 查看视频流")
+    print(f"访问 http://169.254.163.62:{args.port}/motion_data 查看L、T变量数据")
     print("按 Ctrl+C 停止服务器")
     
     try:
-        # 启动Flask服务器，监听所有网络接口的5002端口
-        app.run(host='0.0.0.0', port=5002, threaded=True, debug=False)
+        # 启动Flask服务器，默认监听所有网络接口的5002端口
+        app.run(host=args.host, port=args.port, threaded=True, debug=False)
     except KeyboardInterrupt:
         print("\n服务器已停止")
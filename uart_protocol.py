@@ -0,0 +1,195 @@
+import binascii
+import struct
+import time
+
+# 帧格式（小端）:
+#   同步字 0xAA 0x55 | 类型 u8 | 序号 u16 | 负载长度 u8 | 负载 | CRC16 u16
+# CRC16为CRC-CCITT（多项式0x1021，初值0xFFFF），覆盖类型到负载的所有字节
+SYNC = b'\xaa\x55'
+HEADER = struct.Struct('<2sBHB')
+CRC = struct.Struct('<H')
+HEADER_SIZE = HEADER.size                # 6
+CRC_SIZE = CRC.size                      # 2
+MAX_PAYLOAD = 255
+
+# 消息类型
+MSG_MEASUREMENT = 0x01      # 单个摄像头的L、T测量值
+MSG_FUSION = 0x02           # 双摄像头融合后的角度、摆长、周期
+
+# 负载格式（定点数）
+#   测量值: 来源 u8 | L×100 i32（像素） | T×10000 i32（秒） | 时间戳 u32（毫秒，取低32位）
+#   融合值: 角度×100 i16（度） | 角度误差×100 i16 | 摆长×10000 i32（米） | 周期×10000 i32（秒） | 时间戳 u32
+MEASUREMENT = struct.Struct('<BiiI')
+FUSION = struct.Struct('<hhiiI')
+
+L_SCALE = 100
+T_SCALE = 10000
+ANGLE_SCALE = 100
+LENGTH_SCALE = 10000
+PERIOD_SCALE = 10000
+
+# 缺失值（如尚未算出周期）用该类型的最大值表示
+MISSING_I16 = 0x7FFF
+MISSING_I32 = 0x7FFFFFFF
+
+# 测量值来源
+SOURCE_SERVER1 = 1
+SOURCE_SERVER2 = 2
+
+
+def crc16(data):
+    """CRC-CCITT (0x1021, 初值0xFFFF)"""
+    return binascii.crc_hqx(data, 0xFFFF)
+
+
+def _to_fixed(value, scale, missing):
+    """浮点数转定点数，None为缺失值，超出范围时截断"""
+    if value is None:
+        return missing
+    return max(-missing, min(missing - 1, int(round(value * scale))))
+
+
+def _from_fixed(raw, scale, missing):
+    return None if raw == missing else raw / scale
+
+
+def _timestamp_ms(timestamp):
+    if timestamp is None:
+        timestamp = time.time()
+    return int(timestamp * 1000) & 0xFFFFFFFF
+
+
+def encode_frame(msg_type, seq, payload):
+    """把负载封装为一帧"""
+    if len(payload) > MAX_PAYLOAD:
+        raise ValueError(f"负载过长: {len(payload)} 字节")
+    body = HEADER.pack(SYNC, msg_type, seq & 0xFFFF, len(payload)) + payload
+    return body + CRC.pack(crc16(body[2:]))
+
+
+class FrameEncoder:
+    """按递增序号编码各类消息"""
+
+    def __init__(self):
+        self.seq = 0
+
+    def _next_seq(self):
+        seq = self.seq
+        self.seq = (self.seq + 1) & 0xFFFF
+        return seq
+
+    def measurement(self, source, L=None, T=None, timestamp=None):
+        """编码单个摄像头的测量值，T为服务器上报的五个周期所用时间"""
+        payload = MEASUREMENT.pack(source,
+                                   _to_fixed(L, L_SCALE, MISSING_I32),
+                                   _to_fixed(T, T_SCALE, MISSING_I32),
+                                   _timestamp_ms(timestamp))
+        return encode_frame(MSG_MEASUREMENT, self._next_seq(), payload)
+
+    def fusion(self, result):
+        """编码融合结果字典（FusionEngine.fuse()的返回值）"""
+        payload = FUSION.pack(_to_fixed(result.get('angle_deg'), ANGLE_SCALE, MISSING_I16),
+                              _to_fixed(result.get('angle_err'), ANGLE_SCALE, MISSING_I16),
+                              _to_fixed(result.get('length'), LENGTH_SCALE, MISSING_I32),
+                              _to_fixed(result.get('period'), PERIOD_SCALE, MISSING_I32),
+                              _timestamp_ms(result.get('timestamp')))
+        return encode_frame(MSG_FUSION, self._next_seq(), payload)
+
+
+def decode_payload(msg_type, payload):
+    """解码负载为字典，未知类型返回None"""
+    if msg_type == MSG_MEASUREMENT and len(payload) == MEASUREMENT.size:
+        source, L, T, ts = MEASUREMENT.unpack(payload)
+        return {'source': source,
+                'L': _from_fixed(L, L_SCALE, MISSING_I32),
+                'T': _from_fixed(T, T_SCALE, MISSING_I32),
+                'timestamp_ms': ts}
+    if msg_type == MSG_FUSION and len(payload) == FUSION.size:
+        angle, angle_err, length, period, ts = FUSION.unpack(payload)
+        return {'angle_deg': _from_fixed(angle, ANGLE_SCALE, MISSING_I16),
+                'angle_err': _from_fixed(angle_err, ANGLE_SCALE, MISSING_I16),
+                'length': _from_fixed(length, LENGTH_SCALE, MISSING_I32),
+                'period': _from_fixed(period, PERIOD_SCALE, MISSING_I32),
+                'timestamp_ms': ts}
+    return None
+
+
+class FrameDecoder:
+    """
+    增量帧解码器
+
+    数据可以按任意长度分块送入。查找同步字后按长度截取整帧并校验CRC，
+    校验失败时从同步字的下一个字节重新查找，因此丢字节或误码只会损失受影响的帧。
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._last_seq = None
+
+        # 统计
+        self.frames = 0
+        self.crc_errors = 0
+        self.unknown = 0            # 类型未知或负载长度不符的帧
+        self.skipped_bytes = 0      # 重新同步时丢弃的字节数
+        self.lost = 0               # 按序号推算丢失的帧数
+
+    def feed(self, data):
+        """
+        追加数据，返回本次解出的消息列表
+
+        返回:
+        [{'type', 'seq', ...负载字段}, ...]
+        """
+        buffer = self._buffer
+        buffer += data
+        messages = []
+        pos = 0
+        end = len(buffer)
+        while True:
+            start = buffer.find(SYNC, pos)
+            if start < 0:
+                # 末尾可能是半个同步字
+                keep = 1 if end and buffer[end - 1] == SYNC[0] else 0
+                self.skipped_bytes += end - pos - keep
+                pos = end - keep
+                break
+            self.skipped_bytes += start - pos
+            if end - start < HEADER_SIZE:
+                pos = start
+                break
+            _, msg_type, seq, length = HEADER.unpack_from(buffer, start)
+            frame_end = start + HEADER_SIZE + length + CRC_SIZE
+            if frame_end > end:
+                pos = start
+                break
+            (crc,) = CRC.unpack_from(buffer, frame_end - CRC_SIZE)
+            if crc16(bytes(buffer[start + 2:frame_end - CRC_SIZE])) != crc:
+                self.crc_errors += 1
+                self.skipped_bytes += 1
+                pos = start + 1
+                continue
+
+            fields = decode_payload(msg_type, bytes(buffer[start + HEADER_SIZE:frame_end - CRC_SIZE]))
+            pos = frame_end
+            if fields is None:
+                self.unknown += 1
+                continue
+            if self._last_seq is not None:
+                self.lost += (seq - self._last_seq - 1) & 0xFFFF
+            self._last_seq = seq
+            self.frames += 1
+            fields['type'] = msg_type
+            fields['seq'] = seq
+            messages.append(fields)
+
+        del buffer[:pos]
+        return messages
+
+    def summary(self):
+        return {
+            'frames': self.frames,
+            'crc_errors': self.crc_errors,
+            'unknown': self.unknown,
+            'skipped_bytes': self.skipped_bytes,
+            'lost': self.lost,
+        }